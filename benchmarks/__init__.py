@@ -0,0 +1,6 @@
+"""
+Benchmarks de desempenho do sistema RAG.
+
+Cada módulo pode ser executado com `python -m benchmarks.<nome>` a partir da
+raiz do projeto.
+"""
@@ -0,0 +1,110 @@
+"""
+Mede o throughput (MB/s) do chunker nativo contra o splitter do LangChain.
+
+Gera um corpus sintético com parágrafos, linhas e frases de tamanhos variados
+(e alguns trechos sem separador) e divide o mesmo texto com:
+
+- langchain: RecursiveCharacterTextSplitter (o chunker anterior)
+- native: TextChunker.iter_chunks (só offsets, sem Documents)
+- native_documents: TextChunker.chunk_text (Documents com metadados)
+
+    python -m benchmarks.chunking --megabytes 10 50 --repeat 3
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from src.config import RAGConfig
+from src.proccessing import TextChunker
+
+WORDS = ("unidade saúde atendimento horário vacina consulta médico enfermagem agendamento "
+         "bairro plano municipal meta indicador equipe pressão diabetes gestante farmácia").split()
+
+
+def synthetic_corpus(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1_000_000)
+    parts: List[str] = []
+    size = 0
+    while size < target:
+        if rng.random() < 0.01:
+            # Tabelas e URLs longas: sem separadores, forçam o corte rígido
+            block = "".join(rng.choice(WORDS) for _ in range(rng.randint(100, 400)))
+        else:
+            lines = []
+            for _ in range(rng.randint(1, 4)):
+                sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30)))
+                             for _ in range(rng.randint(1, 8))]
+                lines.append(". ".join(sentences) + ".")
+            block = "\n".join(lines)
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def measure(name: str, split: Callable[[str], int], text: str, repeat: int) -> Dict:
+    megabytes = len(text.encode('utf-8')) / 1_000_000
+    timings = []
+    chunks = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = split(text)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        'splitter': name,
+        'megabytes': megabytes,
+        'chunks': chunks,
+        'best_seconds': best,
+        'mb_per_second': megabytes / best if best > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--megabytes', type=float, nargs='+', default=[10.0])
+    parser.add_argument('--chunk-size', type=int, default=RAGConfig.CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=RAGConfig.CHUNK_OVERLAP)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    langchain = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, length_function=len,
+        separators=list(TextChunker.SEPARATORS)
+    )
+    native = TextChunker(args.chunk_size, args.chunk_overlap)
+    metadata = {'source': 'corpus.txt', 'source_path': '/data/corpus.txt', 'type': 'txt'}
+
+    splitters = {
+        'langchain': lambda text: len(langchain.split_text(text)),
+        'native': lambda text: sum(1 for _ in native.iter_chunks(text)),
+        'native_documents': lambda text: len(native.chunk_text(text, metadata)),
+    }
+
+    results = []
+    for megabytes in args.megabytes:
+        text = synthetic_corpus(megabytes)
+        print(f"\nCorpus de {megabytes:.0f} MB ({len(text):,} caracteres)")
+        same = langchain.split_text(text) == native.split_text(text)
+        print(f"  chunks idênticos aos do LangChain: {'sim' if same else 'NÃO'}")
+        baseline = None
+        for name, split in splitters.items():
+            row = measure(name, split, text, args.repeat)
+            baseline = baseline or row['mb_per_second']
+            row['speedup'] = row['mb_per_second'] / baseline if baseline else 0.0
+            results.append(row)
+            print(f"  {name:>16}: {row['mb_per_second']:7.2f} MB/s | {row['chunks']:>7} chunks | "
+                  f"{row['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
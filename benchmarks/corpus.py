@@ -0,0 +1,147 @@
+"""
+Gera corpora sintéticos em TXT, DOCX e PDF para os benchmarks.
+
+O texto vem de um vocabulário fixo com uma semente, então o mesmo comando
+gera os mesmos arquivos, byte a byte, em qualquer máquina:
+
+    python -m benchmarks.corpus --output-dir /tmp/corpus --megabytes 20 --files 40
+"""
+import argparse
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import List, Sequence
+
+WORDS = ("unidade saúde atendimento horário vacina consulta médico enfermagem agendamento "
+         "bairro plano municipal meta indicador equipe pressão diabetes gestante farmácia "
+         "odontologia exame coleta receita cadastro território visita domiciliar cobertura").split()
+FORMATS = ("txt", "docx", "pdf")
+PDF_LINES_PER_PAGE = 48
+PDF_LINE_CHARS = 95
+
+
+def synthetic_paragraphs(rng: random.Random, target_chars: int) -> List[str]:
+    """Parágrafos de frases aleatórias até somar `target_chars` caracteres"""
+    paragraphs = []
+    size = 0
+    while size < target_chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize()
+                     for _ in range(rng.randint(2, 7))]
+        paragraph = ". ".join(sentences) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return paragraphs
+
+
+def write_txt(path: Path, paragraphs: Sequence[str]) -> None:
+    path.write_text("\n\n".join(paragraphs), encoding='utf-8')
+
+
+def write_docx(path: Path, paragraphs: Sequence[str]) -> None:
+    from docx import Document as DocxDocument
+
+    document = DocxDocument()
+    document.core_properties.created = datetime(2000, 1, 1)  # data fixa: metadados iguais entre execuções
+    for i, paragraph in enumerate(paragraphs):
+        if i % 10 == 0:
+            document.add_heading(f"Seção {i // 10 + 1}", level=2)
+        document.add_paragraph(paragraph)
+    document.save(str(path))
+
+
+def _wrap(paragraphs: Sequence[str], width: int) -> List[str]:
+    lines: List[str] = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    return lines
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode('cp1252', errors='replace') + b")"
+
+
+def write_pdf(path: Path, paragraphs: Sequence[str]) -> None:
+    """PDF mínimo com texto extraível (Helvetica, WinAnsiEncoding), sem dependências"""
+    lines = _wrap(paragraphs, PDF_LINE_CHARS)
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)] or [[]]
+
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{4 + 2 * i} 0 R".encode() for i in range(len(pages)))
+        + f"] /Count {len(pages)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, page in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode())
+        stream = b"BT /F1 10 Tf 14 TL 50 750 Td\n" + b"".join(_pdf_string(line) + b" Tj T*\n" for line in page) + b"ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(output))
+
+
+WRITERS = {'txt': write_txt, 'docx': write_docx, 'pdf': write_pdf}
+
+
+def generate_corpus(output_dir: str, megabytes: float, files: int,
+                    formats: Sequence[str] = FORMATS, seed: int = 0) -> List[str]:
+    """
+    Gera `files` arquivos somando cerca de `megabytes` MB de texto
+
+    Args:
+        output_dir: Diretório de saída (criado se não existir)
+        megabytes: Total aproximado de texto (antes da formatação de cada arquivo)
+        files: Número de arquivos, distribuídos entre os formatos
+        formats: Formatos usados em rodízio ("txt", "docx", "pdf")
+        seed: Semente do texto
+
+    Returns:
+        Caminhos dos arquivos gerados
+    """
+    directory = Path(output_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    chars_per_file = int(megabytes * 1_000_000 / max(files, 1))
+
+    paths = []
+    for i in range(files):
+        extension = formats[i % len(formats)]
+        path = directory / f"doc_{i:04d}.{extension}"
+        WRITERS[extension](path, synthetic_paragraphs(rng, chars_per_file))
+        paths.append(str(path))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--megabytes', type=float, default=5.0)
+    parser.add_argument('--files', type=int, default=15)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.output_dir, args.megabytes, args.files, args.formats, args.seed)
+    size = sum(Path(p).stat().st_size for p in paths) / 1_000_000
+    print(f"📄 {len(paths)} arquivos ({size:.1f} MB) em {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmark ponta a ponta: ingestão de um corpus sintético e perguntas contra o Ollama falso.
+
+Gera TXT, DOCX e PDF com benchmarks.corpus, sobe o Ollama falso
+(benchmarks.fake_ollama, com taxa de tokens determinística) e mede cada etapa
+em um diretório de trabalho isolado (índice, caches e sessões novos):
+
+- startup: RAGSystem() (verificação do Ollama, índices; o modelo de embeddings
+  e o aquecimento do LLM seguem em segundo plano e aparecem como <fase>_seconds)
+- ingest: add_documents() (DocumentLoader em paralelo + chunker)
+- build_vectorstore: deduplicação, embeddings e gravação do índice
+- queries: `--queries` perguntas com RAGSystem.query
+
+Para cada etapa: duração, vazão, pico de RSS e, nas perguntas, p50/p95/p99.
+Os spans do src.tracing (retrieve, prompt, generate, embed...) também são
+resumidos. O JSON gerado é estável (chaves ordenadas) para comparar commits:
+
+    python -m benchmarks.e2e --megabytes 5 --files 15 --queries 50 --output e2e_main.json
+    python -m benchmarks.e2e --compare e2e_main.json e2e_branch.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.corpus import FORMATS, generate_corpus
+from benchmarks.fake_ollama import FakeOllamaServer
+from src.config import RAGConfig
+
+QUESTIONS = [
+    "Qual é o horário de atendimento da unidade?",
+    "Quais exames a equipe de enfermagem realiza?",
+    "Como funciona o agendamento de consultas?",
+    "Qual a meta de cobertura de vacina para gestantes?",
+    "O que o plano municipal diz sobre diabetes e pressão?",
+    "Quem faz as visitas domiciliares no território?",
+    "Onde retirar receitas na farmácia?",
+    "Quais indicadores de saúde bucal são acompanhados?",
+]
+
+
+class PeakRSS:
+    """Amostra o RSS do processo em uma thread e guarda o maior valor visto no bloco"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def current() -> int:
+        """RSS atual em bytes (/proc no Linux; senão o pico do processo via getrusage)"""
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self) -> "PeakRSS":
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+@contextlib.contextmanager
+def stage(results: Dict, name: str, verbose: bool):
+    """Mede duração e pico de RSS do bloco; os prints do sistema só aparecem com --verbose"""
+    row: Dict = {}
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with PeakRSS() as rss, output:
+        started = time.perf_counter()
+        yield row
+        row['seconds'] = time.perf_counter() - started
+    row['peak_rss_mb'] = rss.peak / 1_000_000
+    results[name] = row
+
+
+def configure_workdir(workdir: Path) -> None:
+    """Aponta índices, caches e sessões para o diretório do benchmark (antes de importar o RAGSystem)"""
+    persist = workdir / "chroma_db"
+    RAGConfig.PERSIST_DIRECTORY = str(persist)
+    RAGConfig.NUMPY_INDEX_DIR = str(persist / "numpy_index")
+    RAGConfig.LEXICAL_INDEX_DIR = str(persist / "lexical_index")
+    RAGConfig.DEDUP_INDEX_DIR = str(persist / "dedup_index")
+    RAGConfig.QUANT_INDEX_DIR = str(persist / "quantized_index")
+    RAGConfig.EMBEDDING_CACHE_DIR = str(workdir / "embedding_cache")
+    RAGConfig.HTTP_CACHE_DIR = str(workdir / "http_cache")
+    RAGConfig.SESSION_DB_PATH = str(workdir / "sessions.db")
+    RAGConfig.TRACE_PROFILE_DIR = str(workdir / "profiles")
+    RAGConfig.TRACE_JSONL_PATH = str(workdir / "trace.jsonl")
+    RAGConfig.ANSWER_CACHE_ENABLED = False  # toda pergunta precisa chegar ao Ollama
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def summarize_spans(path: Path) -> Dict[str, Dict]:
+    """Duração por etapa do tracer, a partir do JSONL (percentis exatos, não por bucket)"""
+    durations: Dict[str, List[float]] = {}
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                durations.setdefault(record['span'], []).append(record['duration_ms'])
+    return {
+        name: {'count': len(values), 'total_seconds': sum(values) / 1000, **percentiles(values)}
+        for name, values in durations.items()
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, workdir: Path) -> Dict:
+    print(f"📄 Gerando corpus ({args.megabytes} MB em {args.files} arquivos)...")
+    corpus_dir = workdir / "corpus"
+    paths = generate_corpus(str(corpus_dir), args.megabytes, args.files, args.formats, args.seed)
+    corpus_mb = sum(Path(p).stat().st_size for p in paths) / 1_000_000
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second, prompt_eval_rate=args.prompt_eval_rate,
+                              answer_tokens=args.answer_tokens, model_name=RAGConfig.OLLAMA_MODEL).start()
+    os.environ['OLLAMA_HOST'] = server.url  # lido pelo cliente ollama na importação
+    configure_workdir(workdir)
+    if args.vector_backend:
+        RAGConfig.VECTOR_BACKEND = args.vector_backend
+
+    from src.ragsystem import RAGSystem
+    from src.tracing import tracer
+    tracer.jsonl_path = RAGConfig.TRACE_JSONL_PATH
+
+    stages: Dict[str, Dict] = {}
+    rag = None
+    try:
+        print("🔧 startup...")
+        with stage(stages, 'startup', args.verbose):
+            rag = RAGSystem(model_name=RAGConfig.OLLAMA_MODEL)
+
+        print("📂 ingest...")
+        with stage(stages, 'ingest', args.verbose) as row:
+            failures = rag.add_documents(str(corpus_dir))
+        chunks = rag.pending.chunk_count()
+        row.update({
+            'files': len(paths) - len(failures),
+            'failures': len(failures),
+            'megabytes': corpus_mb,
+            'chunks': chunks,
+            'mb_per_second': corpus_mb / row['seconds'] if row['seconds'] > 0 else 0.0,
+            # Os arquivos são lidos em um pool de processos: pico do maior processo filho
+            'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                                    * (1 if sys.platform == 'darwin' else 1024) / 1_000_000,
+        })
+
+        print("🔨 build_vectorstore...")
+        with stage(stages, 'build_vectorstore', args.verbose) as row:
+            rag.build_vectorstore()
+        row['chunks'] = chunks
+        row['indexed'] = chunks - rag.last_dedup_report.get('duplicates', 0)
+        row['chunks_per_second'] = chunks / row['seconds'] if row['seconds'] > 0 else 0.0
+
+        print(f"❓ queries ({args.queries})...")
+        latencies: List[float] = []
+        with stage(stages, 'queries', args.verbose) as row:
+            for i in range(args.queries):
+                if i % args.turns == 0:
+                    rag.clear_memory()  # conversas de `--turns` perguntas
+                started = time.perf_counter()
+                rag.query(f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})")
+                latencies.append((time.perf_counter() - started) * 1000)
+        row.update({'count': len(latencies), **percentiles(latencies)})
+        row['qps'] = len(latencies) / row['seconds'] if row['seconds'] > 0 else 0.0
+
+        # Fases da inicialização, incluindo as de segundo plano (modelo de embeddings, aquecimento do LLM)
+        stages['startup'].update({f"{phase}_seconds": seconds
+                                  for phase, seconds in rag.startup_report(wait=True).items()})
+    finally:
+        if rag is not None:
+            # Grava agora: o diretório temporário some antes dos handlers de atexit
+            rag.embedding_cache.flush()
+            rag.session_store.close()
+        tracer.close()
+        server.stop()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'corpus': {'megabytes': args.megabytes, 'files': args.files, 'formats': list(args.formats),
+                       'seed': args.seed},
+            'fake_ollama': {'tokens_per_second': args.tokens_per_second, 'answer_tokens': args.answer_tokens,
+                            'prompt_eval_rate': args.prompt_eval_rate},
+            'embedding_model': RAGConfig.EMBEDDING_MODEL,
+            'vector_backend': RAGConfig.VECTOR_BACKEND,
+            'retrieval_mode': RAGConfig.RETRIEVAL_MODE,
+        },
+        'stages': stages,
+        'spans': summarize_spans(Path(RAGConfig.TRACE_JSONL_PATH)),
+    }
+
+
+def print_results(results: Dict) -> None:
+    stages = results['stages']
+    print("\n" + "=" * 70)
+    for name, row in stages.items():
+        print(f"  {name:<18} {row['seconds']:8.2f}s | pico RSS {row['peak_rss_mb']:7.1f} MB")
+    ingest, build, queries = stages['ingest'], stages['build_vectorstore'], stages['queries']
+    print(f"\n  ingestão: {ingest['mb_per_second']:.2f} MB/s, {ingest['chunks']} chunks | "
+          f"índice: {build['chunks_per_second']:.1f} chunks/s")
+    print(f"  perguntas: p50={queries['p50_ms']:.0f}ms p95={queries['p95_ms']:.0f}ms "
+          f"p99={queries['p99_ms']:.0f}ms | {queries['qps']:.2f} q/s")
+    print("\n  Etapas (spans):")
+    for name, row in sorted(results['spans'].items(), key=lambda item: -item[1]['total_seconds']):
+        print(f"    {name:<14} n={row['count']:>5} p50={row['p50_ms']:8.1f}ms p95={row['p95_ms']:8.1f}ms "
+              f"p99={row['p99_ms']:8.1f}ms total={row['total_seconds']:.2f}s")
+    print("=" * 70)
+
+
+def compare(base_path: str, new_path: str) -> None:
+    """Variação percentual de cada métrica numérica entre dois resultados"""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"\n{base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for section in ('stages', 'spans'):
+        for name in sorted(set(base[section]) & set(new[section])):
+            for metric, before in sorted(base[section][name].items()):
+                after = new[section][name].get(metric)
+                if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+                    continue
+                change = (after - before) / before * 100 if before else 0.0
+                label = f"{section}.{name}.{metric}"
+                print(f"  {label:<48} {before:>12.2f} -> {after:>12.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--megabytes', type=float, default=5.0)
+    parser.add_argument('--files', type=int, default=15)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--queries', type=int, default=30)
+    parser.add_argument('--turns', type=int, default=3, help="Perguntas por conversa antes de limpar a memória")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--prompt-eval-rate', type=float, default=5000.0)
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--vector-backend', choices=['chroma', 'numpy', 'int8', 'ivfpq'])
+    parser.add_argument('--workdir', help="Diretório de trabalho (padrão: temporário, apagado no fim)")
+    parser.add_argument('--verbose', action='store_true', help="Mostra as mensagens do sistema")
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NOVO'),
+                        help="Compara dois resultados gravados com --output (não executa o benchmark)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.workdir:
+        Path(args.workdir).mkdir(parents=True, exist_ok=True)
+        results = run(args, Path(args.workdir))
+    else:
+        with tempfile.TemporaryDirectory(prefix="rag-e2e-") as workdir:
+            results = run(args, Path(workdir))
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Servidor HTTP que imita a API do Ollama com tempos determinísticos.
+
+Responde /api/tags, /api/generate (com e sem streaming, e o pré-carregamento
+com prompt vazio) e /api/pull. A
+"geração" emite `--answer-tokens` tokens a `--tokens-per-second` e simula a
+avaliação do prompt a `--prompt-eval-rate` tokens/s (1 token ~ 4 caracteres),
+reaproveitando o prefixo já avaliado (KV cache) e o `context` do turno anterior
+como o Ollama faz. Isso permite medir o sistema sem um modelo real:
+
+    python -m benchmarks.fake_ollama --port 11435
+    OLLAMA_HOST=http://127.0.0.1:11435 python main.py
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Ajustados por FakeOllamaServer
+    model_name = "llama3.2:3b"
+    tokens_per_second = 50.0
+    prompt_eval_rate = 2000.0
+    answer_tokens = 40
+    stats: Dict[str, int] = {}
+    stats_lock = threading.Lock()
+    contexts: Dict[int, str] = {}  # id do `context` -> texto já avaliado
+    kv_cache: List[str] = [""]  # última sequência avaliada (um slot, como OLLAMA_NUM_PARALLEL=1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: Dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload: Dict) -> None:
+        data = (json.dumps(payload) + "\n").encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self.stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': self.model_name, 'model': self.model_name}]})
+        elif self.path == '/api/version':
+            self._send_json({'version': '0.0.0-fake'})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def _prompt_eval(self, request: Dict) -> Tuple[str, int, float]:
+        """
+        Simula a avaliação do prompt como o runner do Ollama
+
+        A sequência avaliada é o texto do `context` recebido + sistema + prompt.
+        Só o trecho que não coincide com o prefixo da última sequência (o KV cache
+        do único slot) é avaliado; o resto conta como reaproveitado.
+
+        Returns:
+            (sequência completa, tokens avaliados, segundos gastos)
+        """
+        context = request.get('context') or []
+        prefix = self.contexts.get(context[0], "") if context else ""
+        system = request.get('system') or ""
+        sequence = prefix + (f"<system>{system}</system>" if system else "") + f"<user>{request.get('prompt') or ''}</user>"
+
+        with self.stats_lock:
+            cached = os.path.commonprefix([self.kv_cache[0], sequence])
+            self.kv_cache[0] = sequence
+        total = len(sequence) // 4
+        evaluated = total - len(cached) // 4
+        self._count('prompt_tokens', total)
+        self._count('prompt_tokens_reused', total - evaluated)
+        self._count('prompt_tokens_evaluated', evaluated)
+        seconds = evaluated / self.prompt_eval_rate
+        time.sleep(seconds)
+        return sequence, evaluated, seconds
+
+    def _new_context(self, sequence: str) -> List[int]:
+        """`context` devolvido ao cliente: um token por 4 caracteres, o primeiro identifica o texto"""
+        with self.stats_lock:
+            context_id = len(self.contexts) + 1
+            self.contexts[context_id] = sequence
+            self.kv_cache[0] = sequence
+        return [context_id] + [0] * (len(sequence) // 4 - 1)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.path == '/api/pull':
+            self._send_json({'status': 'success'})
+            return
+        if self.path != '/api/generate':
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        if not request.get('prompt') and not request.get('system'):
+            # Pedido de pré-carregamento (prompt vazio): o Ollama só carrega o modelo
+            self._count('loads')
+            self._send_json({'model': request.get('model', self.model_name), 'response': '',
+                             'done': True, 'done_reason': 'load'})
+            return
+
+        self._count('requests')
+        sequence, prompt_eval_count, prompt_seconds = self._prompt_eval(request)
+        tokens = [f" token{i}" for i in range(self.answer_tokens)]
+        interval = 1.0 / self.tokens_per_second
+        context = self._new_context(sequence + "".join(tokens))
+        final = {
+            'model': request.get('model', self.model_name),
+            'response': '',
+            'done': True,
+            'done_reason': 'stop',
+            'context': context,
+            'prompt_eval_count': prompt_eval_count,
+            'prompt_eval_duration': int(prompt_seconds * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int(len(tokens) * interval * 1e9),
+        }
+
+        if request.get('stream', True):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in tokens:
+                time.sleep(interval)
+                self._write_chunk({'model': final['model'], 'response': token, 'done': False})
+            self._write_chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        else:
+            time.sleep(interval * len(tokens))
+            final['response'] = "".join(tokens).strip()
+            self._send_json(final)
+
+
+class FakeOllamaServer:
+    """Executa o servidor falso em uma thread (útil em benchmarks e testes manuais)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, tokens_per_second: float = 50.0,
+                 prompt_eval_rate: float = 2000.0, answer_tokens: int = 40, model_name: str = "llama3.2:3b"):
+        handler = type('ConfiguredFakeOllamaHandler', (FakeOllamaHandler,), {
+            'tokens_per_second': tokens_per_second,
+            'prompt_eval_rate': prompt_eval_rate,
+            'answer_tokens': answer_tokens,
+            'model_name': model_name,
+            'stats': {},
+            'contexts': {},
+            'kv_cache': [""],
+        })
+        self.handler = handler
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.handler.stats)
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Ollama falso para benchmarks")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--prompt-eval-rate', type=float, default=2000.0)
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--model', default="llama3.2:3b")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.tokens_per_second, args.prompt_eval_rate,
+                              args.answer_tokens, args.model)
+    print(f"🤖 Ollama falso em {server.url} ({args.tokens_per_second} tokens/s)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
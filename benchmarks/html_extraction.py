@@ -0,0 +1,99 @@
+"""
+Mede o throughput (MB/s) da extração de HTML sobre páginas salvas.
+
+Cada arquivo .html do diretório de fixtures é extraído com:
+
+- legacy: BeautifulSoup (html.parser) + get_text() + limpeza por linhas (o extrator anterior)
+- blocks_html_parser: HTMLExtractor com o html.parser do BeautifulSoup
+- blocks_lxml: HTMLExtractor com lxml (quando instalado)
+
+Além do tempo, mostra quantos caracteres cada extrator manteve: a diferença
+para o legacy é o boilerplate (menus, rodapés, banners) que deixou de ser indexado.
+Antes de medir, confere que o HTMLExtractor mantém texto em todas as páginas
+(ex: classes_compostas.html, com "has-sidebar" no body e "social-services" no article).
+
+    python -m benchmarks.html_extraction --fixtures benchmarks/data/html --repeat 20
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from src.html_extract import HTMLExtractor, lxml
+
+
+def legacy_extract(content: bytes) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def measure(name: str, extract: Callable[[bytes], str], pages: List[bytes], repeat: int) -> Dict:
+    megabytes = sum(len(page) for page in pages) / 1_000_000
+    timings = []
+    chars = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chars = sum(len(extract(page)) for page in pages)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        'extractor': name,
+        'pages': len(pages),
+        'megabytes': megabytes,
+        'chars': chars,
+        'best_seconds': best,
+        'mb_per_second': megabytes / best if best > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixtures', default=str(Path(__file__).parent / "data" / "html"),
+                        help="Diretório com páginas .html salvas")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    paths = sorted(Path(args.fixtures).glob("*.html"))
+    if not paths:
+        raise SystemExit(f"Nenhum arquivo .html em {args.fixtures}")
+    pages = [path.read_bytes() for path in paths]
+
+    extractors = {
+        'legacy': legacy_extract,
+        'blocks_html_parser': HTMLExtractor(parser="html.parser").extract,
+    }
+    if lxml is not None:
+        extractors['blocks_lxml'] = HTMLExtractor(parser="lxml").extract
+
+    for name, extract in extractors.items():
+        empty = [path.name for path, page in zip(paths, pages) if not extract(page).strip()]
+        if empty:
+            raise SystemExit(f"{name}: nenhum texto extraído de {', '.join(empty)}")
+
+    print(f"\n{len(pages)} páginas ({sum(len(p) for p in pages) / 1000:.1f} KB) em {args.fixtures}")
+    results = []
+    baseline = None
+    for name, extract in extractors.items():
+        row = measure(name, extract, pages, args.repeat)
+        baseline = baseline or row['mb_per_second']
+        row['speedup'] = row['mb_per_second'] / baseline if baseline else 0.0
+        results.append(row)
+        print(f"  {name:>18}: {row['mb_per_second']:7.2f} MB/s | {row['chars']:>8} caracteres | "
+              f"{row['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Teste de carga da API HTTP (python main.py serve).
+
+Dispara `--requests` perguntas com `--concurrency` clientes simultâneos, cada
+um com sua própria sessão e conexão keep-alive, e reporta p50/p95/p99 e QPS.
+Para medir sem um modelo real, suba o Ollama falso antes do servidor:
+
+    python -m benchmarks.fake_ollama --port 11435
+    OLLAMA_HOST=http://127.0.0.1:11435 python main.py serve
+    python -m benchmarks.load_test --concurrency 1 4 16 --requests 200
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import numpy as np
+
+QUESTIONS = [
+    "Quais são os principais resultados apresentados no documento?",
+    "Qual é a metodologia utilizada?",
+    "Quais limitações os autores mencionam?",
+    "Resuma as conclusões em poucos tópicos.",
+    "Quais dados numéricos aparecem no texto?",
+    "Quem são os responsáveis pelo estudo?",
+]
+
+
+def run_client(url: str, client_id: int, count: int, latencies: List[float], errors: List[str],
+               lock: threading.Lock) -> None:
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=300)
+    session_id = f"load-{client_id}"
+    for i in range(count):
+        body = json.dumps({
+            'question': f"{QUESTIONS[(client_id + i) % len(QUESTIONS)]} (#{client_id}-{i})",
+            'session_id': session_id,
+        })
+        started = time.perf_counter()
+        try:
+            connection.request('POST', '/query', body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            payload = response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=300)
+            continue
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+    connection.close()
+
+
+def fetch_metrics(url: str) -> Dict:
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    connection.request('GET', '/metrics')
+    metrics = json.loads(connection.getresponse().read())
+    connection.close()
+    return metrics
+
+
+def run_load(url: str, concurrency: int, requests: int) -> Dict:
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for client_id, count in enumerate(per_client):
+            executor.submit(run_client, url, client_id, count, latencies, errors, lock)
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'qps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default="http://127.0.0.1:8000")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.concurrency:
+        result = run_load(args.url, concurrency, args.requests)
+        results.append(result)
+        print(f"c={concurrency:>3} ok={result['requests']:>5} erros={result['errors']:>3} "
+              f"p50={result['p50_ms']:.0f}ms p95={result['p95_ms']:.0f}ms p99={result['p99_ms']:.0f}ms "
+              f"{result['qps']:.1f} q/s")
+
+    metrics = fetch_metrics(args.url)
+    print(f"📦 Lotes de embeddings: {metrics['embedding_batches']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'runs': results, 'server_metrics': metrics}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Mede quantos tokens do prompt o Ollama deixa de reavaliar ao longo de uma conversa.
+
+Executa o mesmo diálogo contra o Ollama falso (benchmarks.fake_ollama) com o
+reaproveitamento do `context` desligado e ligado, e mostra por turno os tokens
+avaliados e os reaproveitados (prefixo idêntico no KV cache + `context`).
+
+    python -m benchmarks.prompt_reuse --turns 6
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict, List
+
+from benchmarks.fake_ollama import FakeOllamaServer
+
+WORDS = ("unidade saúde atendimento horário vacina consulta médico enfermagem "
+         "agendamento bairro plano municipal meta indicador equipe").split()
+
+
+def synthetic_chunks(turn: int, count: int, chars: int) -> List:
+    from langchain_core.documents import Document
+
+    rng = random.Random(turn)
+    chunks = []
+    for i in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(chars // 8))[:chars]
+        chunks.append(Document(page_content=text, metadata={
+            'source': f"doc{turn % 3}.pdf", 'source_path': f"/data/doc{turn % 3}.pdf",
+            'chunk_id': turn * 100 + i * 2, 'page': i + 1,
+        }))
+    return chunks
+
+
+def run_dialogue(rag, server: FakeOllamaServer, turns: int, chunks: int, chars: int) -> List[Dict]:
+    from src.memory import ConversationMemory
+
+    memory = ConversationMemory(max_turns=3)
+    rows = []
+    for turn in range(turns):
+        before = server.stats
+        rag.generate_answer(f"Pergunta {turn}: quais são os horários das unidades?",
+                            synthetic_chunks(turn, chunks, chars), memory=memory)
+        after = server.stats
+        rows.append({
+            'turn': turn + 1,
+            'prompt_tokens': after.get('prompt_tokens', 0) - before.get('prompt_tokens', 0),
+            'evaluated': after.get('prompt_tokens_evaluated', 0) - before.get('prompt_tokens_evaluated', 0),
+            'reused': after.get('prompt_tokens_reused', 0) - before.get('prompt_tokens_reused', 0),
+            'context_tokens_sent': rag.last_generation_stats.get('context_tokens_reused', 0),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--turns', type=int, default=6)
+    parser.add_argument('--chunks', type=int, default=4)
+    parser.add_argument('--chunk-chars', type=int, default=1000)
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(prompt_eval_rate=1e9, tokens_per_second=1e6).start()
+    os.environ['OLLAMA_HOST'] = server.url  # lido pelo cliente ollama na importação
+
+    from src.config import RAGConfig
+    from src.ragsystem import RAGSystem
+
+    rag = RAGSystem(model_name=RAGConfig.OLLAMA_MODEL)
+    rag.answer_cache = None  # toda pergunta precisa chegar ao Ollama
+
+    results = {}
+    try:
+        for reuse in (False, True):
+            RAGConfig.OLLAMA_CONTEXT_REUSE = reuse
+            label = 'context_reuse' if reuse else 'prefix_only'
+            results[label] = run_dialogue(rag, server, args.turns, args.chunks, args.chunk_chars)
+
+            print(f"\n{'Com' if reuse else 'Sem'} reaproveitamento do `context`:")
+            for row in results[label]:
+                print(f"  turno {row['turn']}: {row['prompt_tokens']:>5} tokens no prompt, "
+                      f"{row['evaluated']:>5} avaliados, {row['reused']:>5} reaproveitados")
+            evaluated = sum(row['evaluated'] for row in results[label])
+            total = sum(row['prompt_tokens'] for row in results[label])
+            print(f"  total: {evaluated} de {total} tokens avaliados")
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
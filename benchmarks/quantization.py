@@ -0,0 +1,225 @@
+"""
+Recall@k, memória e latência dos índices comprimidos (int8 e IVF-PQ) contra a busca exata.
+
+O baseline é o NumpyVectorStore (float32, força bruta). Para cada índice
+comprimido, o recall@k é a fração do top-k exato que ele devolve, depois da
+reordenação dos candidatos com os vetores exatos lidos do .npy.
+Os chunks têm texto e metadados do tamanho dos reais (--chunk-chars), e cada
+índice é reaberto e consultado num processo novo: `rss_mb` é o quanto o RSS
+desse processo cresceu ao abrir o índice e responder às perguntas, separado
+em `anon_mb` (memória do próprio processo: códigos, IDs, textos carregados) e
+`file_mb` (páginas de arquivos mapeadas, como o vectors.npy do baseline).
+
+Vetores aleatórios uniformes não têm a estrutura de embeddings reais, então o
+padrão são vetores agrupados em tópicos; use --vectors para medir sobre
+embeddings de verdade (ex: o vectors.npy de um índice NumPy já construído):
+
+    python -m benchmarks.quantization --sizes 100000 1000000 --nprobe 8 16 32
+    python -m benchmarks.quantization --vectors chroma_db/numpy_index/vectors.npy
+"""
+import argparse
+import json
+import multiprocessing
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.vector_backends import PrecomputedEmbeddings, percentile
+from src.vectorstores import NumpyVectorStore, QuantizedVectorStore
+
+
+def rss_breakdown() -> Dict[str, float]:
+    """RSS do processo em bytes: total, anônimo e de arquivos mapeados (/proc; fora do Linux, só o total)"""
+    fields = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    if 'VmRSS' not in fields:
+        from benchmarks.e2e import PeakRSS
+        fields['VmRSS'] = PeakRSS.current()
+    return {'rss': fields['VmRSS'], 'anon': fields.get('RssAnon', 0), 'file': fields.get('RssFile', 0)}
+
+
+class SequentialEmbeddings(PrecomputedEmbeddings):
+    """Devolve os vetores na ordem em que os textos são adicionados (o texto não carrega o índice)"""
+
+    def __init__(self, vectors: np.ndarray):
+        super().__init__(vectors)
+        self.position = 0
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        start = self.position
+        self.position += len(texts)
+        return self.vectors[start:self.position]
+
+
+def chunk_texts(start: int, end: int, chars: int, seed: int) -> List[str]:
+    """Textos de `chars` caracteres, recortados de um texto base aleatório"""
+    rng = np.random.default_rng(seed + start)
+    words = ["saúde", "unidade", "atendimento", "consulta", "vacina", "equipe", "plano", "meta",
+             "exame", "farmácia", "território", "cobertura", "agendamento", "indicador", "visita"]
+    base = " ".join(rng.choice(words, 4 * chars))
+    offsets = rng.integers(0, len(base) - chars, end - start)
+    return [f"chunk {i}: {base[offset:offset + chars]}" for i, offset in zip(range(start, end), offsets)]
+
+
+def clustered_vectors(n: int, dim: int, topics: int, seed: int) -> np.ndarray:
+    """Vetores normalizados em torno de `topics` centros (imita chunks de assuntos parecidos)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    step = 100_000
+    for start in range(0, n, step):
+        size = min(step, n - start)
+        labels = rng.integers(0, topics, size)
+        vectors[start:start + size] = centers[labels] + 0.8 * rng.standard_normal((size, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def perturbed_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    """Perguntas próximas de chunks existentes (como uma paráfrase do trecho procurado)"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), count, replace=False)]
+    queries = queries + noise * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def build(store_class, vectors: np.ndarray, directory: Path, chunk_chars: int, **kwargs) -> float:
+    """Indexa os vetores com textos e metadados sintéticos; devolve os segundos gastos"""
+    started = time.perf_counter()
+    store = store_class(SequentialEmbeddings(vectors), str(directory), **kwargs)
+    step = 50_000
+    for start in range(0, len(vectors), step):
+        end = min(start + step, len(vectors))
+        metadatas = [{'source': f"documento_{i // 200}.pdf", 'page': i % 200, 'chunk_index': i,
+                      'chunk_uid': f"{i:016x}"} for i in range(start, end)]
+        store.add_texts(chunk_texts(start, end, chunk_chars, seed=2), metadatas,
+                        ids=[str(i) for i in range(start, end)])
+    store.save()
+    return time.perf_counter() - started
+
+
+def measure(store, queries: np.ndarray, k: int, truth: List[set]) -> Dict:
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = store.search_by_vectors(query, k)[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected & {row for row, _ in found})
+        store.get_by_ids([store.ids[row] for row, _ in found])  # lê os textos do top-k, como na busca real
+    return {
+        'recall': hits / (k * len(queries)),
+        'query_p50_ms': percentile(latencies, 50),
+        'query_p95_ms': percentile(latencies, 95),
+    }
+
+
+def measure_reopened(store_class, directory: str, kwargs: Dict, queries: np.ndarray, k: int,
+                     truth: List[set], nprobes: List[Optional[int]]) -> Dict:
+    """
+    Roda num processo novo: reabre o índice, mede cada configuração e o crescimento do RSS
+
+    Returns:
+        {'rss_mb', 'anon_mb', 'file_mb', 'open_s', 'memory' (memory_stats, se houver),
+        'runs': {nprobe: medidas}}
+    """
+    before = rss_breakdown()
+    started = time.perf_counter()
+    store = store_class(SequentialEmbeddings(np.zeros((0, 0), dtype=np.float32)), directory, **kwargs)
+    open_seconds = time.perf_counter() - started
+    runs = {}
+    for nprobe in nprobes:
+        if nprobe is not None:
+            store.quantizer.nprobe = nprobe
+        runs[nprobe] = measure(store, queries, k, truth)
+    after = rss_breakdown()
+    return {
+        **{f"{key}_mb": (after[key] - before[key]) / 1_000_000 for key in after},
+        'open_s': open_seconds,
+        'memory': store.memory_stats() if hasattr(store, 'memory_stats') else None,
+        'runs': runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--vectors', help="Arquivo .npy com embeddings reais (ignora --sizes/--dim)")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.5, help="Distância das perguntas aos chunks de origem")
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--rerank-factor', type=int, default=10)
+    parser.add_argument('--methods', nargs='+', default=['int8', 'ivfpq'], choices=['int8', 'ivfpq'])
+    parser.add_argument('--chunk-chars', type=int, default=1200, help="Tamanho do texto de cada chunk")
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    if args.vectors:
+        datasets = [np.load(args.vectors).astype(np.float32)]
+    else:
+        datasets = [clustered_vectors(size, args.dim, args.topics, seed=0) for size in args.sizes]
+
+    results = []
+    for vectors in datasets:
+        queries = perturbed_queries(vectors, args.queries, args.noise, seed=1)
+        workdir = Path(tempfile.mkdtemp(prefix="bench_quant_"))
+        # Um processo novo por índice: o RSS medido não inclui os vetores deste processo nem o índice anterior
+        context = multiprocessing.get_context('spawn')
+        try:
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                build_seconds = build(NumpyVectorStore, vectors, workdir / "exact", args.chunk_chars)
+                exact = NumpyVectorStore(SequentialEmbeddings(vectors), str(workdir / "exact"))
+                truth = [{row for row, _ in hits} for hits in exact.search_by_vectors(queries, args.k)]
+                del exact
+                measured = pool.apply(measure_reopened, (NumpyVectorStore, str(workdir / "exact"), {},
+                                                         queries, args.k, truth, [None]))
+                exact_mb = vectors.nbytes / 1_000_000
+                process = {key: measured[key] for key in ('rss_mb', 'anon_mb', 'file_mb', 'open_s')}
+                rows = [{'index': 'float32', 'memory_mb': exact_mb, 'compression': 1.0, 'build_s': build_seconds,
+                         **process, **measured['runs'][None]}]
+
+                for method in args.methods:
+                    kwargs = {'method': method, 'rerank_factor': args.rerank_factor}
+                    build_seconds = build(QuantizedVectorStore, vectors, workdir / method, args.chunk_chars, **kwargs)
+                    settings = args.nprobe if method == 'ivfpq' else [None]
+                    measured = pool.apply(measure_reopened, (QuantizedVectorStore, str(workdir / method), kwargs,
+                                                             queries, args.k, truth, settings))
+                    memory = measured['memory']
+                    process = {key: measured[key] for key in ('rss_mb', 'anon_mb', 'file_mb', 'open_s')}
+                    for nprobe in settings:
+                        label = method if nprobe is None else f"{method}/nprobe={nprobe}"
+                        rows.append({'index': label, 'memory_mb': memory['codes_mb'],
+                                     'compression': memory['compression'], 'build_s': build_seconds,
+                                     **process, **measured['runs'][nprobe]})
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        print(f"\nn={len(vectors):,} dim={vectors.shape[1]} k={args.k} fator de reordenação={args.rerank_factor}")
+        for row in rows:
+            row['size'] = len(vectors)
+            print(f"  {row['index']:>18}: recall@{args.k}={row['recall']:.3f} | {row['memory_mb']:8.1f} MB "
+                  f"({row['compression']:4.1f}x) | RSS +{row['rss_mb']:6.1f} MB (anônimo {row['anon_mb']:6.1f}) | p50={row['query_p50_ms']:.2f}ms "
+                  f"p95={row['query_p95_ms']:.2f}ms | build={row['build_s']:.1f}s")
+        results.extend(rows)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
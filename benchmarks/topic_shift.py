@@ -0,0 +1,93 @@
+"""
+Avalia a detecção de mudança de assunto em diálogos rotulados.
+
+Cada exemplo de `benchmarks/data/topic_shift_dialogues.json` tem um histórico,
+uma pergunta nova e o rótulo `related`. O script mede acurácia, precisão e
+recall da detecção por embeddings para vários limiares e compara com a regra
+antiga por palavras-chave, para escolher TOPIC_SHIFT_THRESHOLD.
+
+    python -m benchmarks.topic_shift --thresholds 0.25 0.3 0.35 0.4 0.5
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from src.config import RAGConfig
+
+DATASET = Path(__file__).parent / "data" / "topic_shift_dialogues.json"
+
+
+def keyword_baseline(query: str) -> bool:
+    """Regra anterior: palavras de referência ou perguntas de até 10 palavras"""
+    reference_words = [
+        'isso', 'aquilo', 'elas', 'eles', 'dela', 'dele', 'delas', 'deles',
+        'anterior', 'antes', 'você disse', 'mencionou', 'falou', 'citou'
+    ]
+    if any(word in query.lower() for word in reference_words):
+        return True
+    return len(query.split()) <= 10
+
+
+def score(examples: List[Dict], related: List[bool]) -> Dict[str, float]:
+    """Métricas tratando "mudança de assunto" (related=False) como a classe positiva"""
+    tp = fp = fn = tn = 0
+    for example, predicted in zip(examples, related):
+        shift_predicted = not predicted
+        shift_expected = not example['related']
+        tp += shift_predicted and shift_expected
+        fp += shift_predicted and not shift_expected
+        fn += not shift_predicted and shift_expected
+        tn += not shift_predicted and not shift_expected
+    return {
+        'accuracy': (tp + tn) / len(examples),
+        'shift_precision': tp / (tp + fp) if tp + fp else 0.0,
+        'shift_recall': tp / (tp + fn) if tp + fn else 0.0,
+        'history_dropped_wrongly': fp,
+        'history_kept_wrongly': fn,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dataset', default=str(DATASET))
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.2, 0.25, 0.3, 0.35, 0.4, 0.5])
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    from src.embedding_engine import EmbeddingEngine
+    from src.memory import ConversationMemory
+
+    with open(args.dataset, 'r', encoding='utf-8') as f:
+        examples = json.load(f)
+
+    embeddings = EmbeddingEngine(RAGConfig.EMBEDDING_MODEL)
+    memories = []
+    for example in examples:
+        memory = ConversationMemory(max_turns=3, embeddings=embeddings)
+        for question, answer in example['history']:
+            memory.add_interaction(question, answer)
+        memories.append(memory)
+    query_vectors = embeddings.embed_documents([example['query'] for example in examples])
+
+    results = {'keyword_baseline': score(examples, [keyword_baseline(example['query']) for example in examples])}
+    for threshold in args.thresholds:
+        RAGConfig.TOPIC_SHIFT_THRESHOLD = threshold
+        results[f"embedding@{threshold}"] = score(examples, [
+            memory.is_related(example['query'], query_vector)
+            for example, memory, query_vector in zip(examples, memories, query_vectors)
+        ])
+
+    print(f"{len(examples)} exemplos ({sum(not e['related'] for e in examples)} mudanças de assunto)")
+    for name, metrics in results.items():
+        print(f"{name:>18}: acurácia {metrics['accuracy']:.2f} | precisão {metrics['shift_precision']:.2f} | "
+              f"recall {metrics['shift_recall']:.2f} | histórico descartado sem motivo "
+              f"{metrics['history_dropped_wrongly']}, mantido sem motivo {metrics['history_kept_wrongly']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Compara o backend NumPy (força bruta sobre .npy mapeado) com o Chroma.
+
+Usa vetores aleatórios normalizados no lugar do modelo de embeddings, para
+medir apenas o custo do índice: abertura, inserção e busca (uma pergunta por
+vez e em lote).
+
+    python -m benchmarks.vector_backends --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.vectorstores import NumpyVectorStore
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Devolve vetores já calculados para textos no formato 'chunk-<i>'"""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.vectors[[int(text.split('-')[1]) for text in texts]]
+
+    def embed_query(self, text: str) -> List[float]:
+        raise NotImplementedError("O benchmark busca diretamente por vetores")
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def random_unit_vectors(n: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench_numpy(vectors: np.ndarray, queries: np.ndarray, k: int, batch: int, workdir: Path) -> Dict:
+    directory = workdir / "numpy_index"
+    embeddings = PrecomputedEmbeddings(vectors)
+
+    started = time.perf_counter()
+    store = NumpyVectorStore(embeddings, str(directory))
+    step = 50_000
+    for start in range(0, len(vectors), step):
+        end = min(start + step, len(vectors))
+        store.add_texts([f"chunk-{i}" for i in range(start, end)], ids=[str(i) for i in range(start, end)])
+    store.save()
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    store = NumpyVectorStore(embeddings, str(directory))
+    open_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        store.search_by_vectors(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        store.search_by_vectors(queries[start:start + batch], k)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        'build_s': build_seconds,
+        'open_s': open_seconds,
+        'query_p50_ms': percentile(latencies, 50),
+        'query_p95_ms': percentile(latencies, 95),
+        'batch_qps': len(queries) / batch_seconds if batch_seconds > 0 else 0.0,
+    }
+
+
+def bench_chroma(vectors: np.ndarray, queries: np.ndarray, k: int, batch: int, workdir: Path) -> Dict:
+    import chromadb
+
+    directory = workdir / "chroma"
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=str(directory))
+    collection = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+    step = 5_000
+    for start in range(0, len(vectors), step):
+        end = min(start + step, len(vectors))
+        collection.add(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"chunk-{i}" for i in range(start, end)]
+        )
+    build_seconds = time.perf_counter() - started
+    del collection, client
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=str(directory))
+    collection = client.get_collection("bench")
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=k)
+    open_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        collection.query(query_embeddings=queries[start:start + batch].tolist(), n_results=k)
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        'build_s': build_seconds,
+        'open_s': open_seconds,
+        'query_p50_ms': percentile(latencies, 50),
+        'query_p95_ms': percentile(latencies, 95),
+        'batch_qps': len(queries) / batch_seconds if batch_seconds > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--batch', type=int, default=32)
+    parser.add_argument('--backends', nargs='+', default=['numpy', 'chroma'], choices=['numpy', 'chroma'])
+    parser.add_argument('--output', help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    queries = random_unit_vectors(args.queries, args.dim, seed=1)
+    results = []
+    for size in args.sizes:
+        vectors = random_unit_vectors(size, args.dim, seed=0)
+        for backend in args.backends:
+            workdir = Path(tempfile.mkdtemp(prefix=f"bench_{backend}_"))
+            try:
+                bench = bench_numpy if backend == 'numpy' else bench_chroma
+                try:
+                    result = bench(vectors, queries, args.k, args.batch, workdir)
+                except ImportError as e:
+                    print(f"⚠️  {backend} indisponível: {e}")
+                    continue
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            result.update({'backend': backend, 'size': size})
+            results.append(result)
+            print(f"{backend:>6} n={size:>9,} build={result['build_s']:.1f}s open={result['open_s'] * 1000:.0f}ms "
+                  f"p50={result['query_p50_ms']:.2f}ms p95={result['query_p95_ms']:.2f}ms "
+                  f"lote={result['batch_qps']:.0f} q/s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
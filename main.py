@@ -1,6 +1,10 @@
+import argparse
 import logging
 from pathlib import Path
+from src.batch import read_questions
+from src.config import RAGConfig
 from src.ragsystem import RAGSystem
+from src.tracing import tracer
 
 # Configurar logging
 logging.basicConfig(
@@ -13,118 +17,207 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def construir_rag() -> RAGSystem:
+    """
+    Inicializa o sistema e constrói o índice - PERSONALIZE AQUI!
+    Adicione seus PDFs e sites
+    """
+    # ========================================
+    # PASSO 1: Inicializa o sistema
+    # ========================================
+    rag = RAGSystem(model_name="llama3.2:3b")
+
+    # ========================================
+    # PASSO 2: ADICIONE SEUS PDFs AQUI ⬇️
+    # ========================================
+    print("\n📂 Adicionando documentos PDF...")
+
+    # IMPORTANTE: Use caminhos compatíveis com Windows/Linux/Mac
+    # Opção 1: Caminho relativo (recomendado)
+    # rag.add_document(str(Path("data") / "RAG-2021.pdf"))
+    # rag.add_document(str(Path("data") / "plano_municipal_saude.pdf"))
+    
+    # Opção 2: Caminho absoluto Windows
+    # rag.add_document(r"C:\Users\SeuNome\Documents\RAG-2021.pdf")
+    
+    # Opção 3: Caminho absoluto usando pathlib (multiplataforma)
+    # rag.add_document(str(Path.home() / "Downloads" / "RAG-2021.pdf"))
+    
+    # Exemplo: Arquivos TXT e DOCX também funcionam
+    # rag.add_document(str(Path("data") / "arquivo.txt"))
+    # rag.add_document(str(Path("data") / "artigo.docx"))
+
+    # Exemplo: Lista de PDFs em loop
+    # pdfs = [
+    #     str(Path("data") / "pdf1.pdf"),
+    #     str(Path("data") / "pdf2.pdf"),
+    #     str(Path("data") / "pdf3.pdf")
+    # ]
+    # for pdf in pdfs:
+    #     rag.add_document(pdf)
+    
+    # ⚠️ COMENTADO: Descomente e ajuste os caminhos acima para seus arquivos reais
+    print("⚠️  Nenhum documento adicionado. Descomente os exemplos acima e ajuste os caminhos.")
+
+    # ========================================
+    # PASSO 3: ADICIONE SEUS SITES AQUI ⬇️
+    # ========================================
+    print("\n🌐 Adicionando sites...")
+
+    # Exemplo 1: Site único
+    # rag.add_url("https://ucpel.edu.br/servicos/unidades-basicas-de-saude")
+
+    # Exemplo 2: Lista de URLs em loop
+    # urls = [
+    #     "https://site1.com/artigo",
+    #     "https://site2.com/noticia",
+    #     "https://site3.com/pesquisa"
+    # ]
+    # for url in urls:
+    #     rag.add_url(url)
+    
+    # ⚠️ COMENTADO: Descomente e ajuste as URLs acima para seus sites reais
+    print("⚠️  Nenhuma URL adicionada. Descomente os exemplos acima e ajuste as URLs.")
+
+    # ========================================
+    # PASSO 4: Constrói o índice (OBRIGATÓRIO!)
+    # ========================================
+    rag.build_vectorstore()
+    rag.show_startup()
+
+    return rag
+
+
+def mostrar_metricas():
+    """Tabela com os tempos agregados de cada etapa (ingestão e perguntas)"""
+    etapas = tracer.snapshot()
+    if not etapas:
+        print("📊 Nenhuma etapa medida ainda")
+        return
+    print("\n" + "="*70)
+    print(f"📊 {'ETAPA':<14}{'N':>6}{'MÉDIA (ms)':>13}{'P95 (ms)':>11}{'TOTAL (s)':>11}")
+    print("="*70)
+    for nome, etapa in sorted(etapas.items(), key=lambda item: -item[1]['total_seconds']):
+        print(f"   {nome:<14}{etapa['count']:>6}{etapa['mean_seconds'] * 1000:>13.1f}"
+              f"{etapa['p95_seconds'] * 1000:>11.0f}{etapa['total_seconds']:>11.2f}")
+    print("="*70)
+
+
+def modo_interativo(rag: RAGSystem):
+    """Perguntas pelo terminal, com memória e respostas em streaming"""
+    # Modo interativo com memória
+    print("\n💡 Modo interativo COM MEMÓRIA INTELIGENTE ativado!")
+    print("Comandos especiais:")
+    print("  - 'memoria' ou 'historico': Mostra histórico")
+    print("  - 'limpar': Limpa memória manualmente")
+    print("  - 'auto on': Ativa limpeza automática ao mudar de assunto")
+    print("  - 'auto off': Desativa limpeza automática")
+    print("  - 'metricas': Tempo médio e p95 de cada etapa")
+    print("  - 'perfil on' / 'perfil off': Perfila as próximas perguntas (cProfile + tracemalloc)")
+    print("  - 'sair': Encerra\n")
+
+    auto_clear = True  # Ativa limpeza automática por padrão
+    perfil = RAGConfig.TRACE_PROFILE
+    print("🔄 Limpeza automática de contexto: ATIVADA\n")
+
+    while True:
+        pergunta = input("\n❓ Sua pergunta: ")
+
+        if pergunta.lower() in ['sair', 'exit', 'quit']:
+            print("👋 Encerrando...")
+            break
+
+        if pergunta.lower() in ['memoria', 'histórico', 'historico', 'memory']:
+            rag.show_memory()
+            continue
+
+        if pergunta.lower() in ['limpar', 'clear', 'reset']:
+            rag.clear_memory()
+            continue
+
+        if pergunta.lower() == 'auto on':
+            auto_clear = True
+            print("✅ Limpeza automática ATIVADA")
+            continue
+
+        if pergunta.lower() == 'auto off':
+            auto_clear = False
+            print("❌ Limpeza automática DESATIVADA")
+            continue
+
+        if pergunta.lower() in ['metricas', 'métricas', 'metrics']:
+            mostrar_metricas()
+            continue
+
+        if pergunta.lower() in ['perfil on', 'perfil off']:
+            perfil = pergunta.lower() == 'perfil on'
+            print(f"🔬 Perfil por pergunta {'ATIVADO' if perfil else 'DESATIVADO'}")
+            continue
+
+        # Resposta em streaming: os tokens aparecem à medida que são gerados
+        print("\n📝 Resposta:")
+        for trecho in rag.query_stream(pergunta, show_context=False, auto_clear_memory=auto_clear,
+                                       profile=perfil):
+            print(trecho, end="", flush=True)
+        print()
+
+        stats = rag.last_generation_stats
+        if stats.get('cached'):
+            print("\n⚡ Resposta do cache semântico")
+        elif stats.get('time_to_first_token') is not None:
+            print(f"\n⏱️  Primeiro token em {stats['time_to_first_token']:.2f}s | "
+                  f"{stats.get('tokens_per_second', 0.0):.1f} tokens/s | total {stats['total_time']:.1f}s")
+            if stats.get('context_tokens_reused'):
+                print(f"♻️  {stats['context_tokens_reused']} tokens da conversa reaproveitados, "
+                      f"{stats.get('prompt_eval_count', 0)} avaliados")
+
+
 def main():
     """
-    Função principal - PERSONALIZE AQUI!
-    Adicione seus PDFs, sites e faça suas perguntas
+    Função principal
+
+    Uso:
+        python main.py                       # modo interativo
+        python main.py serve --port 8000     # API HTTP (POST /query, GET /metrics)
+        python main.py batch perguntas.jsonl --output respostas.jsonl   # perguntas em lote, retomável
+        python main.py --trace-jsonl traces.jsonl   # grava cada span (etapa) em JSON lines
     """
+    parser = argparse.ArgumentParser(description="Sistema RAG com Ollama")
+    parser.add_argument("--trace-jsonl", default=RAGConfig.TRACE_JSONL_PATH,
+                        help="Arquivo onde cada etapa medida é gravada como uma linha JSON")
+    subparsers = parser.add_subparsers(dest="comando")
+    serve = subparsers.add_parser("serve", help="Inicia a API HTTP")
+    serve.add_argument("--host", default=RAGConfig.SERVER_HOST)
+    serve.add_argument("--port", type=int, default=RAGConfig.SERVER_PORT)
+    serve.add_argument("--max-generations", type=int, default=RAGConfig.SERVER_MAX_GENERATIONS,
+                       help="Gerações simultâneas enviadas ao Ollama")
+    batch = subparsers.add_parser("batch", help="Responde perguntas de um arquivo JSONL, sem memória")
+    batch.add_argument("input", help="JSONL com um objeto {\"question\": ..., \"id\": ...} por linha")
+    batch.add_argument("--output", required=True,
+                       help="JSONL de respostas; se já existir, as perguntas respondidas são puladas")
+    batch.add_argument("--workers", type=int, default=RAGConfig.BATCH_MAX_WORKERS,
+                       help="Gerações simultâneas enviadas ao Ollama")
+    batch.add_argument("--top-k", type=int, default=RAGConfig.TOP_K_RESULTS)
+    batch.add_argument("--mode", choices=["vector", "hybrid"], default=RAGConfig.RETRIEVAL_MODE)
+    args = parser.parse_args()
+    tracer.jsonl_path = args.trace_jsonl
 
     print("="*70)
     print("🚀 SISTEMA RAG - 100% OPEN SOURCE (Ollama + Llama)")
     print("="*70)
 
     try:
-        # ========================================
-        # PASSO 1: Inicializa o sistema
-        # ========================================
-        rag = RAGSystem(model_name="llama3.2:3b")
-
-        # ========================================
-        # PASSO 2: ADICIONE SEUS PDFs AQUI ⬇️
-        # ========================================
-        print("\n📂 Adicionando documentos PDF...")
-
-        # IMPORTANTE: Use caminhos compatíveis com Windows/Linux/Mac
-        # Opção 1: Caminho relativo (recomendado)
-        # rag.add_document(str(Path("data") / "RAG-2021.pdf"))
-        # rag.add_document(str(Path("data") / "plano_municipal_saude.pdf"))
-        
-        # Opção 2: Caminho absoluto Windows
-        # rag.add_document(r"C:\Users\SeuNome\Documents\RAG-2021.pdf")
-        
-        # Opção 3: Caminho absoluto usando pathlib (multiplataforma)
-        # rag.add_document(str(Path.home() / "Downloads" / "RAG-2021.pdf"))
-        
-        # Exemplo: Arquivos TXT e DOCX também funcionam
-        # rag.add_document(str(Path("data") / "arquivo.txt"))
-        # rag.add_document(str(Path("data") / "artigo.docx"))
-
-        # Exemplo: Lista de PDFs em loop
-        # pdfs = [
-        #     str(Path("data") / "pdf1.pdf"),
-        #     str(Path("data") / "pdf2.pdf"),
-        #     str(Path("data") / "pdf3.pdf")
-        # ]
-        # for pdf in pdfs:
-        #     rag.add_document(pdf)
-        
-        # ⚠️ COMENTADO: Descomente e ajuste os caminhos acima para seus arquivos reais
-        print("⚠️  Nenhum documento adicionado. Descomente os exemplos acima e ajuste os caminhos.")
-
-        # ========================================
-        # PASSO 3: ADICIONE SEUS SITES AQUI ⬇️
-        # ========================================
-        print("\n🌐 Adicionando sites...")
-
-        # Exemplo 1: Site único
-        # rag.add_url("https://ucpel.edu.br/servicos/unidades-basicas-de-saude")
-
-        # Exemplo 2: Lista de URLs em loop
-        # urls = [
-        #     "https://site1.com/artigo",
-        #     "https://site2.com/noticia",
-        #     "https://site3.com/pesquisa"
-        # ]
-        # for url in urls:
-        #     rag.add_url(url)
-        
-        # ⚠️ COMENTADO: Descomente e ajuste as URLs acima para seus sites reais
-        print("⚠️  Nenhuma URL adicionada. Descomente os exemplos acima e ajuste as URLs.")
-
-        # ========================================
-        # PASSO 4: Constrói o índice (OBRIGATÓRIO!)
-        # ========================================
-        rag.build_vectorstore()
-
-        # Modo interativo com memória
-        print("\n💡 Modo interativo COM MEMÓRIA INTELIGENTE ativado!")
-        print("Comandos especiais:")
-        print("  - 'memoria' ou 'historico': Mostra histórico")
-        print("  - 'limpar': Limpa memória manualmente")
-        print("  - 'auto on': Ativa limpeza automática ao mudar de assunto")
-        print("  - 'auto off': Desativa limpeza automática")
-        print("  - 'sair': Encerra\n")
-
-        auto_clear = True  # Ativa limpeza automática por padrão
-        print("🔄 Limpeza automática de contexto: ATIVADA\n")
-
-        while True:
-            pergunta = input("\n❓ Sua pergunta: ")
-
-            if pergunta.lower() in ['sair', 'exit', 'quit']:
-                print("👋 Encerrando...")
-                break
-
-            if pergunta.lower() in ['memoria', 'histórico', 'historico', 'memory']:
-                rag.show_memory()
-                continue
-
-            if pergunta.lower() in ['limpar', 'clear', 'reset']:
-                rag.clear_memory()
-                continue
-
-            if pergunta.lower() == 'auto on':
-                auto_clear = True
-                print("✅ Limpeza automática ATIVADA")
-                continue
-
-            if pergunta.lower() == 'auto off':
-                auto_clear = False
-                print("❌ Limpeza automática DESATIVADA")
-                continue
-
-            resposta = rag.query(pergunta, show_context=False, auto_clear_memory=auto_clear)
-            print(f"\n📝 Resposta:\n{resposta}")
+        rag = construir_rag()
+
+        if args.comando == "serve":
+            from src.server import RAGServer
+            RAGServer(rag, host=args.host, port=args.port, max_generations=args.max_generations).run()
+        elif args.comando == "batch":
+            rag.query_batch(read_questions(args.input), top_k=args.top_k, mode=args.mode,
+                            max_workers=args.workers, checkpoint_path=args.output)
+            print(f"📄 Respostas em {args.output}")
+        else:
+            modo_interativo(rag)
 
     except FileNotFoundError as e:
         logger.error(f"Arquivo não encontrado: {e}")
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def answer_scope(model_name: str, chunk_ids: Iterable[str]) -> str:
+    """Escopo de uma resposta: modelo + conjunto de chunks recuperados"""
+    payload = model_name + "\0" + "\0".join(sorted(chunk_ids))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas por similaridade semântica da pergunta
+
+    Uma resposta só é reaproveitada se a pergunta nova for parecida o bastante
+    (similaridade cosseno >= threshold) E tiver recuperado exatamente o mesmo
+    conjunto de chunks com o mesmo modelo. Assim, qualquer mudança no índice
+    que altere os chunks recuperados invalida a resposta automaticamente.
+    """
+
+    def __init__(self, threshold: float = RAGConfig.ANSWER_CACHE_THRESHOLD,
+                 max_entries: int = RAGConfig.ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = RAGConfig.ANSWER_CACHE_TTL):
+        """
+        Args:
+            threshold: Similaridade cosseno mínima entre as perguntas
+            max_entries: Número máximo de respostas (LRU)
+            ttl_seconds: Validade de cada resposta em segundos
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()  # do menos ao mais recente
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [entry_id for entry_id, entry in self.entries.items()
+                   if now - entry['created'] > self.ttl_seconds]
+        for entry_id in expired:
+            del self.entries[entry_id]
+        self.expired += len(expired)
+
+    def lookup(self, query_vector, scope: str) -> Optional[str]:
+        """Retorna a resposta em cache para uma pergunta similar no mesmo escopo, ou None"""
+        query_vector = self._normalize(query_vector)
+        with self._lock:
+            self._purge_expired(time.time())
+            candidates = [(entry_id, entry) for entry_id, entry in self.entries.items() if entry['scope'] == scope]
+            if candidates:
+                vectors = np.stack([entry['vector'] for _, entry in candidates])
+                similarities = vectors @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    logger.info(f"Resposta do cache semântico (similaridade {similarities[best]:.3f})")
+                    return entry['answer']
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, scope: str, answer: str) -> None:
+        """Guarda uma resposta, removendo a menos usada se o cache estiver cheio"""
+        with self._lock:
+            self.entries[self._next_id] = {
+                'vector': self._normalize(query_vector),
+                'scope': scope,
+                'answer': answer,
+                'created': time.time(),
+            }
+            self._next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove todas as respostas"""
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de uso do cache"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from src.manifest import hash_text
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def question_id(question: str, given_id: Optional[str] = None) -> str:
+    """ID estável de uma pergunta: o informado ou o hash do texto (não depende da ordem no arquivo)"""
+    return str(given_id) if given_id is not None else hash_text(question)[:16]
+
+
+def normalize_questions(questions: Iterable[Union[str, Dict]]) -> List[Dict]:
+    """Converte perguntas em texto ou dicionários em [{'id', 'question'}]"""
+    items = []
+    for entry in questions:
+        if isinstance(entry, str):
+            entry = {'question': entry}
+        question = (entry.get('question') or '').strip()
+        if not question:
+            raise ValueError(f"Pergunta sem o campo 'question': {entry}")
+        items.append({'id': question_id(question, entry.get('id')), 'question': question})
+    return items
+
+
+def read_questions(path: str) -> List[Dict]:
+    """
+    Lê perguntas de um arquivo JSONL
+
+    Cada linha é um objeto com 'question' e, opcionalmente, 'id'; linhas em branco são ignoradas.
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Linha {number} de {path} não é JSON válido: {e}")
+    return normalize_questions(entries)
+
+
+class BatchCheckpoint:
+    """
+    Resultados de um lote de perguntas em JSONL, gravados à medida que terminam
+
+    O arquivo só recebe linhas novas; ao abrir um checkpoint existente, vale o
+    último resultado de cada ID. Perguntas que terminaram com erro não contam
+    como respondidas e são refeitas na próxima execução.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Arquivo JSONL (None = sem checkpoint, só em memória)
+        """
+        self.path = Path(path) if path else None
+        self.done: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._needs_newline = False
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._needs_newline = not line.endswith("\n")
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última linha cortada por uma interrupção no meio da escrita
+                    logger.warning(f"Linha inválida ignorada no checkpoint {self.path}")
+                    continue
+                if result.get('error'):
+                    self.done.pop(result['id'], None)
+                else:
+                    self.done[result['id']] = result
+        logger.info(f"Checkpoint {self.path}: {len(self.done)} perguntas já respondidas")
+
+    def is_done(self, item_id: str) -> bool:
+        return item_id in self.done
+
+    def write(self, result: Dict) -> None:
+        """Grava um resultado (uma linha, enviada ao disco imediatamente)"""
+        with self._lock:
+            if not result.get('error'):
+                self.done[result['id']] = result
+            if self.path is None:
+                return
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if self._needs_newline:  # não emenda na linha cortada
+                    self._file.write("\n")
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -6,14 +6,162 @@ class RAGConfig:
     # Aumentei o tamanho do chunk para pegar parágrafos inteiros
     CHUNK_SIZE = 1200
     CHUNK_OVERLAP = 300
+    # Unidade do tamanho dos chunks: "chars" ou "tokens" (tokenizer do modelo de embeddings)
+    CHUNK_LENGTH_UNIT = "chars"
+    CHUNK_SIZE_TOKENS = 256  # usados com "tokens"; 256 é o limite do all-MiniLM-L6-v2
+    CHUNK_OVERLAP_TOKENS = 64
 
     # Aumentei para 6 para dar mais contexto ao Llama
     TOP_K_RESULTS = 6
 
+    # Busca: "vector" (apenas Chroma) ou "hybrid" (BM25 + vetorial com RRF; opcional, muda o ranking)
+    RETRIEVAL_MODE = "vector"
+    HYBRID_CANDIDATES = 30  # candidatos buscados em cada ranking antes da fusão
+    RRF_K = 60
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+
+    # Rerank com cross-encoder: busca RERANK_CANDIDATES e envia só os RERANK_TOP_K melhores ao LLM
+    RERANK_ENABLED = False
+    RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # multilíngue (inclui português)
+    RERANK_CANDIDATES = 20
+    RERANK_TOP_K = 4
+    RERANK_BATCH_SIZE = 8
+    RERANK_MAX_LENGTH = 512  # tokens por par (pergunta, chunk)
+    RERANK_LATENCY_BUDGET_MS = 400  # acima disso, mantém a ordem da busca
+
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
     OLLAMA_MODEL = "llama3.2:3b"
+
+    # Reaproveitamento do prompt no Ollama entre turnos da mesma conversa
+    OLLAMA_KEEP_ALIVE = "30m"  # mantém o modelo (e o KV cache) carregado entre perguntas
+    OLLAMA_NUM_CTX = 8192
+    OLLAMA_CONTEXT_REUSE = True  # reenvia o `context` do turno anterior em vez do histórico em texto
+    OLLAMA_CONTEXT_MAX_TOKENS = 4096  # acima disso a conversa recomeça com o histórico em texto
+    OLLAMA_STATUS_TTL = 30  # segundos em que o resultado de ollama.list() é reaproveitado
+    OLLAMA_WARMUP = True  # carrega o modelo no Ollama em segundo plano durante a inicialização
+    OLLAMA_HOSTS = ()  # servidores locais, ex: ("http://127.0.0.1:11434", "http://127.0.0.1:11435"); vazio = OLLAMA_HOST
+    OLLAMA_CONNECT_TIMEOUT = 5.0  # segundos para abrir a conexão
+    OLLAMA_READ_TIMEOUT = 300.0  # segundos sem receber dados (resposta inteira ou entre tokens no streaming)
+    OLLAMA_MAX_CONCURRENCY = 2  # gerações simultâneas por servidor (ver OLLAMA_NUM_PARALLEL)
+    OLLAMA_QUEUE_SIZE = 64  # pedidos esperando vaga; com a fila cheia, OllamaOverloadedError
+    OLLAMA_QUEUE_TIMEOUT = 600.0  # espera máxima na fila, em segundos
+    OLLAMA_RETRIES = 2  # novas tentativas em erros transitórios (conexão, timeout, 429/5xx)
+    OLLAMA_RETRY_BACKOFF = 0.5  # espera aleatória entre 0 e backoff·2^tentativa segundos
+    OLLAMA_RETRY_BACKOFF_MAX = 8.0
+    OLLAMA_ENDPOINT_COOLDOWN = 10.0  # segundos que um servidor com falha fica fora do rodízio
+
+    # Motor de embeddings: lotes ordenados por tamanho e pool de processos em CPU
+    EMBEDDING_BATCH_SIZE = 64
+    EMBEDDING_MAX_BATCH_CHARS = 64 * 1200
+    EMBEDDING_WORKERS = 0  # 0 = sem pool de processos
+    EMBEDDING_NORMALIZE = True
+    EMBEDDING_PRECISION = "float32"  # ou "float16"
+
+    # Cache persistente de embeddings (vetores em .npy mapeado em memória)
+    EMBEDDING_CACHE_DIR = str(Path("./embedding_cache").resolve())
+    EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+    EMBEDDING_CACHE_DTYPE = None  # None = EMBEDDING_PRECISION; "float16" com float32 arredonda os vetores do cache
+    EMBEDDING_CACHE_FLUSH_INTERVAL = 60  # segundos máximos entre vetores novos e a gravação do índice do cache
     PERSIST_DIRECTORY = str(Path("./chroma_db").resolve())
 
+    # Carregamento paralelo de documentos (None = número de CPUs)
+    LOADER_MAX_WORKERS = None
+    # PDFs grandes são divididos em blocos de páginas entre os processos
+    PDF_PAGES_PER_TASK = 50
+    INGEST_BATCH_CHUNKS = 512  # chunks de uma fonte embedados e indexados por vez no build_vectorstore()
+
+    # Web scraping: pool de conexões, concorrência e cache HTTP local
+    HTTP_CACHE_DIR = str(Path("./http_cache").resolve())
+    HTTP_TIMEOUT = 10  # segundos por requisição
+    HTTP_RETRIES = 2
+    HTTP_MAX_WORKERS = 16
+    HTTP_MAX_PER_HOST = 4
+
+    # Extração de HTML: menus, rodapés e blocos com pouco texto ficam de fora
+    HTML_MAX_LINK_DENSITY = 0.5  # fração máxima do texto de um bloco dentro de links
+    HTML_MIN_TEXT_DENSITY = 10  # caracteres por tag exigidos em blocos curtos
+    HTML_SHORT_BLOCK_CHARS = 80
+
+    # Cache semântico de respostas (ignorado quando o histórico da conversa é usado)
+    ANSWER_CACHE_ENABLED = False  # opcional: pode devolver a resposta de uma pergunta apenas parecida
+    ANSWER_CACHE_THRESHOLD = 0.95  # similaridade cosseno mínima entre perguntas
+    ANSWER_CACHE_MAX_ENTRIES = 1000
+    ANSWER_CACHE_TTL = 3600  # segundos
+
+    # Manifesto de ingestão incremental (fica dentro do PERSIST_DIRECTORY)
+    MANIFEST_FILENAME = "ingestion_manifest.json"
+
+    # Backend vetorial: "chroma", "numpy" (busca exata sobre .npy mapeado em memória),
+    # "int8" (quantização escalar, 4x menor) ou "ivfpq" (IVF + product quantization, ~15x menor)
+    VECTOR_BACKEND = "chroma"
+    NUMPY_INDEX_DIR = str(Path(PERSIST_DIRECTORY) / "numpy_index")
+
+    # Índices comprimidos: só os códigos ficam em RAM; os finalistas são reordenados
+    # com os vetores exatos lidos do .npy mapeado em memória
+    QUANT_INDEX_DIR = str(Path(PERSIST_DIRECTORY) / "quantized_index")
+    QUANT_RERANK_FACTOR = 10  # candidatos aproximados por resultado (k x fator) reordenados com o vetor exato
+    QUANT_MIN_VECTORS = 1000  # abaixo disso a busca é exata, sem treinar quantizadores
+    QUANT_RETRAIN_GROWTH = 2.0  # retreina os codebooks quando o índice cresce esse fator desde o treino
+    QUANT_TRAIN_SAMPLE = 50_000  # vetores amostrados para o k-means
+    QUANT_KMEANS_ITERATIONS = 10
+    IVF_NLIST = 0  # listas do particionamento grosso (0 = 2·√n, até 1024)
+    IVF_NPROBE = 16  # listas visitadas por pergunta
+    PQ_SUBVECTORS = 96  # subvetores (= bytes por vetor); precisa dividir a dimensão
+
+    # Índice lexical BM25, persistido ao lado do Chroma
+    LEXICAL_INDEX_DIR = str(Path(PERSIST_DIRECTORY) / "lexical_index")
+
+    # Deduplicação na ingestão: chunks quase idênticos (MinHash + LSH) são indexados uma vez só
+    DEDUP_ENABLED = False  # opcional: ao ativar, o próximo build reindexa e muda as fontes citadas
+    DEDUP_THRESHOLD = 0.8  # similaridade de Jaccard estimada entre os shingles dos chunks
+    DEDUP_NUM_PERM = 128
+    DEDUP_SHINGLE_SIZE = 3  # palavras por shingle
+    DEDUP_INDEX_DIR = str(Path(PERSIST_DIRECTORY) / "dedup_index")
+
+    # Memória: turnos que saem do buffer viram um resumo curto (pergunta + início da resposta)
+    MEMORY_SUMMARY_TOKENS = 300
+    MEMORY_SUMMARY_ANSWER_CHARS = 240
+
+    # Sessões de conversa: "memory" (só neste processo) ou "sqlite" (persistidas e compartilhadas entre processos)
+    SESSION_BACKEND = "memory"
+    SESSION_DB_PATH = str(Path("./sessions.db").resolve())
+    SESSION_TTL = 24 * 3600  # segundos sem atividade até a sessão expirar
+    SESSION_CACHE_MAX = 256  # sessões mantidas em RAM (sqlite); as demais são carregadas sob demanda
+    SESSION_FLUSH_BATCH = 32  # sessões alteradas gravadas juntas em uma transação
+    SESSION_FLUSH_INTERVAL = 2.0  # segundos até gravar um lote incompleto (por uma thread; 0 = grava a cada alteração)
+    SESSION_SWEEP_INTERVAL = 60.0  # segundos entre varreduras das sessões expiradas (memory)
+
+    # Detecção de mudança de assunto por similaridade com o histórico
+    TOPIC_SHIFT_THRESHOLD = 0.35  # similaridade cosseno mínima com alguma mensagem recente
+    TOPIC_SHORT_QUERY_WORDS = 6  # perguntas até esse tamanho com pronomes ("e delas?") são continuações
+    TOPIC_ANSWER_CHARS = 1000  # trecho da resposta usado no embedding do turno
+
+    # Orçamento de tokens do prompt (sistema + histórico + contexto + instruções + pergunta)
+    PROMPT_TOKEN_BUDGET = 3500  # abaixo do num_ctx do modelo, deixando espaço para a resposta
+    HISTORY_TOKEN_BUDGET = 800  # o histórico mais antigo é descartado acima disso
+    CHARS_PER_TOKEN = 3.5  # estimativa para textos em português
+
+    # Servidor HTTP (python main.py serve)
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8000
+    SERVER_MAX_GENERATIONS = 2  # gerações simultâneas no Ollama (com vários OLLAMA_HOSTS, some as vagas de todos)
+    SERVER_WORKERS = 8  # threads para busca e geração
+    SERVER_EMBED_MAX_BATCH = 32  # perguntas por lote de embeddings
+    SERVER_EMBED_MAX_WAIT_MS = 5  # espera máxima para completar um lote
+
+    # Perguntas em lote (python main.py batch perguntas.jsonl): sem memória, com checkpoint JSONL
+    BATCH_MAX_WORKERS = 4  # gerações simultâneas no Ollama (ver OLLAMA_NUM_PARALLEL)
+    BATCH_WINDOW = 256  # perguntas por chamada ao encoder e à busca
+
+    # Tracing por etapa (src/tracing.py): histogramas em memória, GET /metrics/prometheus
+    TRACE_ENABLED = True
+    TRACE_JSONL_PATH = None  # ex: "./traces.jsonl" grava um span por linha
+    TRACE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # segundos
+    TRACE_PROFILE = False  # cProfile + tracemalloc em cada pergunta (ou query(..., profile=True))
+    TRACE_PROFILE_DIR = "./profiles"  # arquivos .prof (abrir com snakeviz ou pstats)
+    TRACE_PROFILE_TOP = 15  # funções mais caras mostradas no log
+
     # Prompt "Analista Sênior"
     SYSTEM_PROMPT = """Você é um Analista de Dados Sênior e Assistente Inteligente. Sua missão é ler os documentos fornecidos e responder às perguntas do usuário de forma didática, organizada e completa.
 
@@ -36,4 +184,24 @@ DIRETRIZES DE RESPOSTA:
    - Se a resposta não estiver no texto, diga: "Não encontrei essa informação específica nos documentos."
 
 4. TOM:
-   - Profissional, objetivo e prestativo."""
\ No newline at end of file
+   - Profissional, objetivo e prestativo."""
+
+    # Instruções fixas, enviadas junto com o SYSTEM_PROMPT. Ficam no início do
+    # prompt e nunca mudam, para que o Ollama reaproveite o KV cache desse prefixo.
+    PROMPT_INSTRUCTIONS = """=== INSTRUÇÕES CRÍTICAS ===
+1. **DETECÇÃO DE MUDANÇA DE ASSUNTO:**
+   - Se a pergunta atual NÃO se relaciona com o histórico (ex: muda completamente de tema), IGNORE o histórico e responda APENAS com base nos documentos.
+   - Exemplo: Se o histórico fala sobre "UBS" e a pergunta é sobre "casa de cachorro", a pergunta NÃO tem relação, então ignore o histórico.
+
+2. **USO DO HISTÓRICO:**
+   - Use o histórico APENAS quando a pergunta se refere explicitamente a algo mencionado antes (palavras como "isso", "elas", "aquilo", "o que você disse").
+   - Exemplo: "Quais são os horários delas?" → "delas" se refere a algo do histórico.
+
+3. **PRIORIDADE:**
+   - SEMPRE responda com base nos DOCUMENTOS, não em inferências.
+   - Se a informação NÃO está nos documentos, diga claramente: "Não encontrei essa informação nos documentos."
+   - NUNCA invente informações ou repita respostas anteriores se não forem relevantes.
+
+4. **CLAREZA:**
+   - Seja direto e conciso.
+   - Não repita informações já ditas a menos que seja solicitado."""
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa rápida de tokens a partir do número de caracteres (sem tokenizer)"""
+    return int(len(text) / RAGConfig.CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def overlap_length(left: str, right: str, max_overlap: int) -> int:
+    """
+    Tamanho do maior sufixo de `left` que também é prefixo de `right`
+
+    Args:
+        left: Texto anterior
+        right: Texto seguinte
+        max_overlap: Maior sobreposição procurada (em caracteres)
+
+    Returns:
+        Número de caracteres sobrepostos (0 se não houver)
+    """
+    limit = min(len(left), len(right), max_overlap)
+    start = len(left) - limit
+    first = right[:1]
+    while first:
+        start = left.find(first, start)
+        if start < 0:
+            return 0
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start += 1
+    return 0
+
+
+class ContextBuilder:
+    """
+    Monta o contexto dos documentos dentro de um orçamento de tokens
+
+    Os chunks chegam em ordem de relevância. Chunks vizinhos da mesma fonte são
+    unidos em um único bloco (removendo o trecho repetido pelo CHUNK_OVERLAP),
+    chunks com o mesmo texto aparecem uma vez só e, se o orçamento não comportar
+    todos, os menos relevantes ficam de fora.
+    """
+
+    SEPARATOR = "\n\n---\n\n"
+
+    def __init__(self, max_overlap: int = RAGConfig.CHUNK_OVERLAP * 2):
+        """
+        Args:
+            max_overlap: Maior sobreposição procurada entre chunks vizinhos (caracteres)
+        """
+        self.max_overlap = max_overlap
+
+    @staticmethod
+    def _position(doc: Document) -> Tuple[Optional[str], Optional[int]]:
+        """(fonte, posição do chunk na fonte), usados para encontrar vizinhos"""
+        chunk_id = doc.metadata.get('chunk_id')
+        source = doc.metadata.get('source_path') or doc.metadata.get('source')
+        if chunk_id is None or source is None:
+            return None, None
+        return source, int(chunk_id)
+
+    def _merge(self, docs: List[Document]) -> Document:
+        """Une chunks consecutivos da mesma fonte em um único Document"""
+        text = docs[0].page_content
+        for previous, doc in zip(docs, docs[1:]):
+            if 'end' in previous.metadata and 'start' in doc.metadata:
+                # Offsets do chunker: a sobreposição é conhecida sem comparar os textos
+                overlap = max(previous.metadata['end'] - doc.metadata['start'], 0)
+            else:
+                overlap = overlap_length(previous.page_content, doc.page_content, self.max_overlap)
+            text += doc.page_content[overlap:] if overlap else "\n" + doc.page_content
+
+        metadata = dict(docs[0].metadata)
+        if len(docs) > 1:
+            metadata['chunk_ids'] = [doc.metadata.get('chunk_id') for doc in docs]
+            if 'page' in docs[-1].metadata:
+                metadata['page_end'] = docs[-1].metadata.get('page_end', docs[-1].metadata['page'])
+        return Document(page_content=text, metadata=metadata)
+
+    def _layout(self, selected: List[Tuple[int, Document]]) -> List[Document]:
+        """Agrupa os chunks selecionados em blocos, ordenados pelo chunk mais relevante de cada um"""
+        positioned: Dict[str, List[Tuple[int, int, Document]]] = {}
+        blocks: List[Tuple[int, List[Document]]] = []
+        for rank, doc in selected:
+            source, chunk_id = self._position(doc)
+            if source is None:
+                blocks.append((rank, [doc]))
+            else:
+                positioned.setdefault(source, []).append((chunk_id, rank, doc))
+
+        for chunks in positioned.values():
+            chunks.sort(key=lambda item: item[0])
+            run = [chunks[0]]
+            for item in chunks[1:]:
+                if item[0] == run[-1][0] + 1:
+                    run.append(item)
+                else:
+                    blocks.append((min(rank for _, rank, _ in run), [doc for _, _, doc in run]))
+                    run = [item]
+            blocks.append((min(rank for _, rank, _ in run), [doc for _, _, doc in run]))
+
+        blocks.sort(key=lambda block: block[0])
+        return [self._merge(docs) for _, docs in blocks]
+
+    def render(self, blocks: List[Document], citation) -> str:
+        return self.SEPARATOR.join(f"[Fonte: {citation(doc)}]\n{doc.page_content}" for doc in blocks)
+
+    def build(self, context_docs: List[Document], budget_tokens: int, citation) -> Tuple[str, Dict[str, int]]:
+        """
+        Monta o texto do contexto respeitando o orçamento
+
+        Args:
+            context_docs: Chunks em ordem decrescente de relevância
+            budget_tokens: Tokens disponíveis para o contexto
+            citation: Função que formata a fonte de um Document
+
+        Returns:
+            (texto do contexto, estatísticas: chunks recebidos/duplicados/descartados, blocos, tokens)
+        """
+        stats = {'chunks': len(context_docs), 'duplicates': 0, 'dropped': 0, 'blocks': 0, 'tokens': 0}
+
+        # Textos idênticos (ex: mesma página indexada por duas fontes) entram uma vez
+        seen = set()
+        unique: List[Tuple[int, Document]] = []
+        for rank, doc in enumerate(context_docs):
+            digest = hashlib.sha1(doc.page_content.encode('utf-8')).digest()
+            if digest in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(digest)
+            unique.append((rank, doc))
+
+        # Inclui os chunks por relevância enquanto o contexto montado couber no orçamento
+        selected: List[Tuple[int, Document]] = []
+        context = ""
+        for item in unique:
+            candidate = self.render(self._layout(selected + [item]), citation)
+            if estimate_tokens(candidate) <= budget_tokens or not selected:
+                selected.append(item)
+                context = candidate
+            else:
+                stats['dropped'] += 1
+
+        if selected and estimate_tokens(context) > budget_tokens:
+            # Nem o chunk mais relevante cabe inteiro: corta no limite do orçamento
+            context = context[:int(budget_tokens * RAGConfig.CHARS_PER_TOKEN)]
+
+        stats['blocks'] = len(self._layout(selected)) if selected else 0
+        stats['tokens'] = estimate_tokens(context)
+        return context, stats
@@ -0,0 +1,224 @@
+import json
+import logging
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import RAGConfig
+from src.lexical import tokenize
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Escolhe (bandas, linhas por banda) para o LSH
+
+    Um par com similaridade s vira candidato com probabilidade 1 - (1 - s^r)^b;
+    o ponto de inflexão (1/b)^(1/r) fica próximo do limiar, um pouco abaixo,
+    para perder poucos duplicados (os candidatos são confirmados depois).
+    """
+    best = (num_perm, 1)
+    best_error = float('inf')
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        inflection = (1 / bands) ** (1 / rows)
+        error = abs(inflection - (threshold - 0.1))
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Detecta chunks quase idênticos com MinHash + LSH
+
+    Cada chunk vira um conjunto de shingles (sequências de `shingle_size`
+    palavras normalizadas) resumido em `num_perm` mínimos de hashes. Chunks que
+    coincidem em alguma banda do LSH são comparados pela similaridade de
+    Jaccard estimada; acima do limiar, o novo chunk não é indexado e fica
+    registrado como duplicata do chunk já indexado (proveniência), para que as
+    citações mostrem todas as fontes.
+
+    As duplicatas guardam texto e metadados: se a fonte do chunk indexado sair
+    do índice, a primeira duplicata é promovida e indexada no lugar dele.
+    """
+
+    def __init__(self, directory: str = RAGConfig.DEDUP_INDEX_DIR,
+                 threshold: float = RAGConfig.DEDUP_THRESHOLD,
+                 num_perm: int = RAGConfig.DEDUP_NUM_PERM,
+                 shingle_size: int = RAGConfig.DEDUP_SHINGLE_SIZE):
+        """
+        Inicializa o índice (carregando do disco, se existir)
+
+        Args:
+            directory: Diretório onde assinaturas e proveniência são gravadas
+            threshold: Similaridade de Jaccard mínima para considerar duplicata
+            num_perm: Número de funções de hash da assinatura MinHash
+            shingle_size: Palavras por shingle
+        """
+        self.directory = Path(directory)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+
+        rng = np.random.default_rng(1)  # semente fixa: assinaturas gravadas continuam válidas
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self._reset()
+        self.load()
+
+    def _reset(self) -> None:
+        self.signatures: Dict[str, np.ndarray] = {}  # chunk_uid indexado -> assinatura
+        self.buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self.duplicates: Dict[str, List[Dict]] = {}  # chunk_uid indexado -> [{'text', 'metadata'}]
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Assinatura MinHash (uint32) dos shingles de palavras do texto"""
+        words = tokenize(text)
+        if len(words) <= self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size])
+                        for i in range(len(words) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles),
+                             dtype=np.uint64, count=len(shingles)) % _MERSENNE_PRIME
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        Procura um chunk indexado quase idêntico
+
+        Returns:
+            (chunk_uid, similaridade estimada) do candidato mais parecido acima do limiar, ou None
+        """
+        candidates: Set[str] = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+
+        best: Optional[Tuple[str, float]] = None
+        for chunk_uid in candidates:
+            similarity = float(np.mean(self.signatures[chunk_uid] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (chunk_uid, similarity)
+        return best
+
+    def add(self, chunk_uid: str, signature: np.ndarray) -> None:
+        """Registra um chunk indexado"""
+        self.signatures[chunk_uid] = signature
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(chunk_uid)
+
+    def add_duplicate(self, chunk_uid: str, doc: Document) -> None:
+        """Registra `doc` como duplicata (não indexada) do chunk `chunk_uid`"""
+        self.duplicates.setdefault(chunk_uid, []).append(
+            {'text': doc.page_content, 'metadata': dict(doc.metadata)}
+        )
+
+    def remove(self, chunk_uids: Iterable[str]) -> List[Document]:
+        """
+        Remove chunks que saíram do índice
+
+        Returns:
+            Duplicatas promovidas: precisam ser indexadas no lugar dos chunks removidos
+        """
+        promoted = []
+        for chunk_uid in chunk_uids:
+            signature = self.signatures.pop(chunk_uid, None)
+            if signature is None:
+                continue
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(chunk_uid)
+                    if not bucket:
+                        del self.buckets[key]
+
+            duplicates = self.duplicates.pop(chunk_uid, [])
+            if duplicates:
+                first, rest = duplicates[0], duplicates[1:]
+                doc = Document(page_content=first['text'], metadata=first['metadata'])
+                new_uid = doc.metadata['chunk_uid']
+                self.add(new_uid, signature)
+                if rest:
+                    self.duplicates[new_uid] = rest
+                promoted.append(doc)
+        return promoted
+
+    def remove_sources(self, sources: Set[str]) -> None:
+        """Descarta as duplicatas vindas de fontes removidas ou que serão reindexadas"""
+        for chunk_uid in list(self.duplicates):
+            kept = [dup for dup in self.duplicates[chunk_uid]
+                    if dup['metadata'].get('source_path') not in sources]
+            if kept:
+                self.duplicates[chunk_uid] = kept
+            else:
+                del self.duplicates[chunk_uid]
+
+    def provenance(self, chunk_uid: Optional[str]) -> List[Dict]:
+        """Metadados das duplicatas de um chunk indexado (outras fontes com o mesmo texto)"""
+        return [dup['metadata'] for dup in self.duplicates.get(chunk_uid, [])]
+
+    def stats(self) -> Dict[str, int]:
+        """Chunks indexados e duplicatas evitadas (acumulado no índice)"""
+        duplicates = [dup for dups in self.duplicates.values() for dup in dups]
+        return {
+            'indexed': len(self.signatures),
+            'duplicates': len(duplicates),
+            'duplicate_chars': sum(len(dup['text']) for dup in duplicates),
+        }
+
+    def save(self) -> None:
+        """Grava assinaturas e proveniência no diretório configurado"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        ids = list(self.signatures)
+        matrix = (np.stack([self.signatures[i] for i in ids]) if ids
+                  else np.zeros((0, self.num_perm), dtype=np.uint32))
+        tmp_path = self.directory / "signatures.tmp.npy"
+        np.save(tmp_path, matrix)
+        tmp_path.replace(self.directory / "signatures.npy")
+
+        tmp_path = self.directory / "meta.tmp.json"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'num_perm': self.num_perm, 'shingle_size': self.shingle_size,
+                       'ids': ids, 'duplicates': self.duplicates}, f, ensure_ascii=False)
+        tmp_path.replace(self.directory / "meta.json")
+
+    def load(self) -> None:
+        """Carrega o índice do disco, se existir e tiver os mesmos parâmetros"""
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['num_perm'] != self.num_perm or meta['shingle_size'] != self.shingle_size:
+                logger.warning("Parâmetros do MinHash mudaram, índice de duplicatas será reconstruído")
+                return
+            matrix = np.load(self.directory / "signatures.npy")
+            for chunk_uid, signature in zip(meta['ids'], matrix):
+                self.add(chunk_uid, signature)
+            self.duplicates = meta['duplicates']
+            logger.info(f"Índice de duplicatas carregado: {len(self.signatures)} chunks, "
+                        f"{sum(len(d) for d in self.duplicates.values())} duplicatas")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Índice de duplicatas inválido ({e}), será reconstruído")
+            self._reset()
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import RAGConfig
+from src.tracing import tracer
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Motor de embeddings com controle de lote, processos e formato dos vetores
+
+    Os textos são ordenados por tamanho antes de formar os lotes, o que reduz
+    o padding dentro de cada lote; lotes de textos longos são encurtados para
+    respeitar um orçamento de caracteres. Em hosts só com CPU, um pool de
+    processos do sentence-transformers pode dividir o trabalho.
+    """
+
+    def __init__(self, model_name: str = RAGConfig.EMBEDDING_MODEL,
+                 batch_size: int = RAGConfig.EMBEDDING_BATCH_SIZE,
+                 max_batch_chars: int = RAGConfig.EMBEDDING_MAX_BATCH_CHARS,
+                 num_workers: int = RAGConfig.EMBEDDING_WORKERS,
+                 normalize: bool = RAGConfig.EMBEDDING_NORMALIZE,
+                 precision: str = RAGConfig.EMBEDDING_PRECISION,
+                 device: str = "cpu",
+                 background: bool = False):
+        """
+        Inicializa o motor de embeddings
+
+        Args:
+            model_name: Modelo do sentence-transformers
+            batch_size: Máximo de textos por lote
+            max_batch_chars: Máximo de caracteres (textos x maior texto) por lote
+            num_workers: Processos de CPU para lotes grandes (0 = processo atual)
+            normalize: Se True, normaliza os vetores (norma L2 = 1)
+            precision: 'float32' ou 'float16' (vetores arredondados para meia precisão)
+            device: Dispositivo do modelo ('cpu', 'cuda', ...)
+            background: Se True, carrega o modelo numa thread enquanto a inicialização continua
+        """
+        if precision not in ('float32', 'float16'):
+            raise ValueError(f"Precisão não suportada: {precision}. Use 'float32' ou 'float16'")
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.num_workers = num_workers
+        self.normalize = normalize
+        self.precision = precision
+        self.device = device
+
+        self._model = None
+        self._load_error: Optional[BaseException] = None
+        self._load_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self._pool = None
+        if background:
+            threading.Thread(target=self._load_quietly, name="embedding-load", daemon=True).start()
+
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self.last_report: Dict[str, float] = {}
+
+    def _load(self):
+        """Carrega o modelo uma única vez (a importação do sentence-transformers também fica aqui)"""
+        with self._load_lock:
+            if self._model is None:
+                if self._load_error is not None:
+                    raise self._load_error
+                started = time.perf_counter()
+                logger.info(f"Carregando modelo de embeddings {self.model_name} ({self.device})")
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+                except Exception as e:
+                    self._load_error = e
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                tracer.record('startup_embedding_model', self.load_seconds)
+                logger.info(f"Modelo de embeddings carregado em {self.load_seconds:.2f}s")
+            return self._model
+
+    def _load_quietly(self) -> None:
+        try:
+            self._load()
+        except Exception as e:  # o erro reaparece no primeiro uso do modelo
+            logger.error(f"Erro ao carregar o modelo de embeddings em segundo plano: {e}")
+
+    @property
+    def model(self):
+        """Modelo do sentence-transformers; espera o carregamento em segundo plano, se houver"""
+        return self._model if self._model is not None else self._load()
+
+    @property
+    def cache_namespace(self) -> str:
+        """Identifica modelo + normalização + precisão, para não misturar vetores incompatíveis em cache"""
+        return f"{self.model_name}@{'norm' if self.normalize else 'raw'}@{self.precision}"
+
+    def _plan_batches(self, order: np.ndarray, lengths: np.ndarray) -> List[np.ndarray]:
+        """Agrupa índices (já ordenados por tamanho) em lotes dentro do orçamento de caracteres"""
+        batches = []
+        start = 0
+        while start < len(order):
+            longest = max(int(lengths[order[start]]), 1)
+            size = max(1, min(self.batch_size, self.max_batch_chars // longest))
+            batches.append(order[start:start + size])
+            start += size
+        return batches
+
+    def _start_pool(self):
+        if self._pool is None:
+            logger.info(f"Iniciando pool de {self.num_workers} processos de embedding")
+            self._pool = self.model.start_multi_process_pool(target_devices=[self.device] * self.num_workers)
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self) -> None:
+        """Encerra o pool de processos, se existir"""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Gera os embeddings de uma lista de textos, preservando a ordem de entrada
+
+        Returns:
+            Matriz (len(texts), dimensão) em float32
+        """
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        started = time.perf_counter()
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        order = np.argsort(-lengths, kind='stable')
+        vectors = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        if self.num_workers > 1 and len(texts) >= self.batch_size * self.num_workers:
+            # Textos já ordenados: cada bloco enviado a um processo tem tamanhos parecidos
+            encoded = self.model.encode_multi_process(
+                [texts[i] for i in order], self._start_pool(),
+                batch_size=self.batch_size, normalize_embeddings=self.normalize
+            )
+            vectors[order] = encoded
+        else:
+            for batch in self._plan_batches(order, lengths):
+                vectors[batch] = self.model.encode(
+                    [texts[i] for i in batch], batch_size=len(batch),
+                    normalize_embeddings=self.normalize, convert_to_numpy=True, show_progress_bar=False
+                )
+
+        if self.precision == 'float16':
+            vectors = vectors.astype(np.float16).astype(np.float32)
+
+        elapsed = time.perf_counter() - started
+        tracer.record('embed', elapsed, {'chunks': len(texts), 'chars': int(lengths.sum())})
+        self.total_chunks += len(texts)
+        self.total_seconds += elapsed
+        self.last_report = {
+            'chunks': len(texts),
+            'seconds': elapsed,
+            'chunks_per_second': len(texts) / elapsed if elapsed > 0 else 0.0,
+        }
+        logger.info(f"Embeddings: {len(texts)} chunks em {elapsed:.2f}s "
+                    f"({self.last_report['chunks_per_second']:.1f} chunks/s)")
+        return vectors
+
+    def count_tokens(self, text: str) -> int:
+        """Número de tokens do texto no tokenizer do modelo (sem tokens especiais)"""
+        return len(self.model.tokenizer(text, add_special_tokens=False, verbose=False)['input_ids'])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Interface do LangChain para embeddings de chunks"""
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Interface do LangChain para o embedding de uma pergunta"""
+        return self.encode([text])[0].tolist()
+
+    def throughput_report(self, since: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Throughput acumulado desde a criação do motor
+
+        Args:
+            since: Relatório anterior; se informado, conta só o que foi codificado depois dele
+        """
+        chunks = self.total_chunks - (since['chunks'] if since else 0)
+        seconds = self.total_seconds - (since['seconds'] if since else 0.0)
+        return {
+            'chunks': chunks,
+            'seconds': seconds,
+            'chunks_per_second': chunks / seconds if seconds > 0 else 0.0,
+            'batch_size': self.batch_size,
+            'workers': self.num_workers,
+        }
@@ -0,0 +1,222 @@
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espaços em branco para que variações triviais compartilhem o mesmo vetor"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings indexado pelo hash do texto
+
+    Os vetores ficam em um arquivo .npy mapeado em memória (na precisão dos
+    embeddings, por padrão) e o índice chave -> posição em um JSON, mantido em
+    ordem LRU. Quando o limite de entradas é atingido, a posição da entrada
+    menos usada é reaproveitada. Vetores novos marcam o cache como alterado;
+    o índice é regravado em flush() (ao fim do build_vectorstore(), ao
+    encerrar o processo ou a cada `flush_interval` segundos com alterações).
+    """
+
+    def __init__(self, model_name: str = RAGConfig.EMBEDDING_MODEL,
+                 cache_dir: str = RAGConfig.EMBEDDING_CACHE_DIR,
+                 max_entries: int = RAGConfig.EMBEDDING_CACHE_MAX_ENTRIES,
+                 dtype: Optional[str] = RAGConfig.EMBEDDING_CACHE_DTYPE,
+                 flush_interval: float = RAGConfig.EMBEDDING_CACHE_FLUSH_INTERVAL):
+        """
+        Inicializa o cache
+
+        Args:
+            model_name: Namespace do modelo de embeddings (cada namespace + dtype tem seu próprio subdiretório)
+            cache_dir: Diretório raiz do cache
+            max_entries: Número máximo de vetores mantidos
+            dtype: Tipo de armazenamento dos vetores ('float16' ou 'float32'; None = EMBEDDING_PRECISION)
+            flush_interval: Segundos máximos entre uma alteração e a gravação do índice
+        """
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.dtype = np.dtype(dtype or RAGConfig.EMBEDDING_PRECISION)
+        self.model_name = f"{model_name}@{self.dtype.name}"
+        self.directory = Path(cache_dir) / self.model_name.replace('/', '__')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / 'vectors.npy'
+        self.index_path = self.directory / 'index.json'
+
+        self.index: "OrderedDict[str, int]" = OrderedDict()  # chave -> linha, do menos ao mais recente
+        self.free_slots: List[int] = []
+        self.vectors: Optional[np.memmap] = None
+        self.dimension: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self) -> None:
+        if not (self.index_path.exists() and self.vectors_path.exists()):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            vectors = np.load(self.vectors_path, mmap_mode='r+')
+            if vectors.dtype != self.dtype:
+                raise ValueError(f"dtype {vectors.dtype} diferente do configurado ({self.dtype})")
+            self.vectors = vectors
+            self.dimension = vectors.shape[1]
+            self.index = OrderedDict((key, slot) for key, slot in data['entries'])
+            used = set(self.index.values())
+            self.free_slots = [slot for slot in range(len(vectors)) if slot not in used]
+            logger.info(f"Cache de embeddings carregado: {len(self.index)} vetores")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cache de embeddings inválido ({e}), recriando")
+            self.index = OrderedDict()
+            self.vectors = None
+            self.dimension = None
+
+    def key(self, text: str) -> str:
+        """Chave do cache: hash do namespace (modelo, normalização, precisão e dtype) + texto normalizado"""
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Retorna o vetor (float32) de uma chave, ou None"""
+        with self._lock:
+            slot = self.index.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)  # a ordem LRU vai para o disco no próximo flush() com vetores novos
+            self.hits += 1
+            return np.array(self.vectors[slot], dtype=np.float32)
+
+    def _grow(self, rows: int) -> None:
+        """Aumenta o arquivo de vetores para comportar `rows` linhas"""
+        current = 0 if self.vectors is None else len(self.vectors)
+        new_size = min(self.max_entries, max(rows, current * 2, 1024))
+        tmp_path = self.vectors_path.with_suffix('.tmp.npy')
+        grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=self.dtype, shape=(new_size, self.dimension))
+        if current:
+            grown[:current] = self.vectors[:current]
+        grown.flush()
+        del grown
+        self.vectors = None
+        tmp_path.replace(self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode='r+')
+        self.free_slots.extend(range(current, new_size))
+
+    def put(self, key: str, vector) -> None:
+        """Grava um vetor, removendo a entrada menos usada se o cache estiver cheio"""
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vector.shape[0]
+            if vector.shape[0] != self.dimension:
+                raise ValueError(f"Dimensão {vector.shape[0]} incompatível com o cache ({self.dimension})")
+
+            slot = self.index.get(key)
+            if slot is None:
+                if not self.free_slots and (self.vectors is None or len(self.vectors) < self.max_entries):
+                    self._grow(len(self.index) + 1)
+                if self.free_slots:
+                    slot = self.free_slots.pop()
+                else:
+                    # Cache cheio: reaproveita a linha da entrada menos usada
+                    _, slot = self.index.popitem(last=False)
+
+            self.vectors[slot] = vector.astype(self.dtype)
+            self.index[key] = slot
+            self.index.move_to_end(key)
+            self._dirty = True
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """Grava o índice e os vetores no disco"""
+        with self._lock:
+            if not self._dirty or self.vectors is None:
+                return
+            self.vectors.flush()
+            tmp_path = self.index_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'model': self.model_name, 'entries': list(self.index.items())}, f)
+            tmp_path.replace(self.index_path)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def stats(self) -> dict:
+        """Estatísticas de uso do cache"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.index),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings do LangChain que consultam o EmbeddingCache antes do modelo"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        """
+        Args:
+            embeddings: Modelo de embeddings real (ex: HuggingFaceEmbeddings)
+            cache: Cache persistente de vetores
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Gera embeddings de chunks, enviando ao modelo apenas textos ainda não vistos"""
+        keys = [self.cache.key(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        # Agrupa textos repetidos (mesma chave) para codificar uma única vez
+        missing = {}
+        for i, key in enumerate(keys):
+            vector = self.cache.get(key) if key not in missing else None
+            if vector is not None:
+                results[i] = vector.tolist()
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            unique_keys = list(missing)
+            vectors = self.embeddings.embed_documents([texts[missing[key][0]] for key in unique_keys])
+            for key, vector in zip(unique_keys, vectors):
+                self.cache.put(key, vector)
+                for i in missing[key]:
+                    results[i] = list(vector)
+
+        logger.info(f"Embeddings: {len(texts) - sum(len(v) for v in missing.values())} do cache, "
+                    f"{len(missing)} calculados")
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera o embedding de uma pergunta, consultando o cache primeiro"""
+        key = self.cache.key(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector.tolist()
+        vector = self.embeddings.embed_query(text)
+        self.cache.put(key, vector)
+        return list(vector)
@@ -0,0 +1,240 @@
+import bisect
+import logging
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.config import RAGConfig
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml é opcional: sem ele, o BeautifulSoup (html.parser) percorre a árvore
+    lxml = None
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Elementos cujo conteúdo nunca é texto da página
+DROP_TAGS = frozenset({
+    'head', 'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'button',
+    'select', 'nav', 'footer', 'aside', 'menu',
+})
+BLOCK_TAGS = frozenset({
+    'p', 'div', 'section', 'article', 'main', 'header', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'table', 'thead', 'tbody', 'tr', 'td', 'th', 'caption', 'pre', 'blockquote', 'figcaption',
+    'address', 'br', 'hr', 'body', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+})
+HEADING_TAGS = {f"h{level}": level for level in range(1, 7)}
+# Contêineres da página inteira: nunca descartados pela class/id (ex: <body class="has-sidebar">)
+CONTAINER_TAGS = frozenset({'html', 'body', 'main', 'article'})
+# Classes/ids (tokens inteiros) típicos de menus, banners de cookies e barras de compartilhamento;
+# nomes compostos como "content-with-sidebar" ficam para o filtro de densidade de links
+BOILERPLATE_MARKERS = frozenset({
+    'nav', 'navbar', 'menu', 'breadcrumb', 'breadcrumbs', 'cookie', 'cookies', 'cookie-banner',
+    'consent', 'banner', 'sidebar', 'footer', 'social', 'share', 'advert', 'ads', 'skip-link',
+    'newsletter', 'popup', 'modal', 'rodape', 'cabecalho',
+})
+HEADING_LINE_RE = re.compile(r"^(#{1,6}) (.+)$", re.MULTILINE)
+
+
+class HTMLExtractor:
+    """
+    Extrai o texto principal de páginas HTML
+
+    A árvore é percorrida uma única vez (lxml quando instalado, senão o
+    html.parser do BeautifulSoup), pulando subárvores de navegação, rodapé,
+    barras laterais e elementos cuja class/id contém um marcador de boilerplate
+    como token inteiro (html, body, main e article nunca são descartados por
+    isso). O texto é agrupado em blocos; blocos formados quase só por links
+    (menus) ou com pouco texto para a quantidade de tags são descartados. Os títulos (h1-h6) viram linhas
+    "## Título", de onde heading_sections() recupera a estrutura da página.
+    """
+
+    VERSION = "blocks-2"  # muda quando o texto extraído muda (invalida o cache HTTP)
+
+    def __init__(self, max_link_density: float = RAGConfig.HTML_MAX_LINK_DENSITY,
+                 min_text_density: float = RAGConfig.HTML_MIN_TEXT_DENSITY,
+                 parser: Optional[str] = None):
+        """
+        Args:
+            max_link_density: Fração máxima do texto de um bloco dentro de links
+            min_text_density: Mínimo de caracteres por tag em blocos curtos
+            parser: "lxml" ou "html.parser" (padrão: lxml se estiver instalado)
+        """
+        self.max_link_density = max_link_density
+        self.min_text_density = min_text_density
+        self.parser = parser or ("lxml" if lxml is not None else "html.parser")
+        if self.parser == "lxml" and lxml is None:
+            raise ValueError("lxml não está instalado. Use parser='html.parser'")
+
+    @staticmethod
+    def _is_boilerplate(tag: str, attributes: Dict) -> bool:
+        if tag in DROP_TAGS:
+            return True
+        if attributes.get('hidden') is not None or attributes.get('aria-hidden') == 'true':
+            return True
+        if attributes.get('role') in ('navigation', 'banner', 'contentinfo', 'complementary', 'dialog'):
+            return True
+        if tag in CONTAINER_TAGS:
+            return False
+        markers = f"{attributes.get('id') or ''} {attributes.get('class') or ''}".lower().split()
+        return any(marker in BOILERPLATE_MARKERS for marker in markers)
+
+    @staticmethod
+    def _events_lxml(content: bytes) -> Iterator[Tuple[str, str]]:
+        """Eventos (start/end/text) da árvore do lxml, pulando subárvores de boilerplate"""
+        try:
+            root = lxml.html.fromstring(content)
+        except (etree.ParserError, ValueError):
+            return  # documento vazio
+        stack = [(root, False)]
+        while stack:
+            element, closing = stack.pop()
+            tag = element.tag
+            if not isinstance(tag, str):
+                # Comentários e instruções de processamento: só o texto depois deles conta
+                if element.tail:
+                    yield 'text', element.tail
+                continue
+            if closing:
+                yield 'end', tag.lower()
+                if element.tail:
+                    yield 'text', element.tail
+                continue
+
+            tag = tag.lower()
+            if HTMLExtractor._is_boilerplate(tag, element.attrib):
+                if element.tail:
+                    yield 'text', element.tail
+                continue
+            yield 'start', tag
+            if element.text:
+                yield 'text', element.text
+            stack.append((element, True))
+            stack.extend((child, False) for child in reversed(element))
+
+    @staticmethod
+    def _events_bs4(content: bytes) -> Iterator[Tuple[str, str]]:
+        """Eventos equivalentes a _events_lxml a partir do BeautifulSoup (html.parser)"""
+        from bs4 import BeautifulSoup, NavigableString
+        from bs4.element import Comment, Declaration, Doctype, ProcessingInstruction
+
+        skipped = (Comment, Declaration, Doctype, ProcessingInstruction)
+        stack = [(BeautifulSoup(content, 'html.parser'), False)]
+        while stack:
+            node, closing = stack.pop()
+            if isinstance(node, NavigableString):
+                if not isinstance(node, skipped):
+                    yield 'text', str(node)
+                continue
+            tag = (node.name or '').lower()
+            if closing:
+                yield 'end', tag
+                continue
+            attributes = {key: " ".join(value) if isinstance(value, list) else value
+                          for key, value in node.attrs.items()}
+            if HTMLExtractor._is_boilerplate(tag, attributes):
+                continue
+            yield 'start', tag
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.contents))
+
+    def _keep(self, text: str, link_chars: int, tags: int) -> bool:
+        """Filtro de densidade: descarta menus (muitos links) e blocos curtos com muitas tags"""
+        if link_chars / len(text) > self.max_link_density:
+            return False
+        if tags and len(text) < RAGConfig.HTML_SHORT_BLOCK_CHARS and len(text) / tags < self.min_text_density:
+            return False
+        return True
+
+    def extract(self, content: bytes) -> str:
+        """
+        Extrai o texto principal de um documento HTML
+
+        Args:
+            content: HTML bruto (bytes ou str)
+
+        Returns:
+            Texto com um bloco por linha e títulos no formato "## Título"
+        """
+        events = self._events_lxml(content) if self.parser == "lxml" else self._events_bs4(content)
+
+        lines: List[str] = []
+        parts: List[str] = []
+        link_chars = 0
+        tags = 0
+        in_link = 0
+        heading = 0
+        dropped = 0
+
+        def flush():
+            nonlocal link_chars, tags, dropped
+            text = " ".join(" ".join(parts).split())
+            if text:
+                if heading:
+                    lines.append("#" * heading + " " + text)
+                elif self._keep(text, link_chars, tags):
+                    lines.append(text)
+                else:
+                    dropped += 1
+            parts.clear()
+            link_chars = 0
+            tags = 0
+
+        for kind, value in events:
+            if kind == 'text':
+                parts.append(value)
+                if in_link:
+                    link_chars += len(value.strip())
+            elif value in BLOCK_TAGS:
+                flush()
+                if value in HEADING_TAGS:
+                    heading = HEADING_TAGS[value] if kind == 'start' else 0
+            elif value == 'a':
+                in_link += 1 if kind == 'start' else -1
+                tags += kind == 'start'
+            else:
+                tags += kind == 'start'
+        flush()
+
+        # Títulos sem conteúdo até o próximo título de mesmo nível (ex: "Leia também"
+        # seguido só de links descartados) não formam seção
+        kept: List[str] = []
+        for line in reversed(lines):
+            level = len(line) - len(line.lstrip('#')) if line.startswith('#') else 0
+            if level:
+                next_level = len(kept[-1]) - len(kept[-1].lstrip('#')) if kept else 1
+                if next_level and next_level <= level:
+                    dropped += 1
+                    continue
+            kept.append(line)
+        kept.reverse()
+
+        logger.debug(f"HTML ({self.parser}): {len(kept)} blocos mantidos, {dropped} descartados")
+        return "\n".join(kept)
+
+
+def heading_sections(text: str) -> Tuple[List[int], List[str]]:
+    """
+    Estrutura de títulos de um texto extraído por HTMLExtractor
+
+    Returns:
+        (offsets onde cada seção começa, caminho de títulos da seção, ex: "Unidades > Horários")
+    """
+    offsets: List[int] = []
+    paths: List[str] = []
+    path: List[Tuple[int, str]] = []
+    for match in HEADING_LINE_RE.finditer(text):
+        level = len(match.group(1))
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, match.group(2).strip()))
+        offsets.append(match.start())
+        paths.append(" > ".join(title for _, title in path))
+    return offsets, paths
+
+
+def section_at(offsets: List[int], paths: List[str], position: int) -> Optional[str]:
+    """Caminho de títulos da seção que contém a posição `position` do texto"""
+    index = bisect.bisect_right(offsets, position) - 1
+    return paths[index] if index >= 0 else None
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class HTTPCache:
+    """Cache local de páginas web com validadores HTTP (ETag / Last-Modified)"""
+
+    def __init__(self, cache_dir: str = RAGConfig.HTTP_CACHE_DIR):
+        """
+        Inicializa o cache
+
+        Args:
+            cache_dir: Diretório onde as entradas são gravadas (um JSON por URL)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Retorna a entrada em cache da URL ({'etag', 'last_modified', 'text'}) ou None"""
+        path = self._path(url)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de cache inválida para {url}: {e}")
+            return None
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """Monta os cabeçalhos de revalidação para uma entrada em cache"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url: str, response_headers, text: str, extractor: Optional[str] = None) -> None:
+        """
+        Grava o texto extraído de uma resposta
+
+        `extractor` identifica a versão do extrator de HTML que gerou o texto.
+
+        Só respostas com ETag ou Last-Modified são gravadas, pois sem
+        validadores não há como revalidar a página depois.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        path = self._path(url)
+        entry = {'url': url, 'etag': etag, 'last_modified': last_modified, 'text': text, 'extractor': extractor}
+        with self._lock:
+            tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            tmp_path.replace(path)
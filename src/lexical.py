@@ -0,0 +1,268 @@
+import json
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_COMBINING_RE = re.compile(r"[\u0300-\u036f]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeniza em minúsculas e sem acentos ("Saúde" e "saude" viram o mesmo termo)"""
+    text = _COMBINING_RE.sub("", unicodedata.normalize('NFKD', text.lower()))
+    return _TOKEN_RE.findall(text)
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 em memória, persistido como arrays NumPy
+
+    As postings ficam em formato CSR (indptr / docs / tf por termo), de modo
+    que a pontuação de uma pergunta percorre apenas as postings dos termos da
+    pergunta, com operações vetorizadas. Adições ficam pendentes e remoções
+    marcam o documento como inativo até o próximo commit(), que reconstrói os
+    arrays compactados.
+    """
+
+    def __init__(self, directory: str = RAGConfig.LEXICAL_INDEX_DIR,
+                 k1: float = RAGConfig.BM25_K1, b: float = RAGConfig.BM25_B):
+        """
+        Inicializa o índice (carregando do disco, se existir)
+
+        Args:
+            directory: Diretório onde os arrays do índice são gravados
+            k1: Parâmetro de saturação de frequência do BM25
+            b: Parâmetro de normalização por tamanho do BM25
+        """
+        self.directory = Path(directory)
+        self.k1 = k1
+        self.b = b
+
+        self._reset()
+        self.load()
+
+    def _reset(self) -> None:
+        self.vocab: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.id_to_doc: Dict[str, int] = {}
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        self.length_norm = np.zeros(0, dtype=np.float32)
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []  # (termos, docs, tf)
+        self._dirty = False  # alterado desde o último load()/save()
+
+    def __len__(self) -> int:
+        return len(self.id_to_doc)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]) -> None:
+        """Adiciona documentos (ficam pesquisáveis após commit())"""
+        first_doc = len(self.doc_ids)
+        terms, docs, tfs, lengths = [], [], [], []
+        replaced = []
+        for chunk_uid, text in zip(ids, texts):
+            if chunk_uid in self.id_to_doc:
+                replaced.append(self.id_to_doc[chunk_uid])
+
+            doc = len(self.doc_ids)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                terms.append(term_id)
+                docs.append(doc)
+                tfs.append(tf)
+            lengths.append(sum(counts.values()))
+            self.id_to_doc[chunk_uid] = doc
+            self.doc_ids.append(chunk_uid)
+
+        if not lengths:
+            return
+
+        # Documento re-adicionado: a versão anterior fica inativa
+        alive = np.ones(len(lengths), dtype=bool)
+        for doc in replaced:
+            if doc >= first_doc:
+                alive[doc - first_doc] = False
+            else:
+                self.alive[doc] = False
+
+        self._pending.append((np.asarray(terms, dtype=np.int32),
+                              np.asarray(docs, dtype=np.int32),
+                              np.asarray(tfs, dtype=np.float32)))
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, dtype=np.int32)])
+        self.alive = np.concatenate([self.alive, alive])
+        self._dirty = True
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Marca documentos como removidos (compactados no próximo commit())"""
+        for chunk_uid in ids:
+            doc = self.id_to_doc.pop(chunk_uid, None)
+            if doc is not None:
+                self.alive[doc] = False
+                self._dirty = True
+
+    def commit(self) -> None:
+        """Incorpora adições pendentes e remove documentos apagados dos arrays"""
+        if not self._pending and self.alive.all():
+            return
+
+        n_terms = len(self.vocab)
+        terms = [np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr))]
+        docs = [np.asarray(self.post_docs)]
+        tfs = [np.asarray(self.post_tf)]
+        for pending_terms, pending_docs, pending_tfs in self._pending:
+            terms.append(pending_terms)
+            docs.append(pending_docs)
+            tfs.append(pending_tfs)
+        terms = np.concatenate(terms)
+        docs = np.concatenate(docs)
+        tfs = np.concatenate(tfs)
+
+        # Remove postings de documentos apagados e renumera os restantes
+        keep = self.alive[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        new_number = np.cumsum(self.alive, dtype=np.int64) - 1
+        docs = new_number[docs].astype(np.int32)
+        alive_docs = np.flatnonzero(self.alive)
+        self.doc_ids = [self.doc_ids[i] for i in alive_docs]
+        self.id_to_doc = {chunk_uid: i for i, chunk_uid in enumerate(self.doc_ids)}
+        self.doc_len = self.doc_len[alive_docs]
+        self.alive = np.ones(len(self.doc_ids), dtype=bool)
+
+        order = np.lexsort((docs, terms))
+        self.post_docs = docs[order]
+        self.post_tf = tfs[order]
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=self.indptr[1:])
+        self._pending = []
+        self._update_length_norm()
+
+        logger.info(f"Índice BM25: {len(self.doc_ids)} documentos, {n_terms} termos, "
+                    f"{len(self.post_docs)} postings")
+
+    def _update_length_norm(self) -> None:
+        avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 1.0
+        self.length_norm = (self.k1 * (1 - self.b + self.b * self.doc_len / max(avgdl, 1.0))).astype(np.float32)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Retorna os k documentos com maior pontuação BM25
+
+        Returns:
+            Lista de (chunk_uid, pontuação) em ordem decrescente
+        """
+        n_docs = len(self.doc_ids)
+        if not n_docs or k <= 0:
+            return []
+
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        postings_docs, postings_scores = [], []
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            if start == end:
+                continue
+            docs = self.post_docs[start:end]
+            tf = self.post_tf[start:end]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            postings_docs.append(docs)
+            postings_scores.append(idf * tf * (self.k1 + 1) / (tf + self.length_norm[docs]))
+        if not postings_docs:
+            return []
+
+        docs = np.concatenate(postings_docs)
+        contributions = np.concatenate(postings_scores)
+        if len(docs) * 4 < n_docs:
+            # Poucas postings: soma só os documentos tocados, sem varrer o corpus
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+        else:
+            # Termos muito frequentes: acumulador denso é mais barato que ordenar as postings
+            candidates = np.arange(n_docs)
+            scores = np.bincount(docs, weights=contributions, minlength=n_docs).astype(np.float32)
+
+        mask = self.alive[candidates] & (scores > 0)
+        candidates, scores = candidates[mask], scores[mask]
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return [(self.doc_ids[i], float(scores[i_score])) for i_score, i in zip(order, candidates[order])]
+
+    def save(self) -> None:
+        """Grava o índice no diretório configurado (só se mudou desde o último load()/save())"""
+        if not self._dirty:
+            return
+        self.commit()
+        # Postings mapeadas do arquivo que vai ser substituído passam para a memória
+        # (no Windows, substituir um arquivo mapeado falha com PermissionError)
+        for name in ('indptr', 'post_docs', 'post_tf'):
+            value = getattr(self, name)
+            if isinstance(value, np.memmap):
+                setattr(self, name, np.array(value))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name in ('indptr', 'post_docs', 'post_tf', 'doc_len'):
+            tmp_path = self.directory / f"{name}.tmp.npy"
+            np.save(tmp_path, getattr(self, name))
+            tmp_path.replace(self.directory / f"{name}.npy")
+
+        tmp_path = self.directory / "meta.tmp.json"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'vocab': self.vocab, 'doc_ids': self.doc_ids}, f, ensure_ascii=False)
+        tmp_path.replace(self.directory / "meta.json")
+        self._dirty = False
+
+    def load(self) -> None:
+        """Carrega o índice do disco, se existir (postings mapeadas em memória)"""
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.indptr = np.load(self.directory / "indptr.npy", mmap_mode='r')
+            self.post_docs = np.load(self.directory / "post_docs.npy", mmap_mode='r')
+            self.post_tf = np.load(self.directory / "post_tf.npy", mmap_mode='r')
+            self.doc_len = np.load(self.directory / "doc_len.npy")
+            self.vocab = meta['vocab']
+            self.doc_ids = meta['doc_ids']
+            self.id_to_doc = {chunk_uid: i for i, chunk_uid in enumerate(self.doc_ids)}
+            self.alive = np.ones(len(self.doc_ids), dtype=bool)
+            self._update_length_norm()
+            logger.info(f"Índice BM25 carregado: {len(self.doc_ids)} documentos")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Índice BM25 inválido ({e}), será reconstruído")
+            self._reset()
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RAGConfig.RRF_K) -> List[Tuple[str, float]]:
+    """
+    Combina rankings com Reciprocal Rank Fusion: score = soma de 1 / (k + posição)
+
+    Args:
+        rankings: Listas de IDs, cada uma em ordem de relevância
+        k: Constante de suavização do RRF
+
+    Returns:
+        Lista de (id, score) em ordem decrescente
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,54 +1,409 @@
 import logging
-import ollama
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from src.config import RAGConfig
+from src.tracing import tracer
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
+
+class OllamaError(Exception):
+    """Falha ao falar com o Ollama, já depois das novas tentativas"""
+
+
+class OllamaOverloadedError(OllamaError):
+    """Fila de pedidos ao Ollama cheia (ou espera esgotada): tente mais tarde"""
+
+
+class _Endpoint:
+    """Um servidor Ollama, com seu cliente HTTP e contadores"""
+
+    def __init__(self, host: Optional[str], client):
+        self.host = host or os.getenv('OLLAMA_HOST') or "http://127.0.0.1:11434"
+        self.client = client
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+
+class OllamaClient:
+    """
+    Cliente do Ollama com pool de conexões, timeouts, novas tentativas e fila limitada
+
+    Cada servidor tem um ollama.Client próprio (um httpx.Client com conexões
+    reaproveitadas) e no máximo `max_concurrency` gerações ao mesmo tempo; os
+    pedidos além disso esperam numa fila de até `queue_size` lugares e, com ela
+    cheia, falham na hora com OllamaOverloadedError em vez de se acumularem.
+    Cada pedido vai para o servidor com menos gerações em andamento; um servidor
+    que falha fica `cooldown` segundos fora do rodízio. Erros transitórios
+    (conexão, timeout, 429/5xx) são repetidos em outro servidor, se houver,
+    com espera exponencial aleatória (full jitter).
+    """
+
+    TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, hosts: Sequence[str] = RAGConfig.OLLAMA_HOSTS,
+                 connect_timeout: float = RAGConfig.OLLAMA_CONNECT_TIMEOUT,
+                 read_timeout: float = RAGConfig.OLLAMA_READ_TIMEOUT,
+                 max_concurrency: int = RAGConfig.OLLAMA_MAX_CONCURRENCY,
+                 queue_size: int = RAGConfig.OLLAMA_QUEUE_SIZE,
+                 queue_timeout: float = RAGConfig.OLLAMA_QUEUE_TIMEOUT,
+                 retries: int = RAGConfig.OLLAMA_RETRIES,
+                 backoff: float = RAGConfig.OLLAMA_RETRY_BACKOFF,
+                 backoff_max: float = RAGConfig.OLLAMA_RETRY_BACKOFF_MAX,
+                 cooldown: float = RAGConfig.OLLAMA_ENDPOINT_COOLDOWN,
+                 keep_alive: str = RAGConfig.OLLAMA_KEEP_ALIVE):
+        """
+        Args:
+            hosts: URLs dos servidores Ollama (vazio = variável OLLAMA_HOST ou o padrão local)
+            connect_timeout: Segundos para abrir a conexão
+            read_timeout: Segundos sem receber dados (resposta inteira ou entre tokens no streaming)
+            max_concurrency: Gerações simultâneas por servidor
+            queue_size: Pedidos que podem esperar por uma vaga
+            queue_timeout: Espera máxima na fila, em segundos
+            retries: Novas tentativas em erros transitórios
+            backoff: Base da espera entre tentativas, em segundos
+            backoff_max: Limite da espera entre tentativas
+            cooldown: Segundos que um servidor com falha fica fora do rodízio
+            keep_alive: Tempo que o Ollama mantém o modelo carregado depois de cada pedido
+        """
+        # Importados só no primeiro uso (custam ~0,3s na inicialização)
+        import httpx
+        import ollama
+
+        timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout,
+                                write=connect_timeout, pool=connect_timeout)
+        # Duas conexões além das gerações para list/pull/warm-up, que não passam pela fila
+        limits = httpx.Limits(max_connections=max_concurrency + 2,
+                              max_keepalive_connections=max_concurrency + 2)
+        self.endpoints = [_Endpoint(host, ollama.Client(host=host, timeout=timeout, limits=limits))
+                          for host in (list(hosts) or [None])]
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.cooldown = cooldown
+        self.keep_alive = keep_alive
+        self._response_error = ollama.ResponseError
+        self._transport_errors = (ConnectionError, httpx.TransportError)
+        self._timeout_errors = (httpx.TimeoutException,)
+
+        self._cond = threading.Condition()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+
+    def _pick(self, exclude: Optional[_Endpoint]) -> Optional[_Endpoint]:
+        """Servidor com vaga e menos gerações em andamento; evita o que acabou de falhar"""
+        now = time.monotonic()
+        # Com todos fora do rodízio, tenta assim mesmo em vez de recusar tudo
+        pool = [endpoint for endpoint in self.endpoints if endpoint.down_until <= now] or self.endpoints
+        free = [endpoint for endpoint in pool if endpoint.in_flight < self.max_concurrency]
+        candidates = [endpoint for endpoint in free if endpoint is not exclude] or free
+        if not candidates:
+            return None
+        return min(candidates, key=lambda endpoint: (endpoint.in_flight, endpoint.requests))
+
+    def _acquire(self, exclude: Optional[_Endpoint] = None) -> _Endpoint:
+        """Reserva uma vaga num servidor, esperando na fila se todos estiverem ocupados"""
+        started = time.monotonic()
+        with self._cond:
+            endpoint = self._pick(exclude)
+            if endpoint is None:
+                if self.queue_depth >= self.queue_size:
+                    self.rejected += 1
+                    raise OllamaOverloadedError(f"Fila do Ollama cheia ({self.queue_depth} pedidos esperando)")
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+                try:
+                    deadline = started + self.queue_timeout
+                    while endpoint is None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise OllamaOverloadedError(
+                                f"Nenhuma vaga no Ollama após {self.queue_timeout:.0f}s na fila")
+                        self._cond.wait(remaining)
+                        endpoint = self._pick(exclude)
+                finally:
+                    self.queue_depth -= 1
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            self.requests += 1
+            waited = time.monotonic() - started
+            self.queue_wait_total += waited
+        tracer.record('llm_queue_wait', waited)
+        return endpoint
+
+    def _release(self, endpoint: _Endpoint, healthy: bool) -> None:
+        with self._cond:
+            endpoint.in_flight -= 1
+            if healthy:
+                endpoint.down_until = 0.0
+            else:
+                endpoint.failures += 1
+                endpoint.down_until = time.monotonic() + self.cooldown
+            self._cond.notify()
+
+    def _is_transient(self, error: Exception) -> bool:
+        if isinstance(error, self._response_error):
+            return error.status_code in self.TRANSIENT_STATUS
+        return isinstance(error, self._transport_errors)
+
+    def _backoff(self, attempt: int, endpoint: _Endpoint, error: Exception) -> None:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        with self._cond:
+            self.retried += 1
+        logger.warning(f"Erro transitório no Ollama em {endpoint.host} ({error}); "
+                       f"nova tentativa {attempt + 1}/{self.retries} em {delay:.2f}s")
+        time.sleep(delay)
+
+    def _error(self, endpoint: _Endpoint, error: Exception) -> OllamaError:
+        with self._cond:
+            self.failed += 1
+        if isinstance(error, OllamaError):
+            return error
+        if isinstance(error, self._timeout_errors):
+            return OllamaError(f"Tempo esgotado no Ollama em {endpoint.host}: {error}")
+        return OllamaError(f"{endpoint.host}: {error}")
+
+    def generate(self, **kwargs) -> Dict:
+        """ollama.generate sem streaming, com fila, roteamento e novas tentativas"""
+        kwargs.setdefault('keep_alive', self.keep_alive)
+        endpoint = None
+        for attempt in range(self.retries + 1):
+            endpoint = self._acquire(exclude=endpoint)
+            try:
+                response = endpoint.client.generate(**kwargs)
+            except Exception as e:
+                transient = self._is_transient(e)
+                self._release(endpoint, healthy=not transient)
+                if not transient or attempt == self.retries:
+                    raise self._error(endpoint, e)
+                self._backoff(attempt, endpoint, e)
+                continue
+            self._release(endpoint, healthy=True)
+            return response
+
+    def generate_stream(self, **kwargs) -> Iterator[Dict]:
+        """
+        ollama.generate em streaming
+
+        Só repete o pedido enquanto nenhum trecho foi entregue; depois do
+        primeiro, um erro chega ao chamador (a resposta já está pela metade).
+        """
+        kwargs.setdefault('keep_alive', self.keep_alive)
+        endpoint = None
+        for attempt in range(self.retries + 1):
+            endpoint = self._acquire(exclude=endpoint)
+            delivered = False
+            healthy = True
+            try:
+                for chunk in endpoint.client.generate(stream=True, **kwargs):
+                    delivered = True
+                    yield chunk
+                return
+            except Exception as e:
+                healthy = not self._is_transient(e)
+                if delivered or healthy or attempt == self.retries:
+                    raise self._error(endpoint, e)
+                error = e
+            finally:
+                self._release(endpoint, healthy)
+            self._backoff(attempt, endpoint, error)
+
+    def list_models(self) -> List[Dict]:
+        """
+        Modelos de cada servidor (sem passar pela fila, para não esperar atrás de gerações)
+
+        Returns:
+            [{'host', 'running', 'models', 'error'}] na ordem de `endpoints`
+        """
+        result = []
+        for endpoint in self.endpoints:
+            try:
+                response = endpoint.client.list()
+                # Clientes novos devolvem objetos com 'model'; os antigos, dicionários com 'name'
+                names = [model.get('model') or model.get('name') for model in response.get('models') or []]
+                result.append({'host': endpoint.host, 'running': True,
+                               'models': [name for name in names if name], 'error': None})
+                with self._cond:
+                    endpoint.down_until = 0.0
+            except Exception as e:
+                with self._cond:
+                    endpoint.down_until = time.monotonic() + self.cooldown
+                result.append({'host': endpoint.host, 'running': False, 'models': [], 'error': str(e)})
+        return result
+
+    def stats(self) -> Dict:
+        """Profundidade da fila, gerações em andamento e contadores por servidor"""
+        now = time.monotonic()
+        with self._cond:
+            return {
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'queue_size': self.queue_size,
+                'in_flight': sum(endpoint.in_flight for endpoint in self.endpoints),
+                'requests': self.requests,
+                'retries': self.retried,
+                'failures': self.failed,
+                'rejected': self.rejected,
+                'mean_queue_wait_ms': self.queue_wait_total / self.requests * 1000 if self.requests else 0.0,
+                'endpoints': [{'host': endpoint.host, 'in_flight': endpoint.in_flight,
+                               'requests': endpoint.requests, 'failures': endpoint.failures,
+                               'healthy': endpoint.down_until <= now}
+                              for endpoint in self.endpoints],
+            }
+
+
 class OllamaManager:
     """Gerencia interações com o servidor Ollama"""
 
+    _client: Optional[OllamaClient] = None
+    _client_lock = threading.Lock()
+    _status: Optional[Dict] = None
+    _status_at = 0.0
+    _status_lock = threading.Lock()
+
+    @staticmethod
+    def client() -> OllamaClient:
+        """Cliente compartilhado, criado no primeiro uso com as configurações de RAGConfig"""
+        with OllamaManager._client_lock:
+            if OllamaManager._client is None:
+                OllamaManager._client = OllamaClient()
+            return OllamaManager._client
+
+    @staticmethod
+    def stats() -> Optional[Dict]:
+        """Métricas do cliente (fila, novas tentativas, servidores), ou None se ainda não foi usado"""
+        client = OllamaManager._client
+        return client.stats() if client is not None else None
+
+    @staticmethod
+    def status(max_age: float = RAGConfig.OLLAMA_STATUS_TTL, refresh: bool = False) -> Dict:
+        """
+        Estado dos servidores com uma única chamada a list() em cada, reaproveitada por `max_age` segundos
+
+        Returns:
+            {'running': algum servidor responde, 'models': modelos presentes em todos os que
+            respondem, 'error': mensagem ou None, 'endpoints': estado de cada servidor}
+        """
+        with OllamaManager._status_lock:
+            cached = OllamaManager._status
+            if cached is not None and not refresh and time.monotonic() - OllamaManager._status_at < max_age:
+                return cached
+            try:
+                endpoints = OllamaManager.client().list_models()
+            except Exception as e:
+                endpoints = [{'host': None, 'running': False, 'models': [], 'error': str(e)}]
+            running = [endpoint for endpoint in endpoints if endpoint['running']]
+            # Um modelo só conta como disponível se todos os servidores ativos o tiverem
+            models = [name for name in running[0]['models']
+                      if all(name in endpoint['models'] for endpoint in running)] if running else []
+            errors = [f"{endpoint['host']}: {endpoint['error']}" for endpoint in endpoints if endpoint['error']]
+            status = {'running': bool(running), 'models': models,
+                      'error': "; ".join(errors) or None, 'endpoints': endpoints}
+            if running:
+                logger.info(f"Ollama está rodando e acessível ({len(running)}/{len(endpoints)} servidores, "
+                            f"{len(models)} modelos locais)")
+            if errors:
+                logger.error(f"Ollama não está rodando ou não é acessível: {status['error']}")
+            OllamaManager._status = status
+            OllamaManager._status_at = time.monotonic()
+            return status
+
     @staticmethod
     def check_ollama_running() -> bool:
         """Verifica se o servidor Ollama está rodando"""
-        try:
-            response = ollama.list()
-            logger.info("Ollama está rodando e acessível")
-            return True
-        except Exception as e:
-            logger.error(f"Ollama não está rodando ou não é acessível: {e}")
-            return False
+        return OllamaManager.status()['running']
 
     @staticmethod
     def check_model_available(model_name: str) -> bool:
         """Verifica se um modelo está disponível localmente"""
-        try:
-            models = ollama.list()
-            available = any(model_name in model['name'] for model in models.get('models', []))
-            if available:
-                logger.info(f"Modelo {model_name} encontrado localmente")
-            else:
-                logger.warning(f"Modelo {model_name} não encontrado localmente")
-            return available
-        except Exception as e:
-            logger.error(f"Erro ao verificar disponibilidade do modelo: {e}")
-            return False
+        available = any(model_name in name for name in OllamaManager.status()['models'])
+        if available:
+            logger.info(f"Modelo {model_name} encontrado localmente")
+        else:
+            logger.warning(f"Modelo {model_name} não encontrado localmente")
+        return available
 
     @staticmethod
     def pull_model(model_name: str):
-        """Baixa um modelo do Ollama"""
+        """Baixa um modelo do Ollama em cada servidor ativo que ainda não o tem"""
         try:
             logger.info(f"Iniciando download do modelo {model_name}...")
             print(f"📥 Baixando modelo {model_name}... (isso pode levar alguns minutos)")
-            ollama.pull(model_name)
+            running = {endpoint['host']: endpoint for endpoint in OllamaManager.status()['endpoints']
+                       if endpoint['running']}
+            for endpoint in OllamaManager.client().endpoints:
+                listed = running.get(endpoint.host)
+                if listed is not None and not any(model_name in name for name in listed['models']):
+                    endpoint.client.pull(model_name)
+            OllamaManager.status(refresh=True)
             logger.info(f"Modelo {model_name} baixado com sucesso")
             print(f"✅ Modelo {model_name} baixado com sucesso!")
         except Exception as e:
             logger.error(f"Erro ao baixar modelo {model_name}: {e}")
-            raise Exception(f"Erro ao baixar modelo: {str(e)}")
+            raise OllamaError(f"Erro ao baixar modelo: {str(e)}")
+
+    @staticmethod
+    def warm_up(model: str) -> float:
+        """
+        Carrega o modelo na memória de cada servidor Ollama antes da primeira pergunta
+
+        Um pedido sem prompt só carrega o modelo (com o mesmo num_ctx das
+        gerações, senão o Ollama o recarregaria) e o mantém por OLLAMA_KEEP_ALIVE.
+        Não passa pela fila: roda uma vez, na inicialização.
+
+        Returns:
+            Segundos até o modelo ficar pronto em todos os servidores que responderam
+        """
+        client = OllamaManager.client()
+        started = time.perf_counter()
+        errors = []
+        for endpoint in client.endpoints:
+            try:
+                endpoint.client.generate(
+                    model=model,
+                    prompt="",
+                    options={'num_ctx': RAGConfig.OLLAMA_NUM_CTX},
+                    keep_alive=client.keep_alive
+                )
+            except Exception as e:
+                errors.append(f"{endpoint.host}: {e}")
+        if len(errors) == len(client.endpoints):
+            raise OllamaError(f"Erro ao carregar modelo {model}: {'; '.join(errors)}")
+        for error in errors:
+            logger.warning(f"Modelo {model} não foi carregado em {error}")
+        elapsed = time.perf_counter() - started
+        logger.info(f"Modelo {model} carregado no Ollama em {elapsed:.2f}s")
+        return elapsed
+
+    @staticmethod
+    def _record_prompt_stats(response, stats: Dict, context: Optional[List[int]]) -> None:
+        """Guarda os tokens avaliados e o `context` devolvido pelo Ollama para o próximo turno"""
+        stats['prompt_eval_count'] = response.get('prompt_eval_count') or 0
+        stats['context_tokens_reused'] = len(context) if context else 0
+        stats['context'] = response.get('context')
+        logger.info(f"Prompt: {stats['prompt_eval_count']} tokens avaliados, "
+                    f"{stats['context_tokens_reused']} reaproveitados do turno anterior")
 
     @staticmethod
     def generate_response(model: str, prompt: str, system_prompt: str = "",
-                         temperature: float = 0.7) -> str:
+                         temperature: float = 0.7, context: Optional[List[int]] = None,
+                         stats: Optional[Dict] = None) -> str:
         """
         Gera resposta usando Ollama
 
@@ -57,20 +412,89 @@ class OllamaManager:
             prompt: Prompt do usuário
             system_prompt: Prompt do sistema
             temperature: Temperatura para geração
+            context: `context` devolvido pelo turno anterior; seus tokens não são reavaliados
+            stats: Dicionário opcional preenchido com prompt_eval_count, context_tokens_reused,
+                eval_count e o novo `context`
 
         Returns:
             Resposta gerada
         """
+        stats = stats if stats is not None else {}
         try:
             logger.debug(f"Gerando resposta com modelo {model}, temperatura {temperature}")
-            response = ollama.generate(
+            response = OllamaManager.client().generate(
                 model=model,
                 prompt=prompt,
                 system=system_prompt,
-                options={'temperature': temperature}
+                context=context,
+                options={'temperature': temperature, 'num_ctx': RAGConfig.OLLAMA_NUM_CTX}
             )
+            stats['eval_count'] = response.get('eval_count') or 0
+            OllamaManager._record_prompt_stats(response, stats, context)
             logger.info(f"Resposta gerada com sucesso ({len(response['response'])} caracteres)")
             return response['response']
         except Exception as e:
             logger.error(f"Erro na geração de resposta: {e}")
-            raise Exception(f"Erro na geração: {str(e)}")
\ No newline at end of file
+            error_class = OllamaOverloadedError if isinstance(e, OllamaOverloadedError) else OllamaError
+            raise error_class(f"Erro na geração: {str(e)}")
+
+    @staticmethod
+    def generate_stream(model: str, prompt: str, system_prompt: str = "",
+                        temperature: float = 0.7, stats: Optional[Dict] = None,
+                        context: Optional[List[int]] = None) -> Iterator[str]:
+        """
+        Gera resposta usando Ollama em streaming
+
+        Args:
+            model: Nome do modelo
+            prompt: Prompt do usuário
+            system_prompt: Prompt do sistema
+            temperature: Temperatura para geração
+            stats: Dicionário opcional preenchido ao final com as métricas da geração
+                (time_to_first_token, total_time, eval_count, tokens_per_second,
+                prompt_eval_count, context_tokens_reused, context)
+            context: `context` devolvido pelo turno anterior; seus tokens não são reavaliados
+
+        Yields:
+            Trechos da resposta à medida que chegam
+        """
+        stats = stats if stats is not None else {}
+        try:
+            logger.debug(f"Gerando resposta (stream) com modelo {model}, temperatura {temperature}")
+            started = time.perf_counter()
+            first_token_at = None
+            chars = 0
+
+            for chunk in OllamaManager.client().generate_stream(
+                model=model,
+                prompt=prompt,
+                system=system_prompt,
+                context=context,
+                options={'temperature': temperature, 'num_ctx': RAGConfig.OLLAMA_NUM_CTX}
+            ):
+                token = chunk['response']
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    chars += len(token)
+                    yield token
+
+                if chunk.get('done'):
+                    # Contagem e duração (ns) da geração informadas pelo próprio Ollama
+                    eval_count = chunk.get('eval_count') or 0
+                    eval_duration = (chunk.get('eval_duration') or 0) / 1e9
+                    stats['eval_count'] = eval_count
+                    stats['tokens_per_second'] = eval_count / eval_duration if eval_duration > 0 else 0.0
+                    OllamaManager._record_prompt_stats(chunk, stats, context)
+
+            stats['time_to_first_token'] = (first_token_at - started) if first_token_at else None
+            stats['total_time'] = time.perf_counter() - started
+            logger.info(
+                f"Resposta gerada em streaming ({chars} caracteres, "
+                f"primeiro token em {stats['time_to_first_token'] or 0:.2f}s, "
+                f"{stats.get('tokens_per_second', 0.0):.1f} tokens/s)"
+            )
+        except Exception as e:
+            logger.error(f"Erro na geração de resposta: {e}")
+            error_class = OllamaOverloadedError if isinstance(e, OllamaOverloadedError) else OllamaError
+            raise error_class(f"Erro na geração: {str(e)}")
\ No newline at end of file
@@ -1,13 +1,49 @@
+import glob
 import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-import pypdf
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
-from docx import Document as DocxDocument
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config import RAGConfig
+from src.html_extract import HTMLExtractor
+from src.httpcache import HTTPCache
+from src.tracing import tracer
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf', '.docx')
+
+
+class LoadResult(NamedTuple):
+    """Resultado do carregamento de um arquivo em lote"""
+    source: str
+    text: Optional[str]  # None em PDFs: o texto vem em `pages`
+    error: Optional[Exception] = None
+    pages: Optional[List[Tuple[int, str]]] = None  # Apenas PDFs: (página, texto)
+
+
+def _extract_pdf_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extrai as páginas [start, end) de um PDF (executado em processo separado)"""
+    return list(DocumentLoader.iter_pdf_pages(file_path, start, end))
+
+
+def _load_file_task(file_path: str) -> str:
+    """Carrega um arquivo inteiro (executado em processo separado)"""
+    return DocumentLoader.load_file(file_path)
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    import pypdf
+
+    with open(file_path, 'rb') as f:
+        return len(pypdf.PdfReader(f).pages)
+
 class DocumentLoader:
     """Carrega e processa diferentes tipos de documentos"""
 
@@ -34,23 +70,28 @@ class DocumentLoader:
             raise Exception(f"Erro ao carregar arquivo TXT '{Path(file_path).name}': {str(e)}")
 
     @staticmethod
-    def load_pdf(file_path: str) -> str:
-        """Carrega e extrai texto de arquivo PDF"""
+    def iter_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Extrai o texto de um PDF página por página, sem acumular o documento inteiro
+
+        Args:
+            file_path: Caminho do PDF
+            start: Índice (0-based) da primeira página
+            end: Índice final exclusivo (None = até a última página)
+
+        Yields:
+            Tuplas (número da página 1-based, texto da página)
+        """
+        import pypdf
+
         try:
-            text = ""
             with open(file_path, 'rb') as f:
                 pdf_reader = pypdf.PdfReader(f)
                 num_pages = len(pdf_reader.pages)
-                logger.info(f"Extraindo texto de {num_pages} páginas do PDF...")
-                for page_num in range(num_pages):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            
-            if not text.strip():
-                logger.warning(f"PDF {Path(file_path).name} não contém texto extraível")
-                raise ValueError(f"O PDF '{Path(file_path).name}' parece estar vazio ou ser somente imagem")
-            
-            return text
+                end = num_pages if end is None else min(end, num_pages)
+                logger.info(f"Extraindo texto das páginas {start + 1}-{end} de {num_pages} do PDF...")
+                for page_num in range(start, end):
+                    yield page_num + 1, pdf_reader.pages[page_num].extract_text() or ""
         except FileNotFoundError:
             logger.error(f"Arquivo PDF não encontrado: {file_path}")
             raise FileNotFoundError(f"Arquivo PDF não encontrado: {file_path}")
@@ -61,9 +102,22 @@ class DocumentLoader:
             logger.error(f"Erro inesperado ao processar PDF {file_path}: {e}")
             raise Exception(f"Erro ao carregar PDF '{Path(file_path).name}': {str(e)}")
 
+    @staticmethod
+    def load_pdf(file_path: str) -> str:
+        """Carrega e extrai texto de arquivo PDF"""
+        text = "".join(page_text + "\n" for _, page_text in DocumentLoader.iter_pdf_pages(file_path))
+
+        if not text.strip():
+            logger.warning(f"PDF {Path(file_path).name} não contém texto extraível")
+            raise ValueError(f"O PDF '{Path(file_path).name}' parece estar vazio ou ser somente imagem")
+
+        return text
+
     @staticmethod
     def load_docx(file_path: str) -> str:
         """Carrega e extrai texto de arquivo DOCX"""
+        from docx import Document as DocxDocument
+
         try:
             doc = DocxDocument(file_path)
             text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
@@ -100,53 +154,215 @@ class DocumentLoader:
         else:
             logger.error(f"Tipo de arquivo não suportado: {extension}")
             raise ValueError(f"Tipo de arquivo não suportado: {extension}. Use .txt, .pdf ou .docx")
-        
+
+    @staticmethod
+    def resolve_sources(sources: Union[str, Iterable[str]]) -> List[str]:
+        """
+        Expande um diretório, um glob ou uma lista de caminhos em arquivos suportados
+
+        Args:
+            sources: Diretório (busca recursiva), padrão glob (ex: "data/**/*.pdf") ou lista de caminhos
+
+        Returns:
+            Lista ordenada de caminhos absolutos
+        """
+        if isinstance(sources, (str, Path)):
+            path = Path(sources)
+            if path.is_dir():
+                candidates = [p for p in path.rglob('*') if p.is_file()]
+            elif path.is_file():
+                candidates = [path]
+            else:
+                candidates = [Path(p) for p in glob.glob(str(sources), recursive=True)]
+        else:
+            candidates = [Path(p) for p in sources]
+
+        files = {str(p.resolve()) for p in candidates if p.suffix.lower() in SUPPORTED_EXTENSIONS}
+        return sorted(files)
+
+    @staticmethod
+    def load_batch(sources: Union[str, Iterable[str]], max_workers: Optional[int] = RAGConfig.LOADER_MAX_WORKERS,
+                   pdf_pages_per_task: int = RAGConfig.PDF_PAGES_PER_TASK) -> Iterator[LoadResult]:
+        """
+        Carrega vários arquivos em paralelo usando um pool de processos
+
+        PDFs com mais de `pdf_pages_per_task` páginas são divididos em blocos de
+        páginas distribuídos entre os processos, e o resultado traz o texto de
+        cada página em `pages` (com `text` None, para não manter duas cópias). Os resultados são entregues à
+        medida que cada arquivo termina; erros são capturados por arquivo, sem
+        interromper o lote.
+
+        Args:
+            sources: Diretório, padrão glob ou lista de caminhos
+            max_workers: Número de processos (None = número de CPUs)
+            pdf_pages_per_task: Páginas de PDF por tarefa
+
+        Yields:
+            LoadResult(source, text, error) para cada arquivo
+        """
+        files = DocumentLoader.resolve_sources(sources)
+        if not files:
+            logger.warning(f"Nenhum arquivo suportado encontrado em: {sources}")
+            return
+
+        logger.info(f"Carregando {len(files)} arquivos em paralelo...")
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}  # future -> (source, índice do bloco)
+            parts: Dict[str, List[Optional[str]]] = {}
+            failed = set()
+
+            for file_path in files:
+                if Path(file_path).suffix.lower() == '.pdf':
+                    try:
+                        num_pages = _count_pdf_pages(file_path)
+                    except Exception as e:
+                        logger.error(f"Erro ao abrir PDF {file_path}: {e}")
+                        yield LoadResult(file_path, None, Exception(f"Erro ao ler PDF '{Path(file_path).name}': {str(e)}"))
+                        continue
+
+                    ranges = [(start, min(start + pdf_pages_per_task, num_pages))
+                              for start in range(0, num_pages, pdf_pages_per_task)] or [(0, 0)]
+                    parts[file_path] = [None] * len(ranges)
+                    for index, (start, end) in enumerate(ranges):
+                        futures[executor.submit(_extract_pdf_range, file_path, start, end)] = (file_path, index)
+                    continue
+
+                futures[executor.submit(_load_file_task, file_path)] = (file_path, None)
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, index = futures.pop(future)
+                    if file_path in failed:
+                        continue
+
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        logger.error(f"Erro ao carregar {file_path}: {e}")
+                        if index is not None:
+                            failed.add(file_path)
+                            del parts[file_path]
+                        yield LoadResult(file_path, None, e)
+                        continue
+
+                    if index is None:
+                        yield LoadResult(file_path, text)
+                        continue
+
+                    # PDF: entrega quando todos os blocos de páginas terminarem
+                    parts[file_path][index] = text
+                    if all(part is not None for part in parts[file_path]):
+                        pages = [page for part in parts.pop(file_path) for page in part]
+                        if not any(page_text.strip() for _, page_text in pages):
+                            logger.warning(f"PDF {Path(file_path).name} não contém texto extraível")
+                            yield LoadResult(file_path, None, ValueError(
+                                f"O PDF '{Path(file_path).name}' parece estar vazio ou ser somente imagem"))
+                        else:
+                            yield LoadResult(file_path, None, pages=pages)  # só as páginas, sem o texto juntado
+
+class ScrapeResult(NamedTuple):
+    """Resultado do scraping de uma URL em lote"""
+    url: str
+    text: Optional[str]
+    error: Optional[Exception] = None
+    from_cache: bool = False
+
+
 class WebScraper:
     """Realiza web scraping de URLs"""
 
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+
+    _session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    extractor = HTMLExtractor()
+
     @staticmethod
-    def scrape_url(url: str) -> str:
+    def create_session(pool_size: int = RAGConfig.HTTP_MAX_WORKERS,
+                       retries: int = RAGConfig.HTTP_RETRIES,
+                       host_pools: int = DEFAULT_POOLSIZE) -> requests.Session:
         """
-        Extrai texto de uma URL
+        Cria uma Session com pool de conexões keep-alive e retentativas
 
         Args:
-            url: URL para fazer scraping
+            pool_size: Conexões mantidas por host
+            retries: Retentativas para erros de conexão e respostas 429/5xx
+            host_pools: Número de hosts com pool próprio (além disso, o pool menos usado é descartado)
+        """
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=host_pools, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(WebScraper.HEADERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @staticmethod
+    def get_session() -> requests.Session:
+        """Retorna a Session compartilhada (criada na primeira chamada)"""
+        with WebScraper._session_lock:
+            if WebScraper._session is None:
+                WebScraper._session = WebScraper.create_session()
+            return WebScraper._session
+
+    @staticmethod
+    def extract_text(content: bytes) -> str:
+        """Extrai o texto principal de um documento HTML, sem menus, rodapés e banners"""
+        return WebScraper.extractor.extract(content)
+
+    @staticmethod
+    def _fetch_text(url: str, session: requests.Session, timeout: float,
+                    cache: Optional[HTTPCache]) -> Tuple[str, bool]:
+        """
+        Baixa e extrai o texto de uma URL, revalidando o cache quando possível
 
         Returns:
-            Texto extraído da página
+            Tupla (texto, veio_do_cache)
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
+            entry = cache.get(url) if cache else None
+            if entry is not None and entry.get('extractor') != HTMLExtractor.VERSION:
+                entry = None  # texto extraído por uma versão anterior do extrator: baixa de novo
             logger.info(f"Acessando URL: {url}")
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            with tracer.span('fetch') as span:
+                response = session.get(url, headers=HTTPCache.conditional_headers(entry), timeout=timeout)
+                span['bytes'] = len(response.content)
+                span['not_modified'] = int(response.status_code == 304)
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # 304: a página não mudou, reaproveita o texto já extraído
+            if response.status_code == 304 and entry is not None:
+                logger.info(f"URL inalterada (304), usando cache: {url}")
+                return entry['text'], True
 
-            # Remove scripts e estilos
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Extrai texto
-            text = soup.get_text()
-
-            # Limpa o texto
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
+            response.raise_for_status()
+            with tracer.span('html_extract', bytes=len(response.content)) as span:
+                text = WebScraper.extract_text(response.content)
+                span['chars'] = len(text)
 
             if not text.strip():
                 logger.warning(f"URL {url} não retornou texto extraível")
                 raise ValueError(f"A URL não contém texto extraível: {url}")
 
+            if cache:
+                cache.put(url, response.headers, text, extractor=HTMLExtractor.VERSION)
+
             logger.info(f"Texto extraído com sucesso da URL: {len(text)} caracteres")
-            return text
+            return text, False
 
         except requests.exceptions.Timeout:
             logger.error(f"Timeout ao acessar {url}")
-            raise Exception(f"Timeout: A URL demorou muito para responder (>10s): {url}")
+            raise Exception(f"Timeout: A URL demorou muito para responder (>{timeout}s): {url}")
         except requests.exceptions.ConnectionError:
             logger.error(f"Erro de conexão ao acessar {url}")
             raise Exception(f"Erro de conexão: Não foi possível conectar à URL: {url}")
@@ -158,4 +374,70 @@ class WebScraper:
             raise Exception(f"Erro ao acessar URL: {str(e)}")
         except Exception as e:
             logger.error(f"Erro inesperado ao processar {url}: {e}")
-            raise Exception(f"Erro ao processar conteúdo da URL: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Erro ao processar conteúdo da URL: {str(e)}")
+
+    @staticmethod
+    def scrape_url(url: str, timeout: float = RAGConfig.HTTP_TIMEOUT, cache: Optional[HTTPCache] = None) -> str:
+        """
+        Extrai texto de uma URL
+
+        Args:
+            url: URL para fazer scraping
+            timeout: Timeout da requisição em segundos
+            cache: Cache HTTP opcional para revalidação condicional
+
+        Returns:
+            Texto extraído da página
+        """
+        text, _ = WebScraper._fetch_text(url, WebScraper.get_session(), timeout, cache)
+        return text
+
+    @staticmethod
+    def scrape_urls(urls: Iterable[str], max_workers: int = RAGConfig.HTTP_MAX_WORKERS,
+                    max_per_host: int = RAGConfig.HTTP_MAX_PER_HOST, timeout: float = RAGConfig.HTTP_TIMEOUT,
+                    cache_dir: Optional[str] = RAGConfig.HTTP_CACHE_DIR) -> Iterator[ScrapeResult]:
+        """
+        Faz scraping de várias URLs em paralelo
+
+        Usa uma Session com pool de conexões, limita as requisições simultâneas
+        por host e revalida as páginas em cache com ETag/Last-Modified, de modo
+        que páginas inalteradas não são baixadas nem processadas de novo.
+
+        Args:
+            urls: URLs a processar
+            max_workers: Total de requisições simultâneas
+            max_per_host: Requisições simultâneas por host
+            timeout: Timeout por requisição em segundos
+            cache_dir: Diretório do cache HTTP (None desativa o cache)
+
+        Yields:
+            ScrapeResult(url, text, error, from_cache) à medida que cada URL termina
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return
+
+        cache = HTTPCache(cache_dir) if cache_dir else None
+        host_limits: Dict[str, threading.Semaphore] = {}
+        for url in urls:
+            host_limits.setdefault(urlparse(url).netloc, threading.Semaphore(max_per_host))
+        # Um pool por host, para nenhum host perder o keep-alive durante a coleta
+        session = WebScraper.create_session(pool_size=max_per_host, host_pools=len(host_limits))
+
+        def task(url: str) -> Tuple[str, bool]:
+            with host_limits[urlparse(url).netloc]:
+                return WebScraper._fetch_text(url, session, timeout, cache)
+
+        logger.info(f"Acessando {len(urls)} URLs ({max_workers} simultâneas, {max_per_host} por host)...")
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(task, url): url for url in urls}
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        text, from_cache = future.result()
+                        yield ScrapeResult(url, text, from_cache=from_cache)
+                    except Exception as e:
+                        yield ScrapeResult(url, None, e)
+        finally:
+            session.close()
@@ -0,0 +1,207 @@
+import atexit
+import hashlib
+import json
+import logging
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from src.config import RAGConfig
+from src.proccessing import TextChunker
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """Calcula o SHA-256 do conteúdo de um arquivo, lendo em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Calcula o SHA-256 de um texto"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def settings_fingerprint() -> str:
+    """
+    Identifica as configurações que afetam os chunks indexados
+
+    Se o tamanho dos chunks, o overlap, a versão do chunker, o modelo de
+    embeddings ou o backend vetorial mudarem, todas as fontes precisam ser reindexadas.
+    """
+    settings = {
+        'chunk_size': RAGConfig.CHUNK_SIZE,
+        'chunk_overlap': RAGConfig.CHUNK_OVERLAP,
+        'chunk_length_unit': RAGConfig.CHUNK_LENGTH_UNIT,
+        'chunk_tokens': [RAGConfig.CHUNK_SIZE_TOKENS, RAGConfig.CHUNK_OVERLAP_TOKENS],
+        'chunker': TextChunker.VERSION,
+        'embedding_model': RAGConfig.EMBEDDING_MODEL,
+        'embedding_normalize': RAGConfig.EMBEDDING_NORMALIZE,
+        'embedding_precision': RAGConfig.EMBEDDING_PRECISION,
+        'vector_backend': RAGConfig.VECTOR_BACKEND,
+        'dedup': [RAGConfig.DEDUP_ENABLED, RAGConfig.DEDUP_THRESHOLD],
+    }
+    return hash_text(json.dumps(settings, sort_keys=True))[:16]
+
+
+class IngestionManifest:
+    """Registra o que já foi indexado no vector store persistido"""
+
+    def __init__(self, persist_directory: str = RAGConfig.PERSIST_DIRECTORY):
+        """
+        Inicializa o manifesto de ingestão
+
+        Args:
+            persist_directory: Diretório do vector store (o manifesto fica ao lado do Chroma)
+        """
+        self.path = Path(persist_directory) / RAGConfig.MANIFEST_FILENAME
+        self.entries: Dict[str, Dict] = {}  # source -> {'content_hash', 'settings', 'chunk_ids'}
+        self.load()
+
+    def load(self) -> None:
+        """Carrega o manifesto do disco, se existir"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('sources', {})
+            logger.info(f"Manifesto carregado: {len(self.entries)} fontes indexadas")
+        except (OSError, ValueError) as e:
+            # Manifesto corrompido: reindexa tudo em vez de confiar em dados parciais
+            logger.warning(f"Manifesto de ingestão inválido ({e}), ignorando")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Grava o manifesto de forma atômica"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.entries}, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.path)
+
+    def is_current(self, source: str, content_hash: str) -> bool:
+        """Retorna True se a fonte já está indexada com o mesmo conteúdo e configurações"""
+        entry = self.entries.get(source)
+        return (entry is not None
+                and entry.get('content_hash') == content_hash
+                and entry.get('settings') == settings_fingerprint())
+
+    def chunk_ids(self, source: str) -> List[str]:
+        """Retorna os IDs dos chunks indexados para uma fonte"""
+        entry = self.entries.get(source)
+        return list(entry.get('chunk_ids', [])) if entry else []
+
+    def update(self, source: str, content_hash: str, chunk_ids: List[str]) -> None:
+        """Registra (ou substitui) uma fonte indexada"""
+        self.entries[source] = {
+            'content_hash': content_hash,
+            'settings': settings_fingerprint(),
+            'chunk_ids': chunk_ids,
+        }
+
+    def add_chunk_ids(self, source: str, chunk_ids: List[str]) -> None:
+        """Acrescenta chunks a uma fonte já registrada (ex: duplicatas promovidas)"""
+        if source in self.entries:
+            self.entries[source].setdefault('chunk_ids', []).extend(chunk_ids)
+
+    def remove(self, source: str) -> Optional[Dict]:
+        """Remove uma fonte do manifesto"""
+        return self.entries.pop(source, None)
+
+    def sources(self) -> List[str]:
+        """Lista as fontes registradas"""
+        return list(self.entries.keys())
+
+
+class PendingChunks:
+    """
+    Chunks de fontes novas ou alteradas esperando o build_vectorstore(), gravados em disco
+
+    Cada fonte vira um arquivo JSONL num diretório temporário, escrito à medida
+    que o chunker produz os chunks (um PDF vai página a página do leitor ao
+    disco). Em RAM ficam só o hash e a contagem de cada fonte; read() devolve
+    os chunks em lotes, então a indexação também não carrega a fonte inteira.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}  # source -> {'content_hash', 'chunks', 'path'}
+        self._directory: Optional[Path] = None
+        atexit.register(self.clear)  # uma vez: o diretório é recriado a cada build, o handler não
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __contains__(self, source: str) -> bool:
+        return source in self.entries
+
+    def items(self):
+        return self.entries.items()
+
+    def add(self, source: str, content_hash: str, documents: Iterable[Document],
+            prepare: Optional[Callable[[Document], None]] = None) -> int:
+        """
+        Grava os chunks de uma fonte (substitui os que estiverem pendentes para ela)
+
+        Args:
+            source: Caminho ou URL da fonte
+            content_hash: Hash do conteúdo, registrado no manifesto ao indexar
+            documents: Chunks da fonte (pode ser um gerador)
+            prepare: Ajusta cada chunk antes de gravar (ex: atribui o chunk_uid)
+
+        Returns:
+            Número de chunks gravados
+        """
+        if self._directory is None:
+            self._directory = Path(tempfile.mkdtemp(prefix="rag_pending_"))
+        path = self._directory / f"{hash_text(source)[:20]}.jsonl"
+        tmp_path = path.with_suffix('.tmp')
+        count = 0
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for doc in documents:
+                    if prepare is not None:
+                        prepare(doc)
+                    f.write(json.dumps({'text': doc.page_content, 'metadata': doc.metadata}, ensure_ascii=False) + "\n")
+                    count += 1
+            tmp_path.replace(path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)  # fonte com erro no meio: nada fica pendente
+            raise
+        self.entries[source] = {'content_hash': content_hash, 'chunks': count, 'path': path}
+        return count
+
+    def read(self, source: str, batch_size: int = RAGConfig.INGEST_BATCH_CHUNKS) -> Iterator[List[Document]]:
+        """Devolve os chunks de uma fonte em lotes, com o total de chunks da fonte nos metadados"""
+        entry = self.entries[source]
+        batch = []
+        with open(entry['path'], 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                record['metadata']['chunk_total'] = entry['chunks']
+                batch.append(Document(page_content=record['text'], metadata=record['metadata']))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def chunk_count(self) -> int:
+        return sum(entry['chunks'] for entry in self.entries.values())
+
+    def clear(self) -> None:
+        """Esquece as fontes pendentes e apaga os arquivos"""
+        self.entries = {}
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
@@ -1,60 +1,293 @@
+import base64
+import logging
+import re
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from src.config import RAGConfig
+from src.context import estimate_tokens
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class Message(NamedTuple):
+    """Mensagem guardada com o texto já formatado e a contagem de tokens calculada uma vez"""
+    role: str
+    content: str
+    line: str
+    tokens: int
+
+
 class ConversationMemory:
-    """Gerencia o histórico de conversas com buffer limitado"""
+    """
+    Gerencia o histórico de conversas com buffer limitado
 
-    def __init__(self, max_turns: int = 3):
+    As mensagens ficam em um buffer circular de max_turns turnos. Cada uma é
+    formatada e tem seus tokens contados só na inserção, e o texto do histórico
+    é mantido de forma incremental. Turnos que saem do buffer viram uma linha
+    de resumo (pergunta + início da resposta), limitado a MEMORY_SUMMARY_TOKENS,
+    para que o histórico guarde mais do que max_turns turnos sem crescer.
+    """
+
+    # Palavras que, em perguntas curtas, indicam referência ao histórico
+    REFERENCE_PATTERN = re.compile(
+        r"\b(isso|isto|aquilo|elas?|eles?|dela|dele|delas|deles|anterior|antes|"
+        r"você disse|mencionou|falou|citou)\b"
+    )
+    SEPARATOR = "\n\n"
+    SUMMARY_HEADER = "📝 Resumo da conversa anterior:"
+
+    def __init__(self, max_turns: int = 3, embeddings=None):
         """
         Inicializa a memória conversacional
 
         Args:
-            max_turns: Número máximo de turnos (pares pergunta-resposta) a manter
+            max_turns: Número máximo de turnos (pares pergunta-resposta) mantidos na íntegra
+            embeddings: Modelo de embeddings (LangChain) usado para detectar mudança de assunto;
+                sem ele, relatedness() não está disponível
         """
         self.max_turns = max_turns
-        self.history = []  # Lista de dicionários com 'role' e 'content'
+        self.embeddings = embeddings
+        self.messages: Deque[Message] = deque(maxlen=max_turns * 2)
+        # Um vetor normalizado por mensagem, calculado uma única vez em add_interaction
+        self.turn_vectors: Deque[np.ndarray] = deque(maxlen=max_turns * 2)
+        # `context` do Ollama após o último turno: prefixo já avaliado da conversa
+        self.llm_context: Optional[List[int]] = None
+
+        self._recent_text = ""  # mensagens do buffer já formatadas e unidas
+        self._recent_tokens = 0
+        self.summary: Deque[Message] = deque()  # uma linha por turno resumido
+        self._summary_tokens = 0
+        self._pending_question = ""  # pergunta já removida do buffer, à espera da resposta
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """Mensagens do buffer como dicionários com 'role' e 'content'"""
+        return [{'role': msg.role, 'content': msg.content} for msg in self.messages]
+
+    @staticmethod
+    def _format(role: str, content: str) -> str:
+        label = "👤 Usuário" if role == 'user' else "🤖 Assistente"
+        return f"{label}: {content}"
+
+    @staticmethod
+    def _summarize_turn(user_message: str, assistant_message: str) -> str:
+        """Resumo extrativo de um turno: a pergunta e a primeira frase da resposta"""
+        answer = re.sub(r"[*#`>]+", "", assistant_message)
+        answer = " ".join(answer.split())
+        first_sentence = re.split(r"(?<=[.!?])\s", answer, maxsplit=1)[0]
+        limit = RAGConfig.MEMORY_SUMMARY_ANSWER_CHARS
+        if len(first_sentence) > limit:
+            first_sentence = first_sentence[:limit].rsplit(" ", 1)[0] + "…"
+        return f"- Pergunta: {' '.join(user_message.split())} → {first_sentence}"
 
-    def add_interaction(self, user_message: str, assistant_message: str):
+    def _append(self, role: str, content: str) -> None:
+        if len(self.messages) == self.messages.maxlen:
+            self._evict()
+        line = self._format(role, content)
+        message = Message(role, content, line, estimate_tokens(line))
+        self.messages.append(message)
+        self._recent_text = self._recent_text + self.SEPARATOR + line if self._recent_text else line
+        self._recent_tokens += message.tokens
+
+    def _evict(self) -> None:
+        """Remove a mensagem mais antiga do buffer; um turno completo vira uma linha de resumo"""
+        oldest = self.messages.popleft()
+        self._recent_text = self._recent_text[len(oldest.line) + len(self.SEPARATOR):]
+        self._recent_tokens -= oldest.tokens
+
+        if oldest.role == 'user':
+            self._pending_question = oldest.content
+            return
+        line = self._summarize_turn(self._pending_question, oldest.content)
+        self._pending_question = ""
+        self.summary.append(Message('summary', line, line, estimate_tokens(line)))
+        self._summary_tokens += self.summary[-1].tokens
+        while self._summary_tokens > RAGConfig.MEMORY_SUMMARY_TOKENS and self.summary:
+            self._summary_tokens -= self.summary.popleft().tokens
+
+    def add_interaction(self, user_message: str, assistant_message: str,
+                        llm_context: Optional[List[int]] = None):
         """
         Adiciona uma interação completa ao histórico
 
         Args:
             user_message: Mensagem do usuário
             assistant_message: Resposta do assistente
+            llm_context: `context` devolvido pelo Ollama para este turno (None descarta o anterior,
+                pois ele não contém esta interação)
+        """
+        self.llm_context = llm_context
+        self._append('user', user_message)
+        self._append('assistant', assistant_message)
+
+        if self.embeddings is not None:
+            vectors = np.asarray(self.embeddings.embed_documents(
+                [user_message, assistant_message[:RAGConfig.TOPIC_ANSWER_CHARS]]
+            ), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.turn_vectors.extend(vectors / np.where(norms > 0, norms, 1.0))
+
+    def relatedness(self, query_vector) -> Optional[float]:
+        """
+        Maior similaridade cosseno entre a pergunta e as mensagens guardadas
+
+        Args:
+            query_vector: Embedding da pergunta
+
+        Returns:
+            Similaridade máxima, ou None se não houver vetores (histórico vazio ou sem embeddings)
+        """
+        if not self.turn_vectors:
+            return None
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        if norm == 0:
+            return 0.0
+        return float(np.max(np.stack(self.turn_vectors) @ (query_vector / norm)))
+
+    def is_related(self, query: str, query_vector=None) -> bool:
         """
-        self.history.append({
-            'role': 'user',
-            'content': user_message
-        })
-        self.history.append({
-            'role': 'assistant',
-            'content': assistant_message
-        })
+        Verifica se a pergunta continua a conversa guardada
 
-        # Mantém apenas os últimos N turnos (N*2 mensagens)
-        max_messages = self.max_turns * 2
-        if len(self.history) > max_messages:
-            self.history = self.history[-max_messages:]
+        Compara o embedding da pergunta com os das mensagens (calculados uma vez
+        em add_interaction). Perguntas curtas que retomam algo já dito ("e os
+        horários delas?") também contam, pois têm pouco conteúdo próprio para comparar.
 
-    def get_formatted_history(self) -> str:
+        Args:
+            query: Pergunta atual
+            query_vector: Embedding da pergunta (calculado aqui se None)
+
+        Returns:
+            True se relacionada, False caso contrário
+        """
+        if not self.messages:
+            return False
+
+        query_lower = query.lower()
+        if (len(re.findall(r"\w+", query_lower)) <= RAGConfig.TOPIC_SHORT_QUERY_WORDS
+                and self.REFERENCE_PATTERN.search(query_lower)):
+            return True
+
+        if query_vector is None and self.embeddings is not None:
+            query_vector = self.embeddings.embed_query(query)
+        similarity = self.relatedness(query_vector) if query_vector is not None else None
+        if similarity is None:
+            # Sem embeddings: na dúvida, mantém o histórico
+            return True
+
+        related = similarity >= RAGConfig.TOPIC_SHIFT_THRESHOLD
+        logger.info(f"Similaridade com o histórico: {similarity:.3f} "
+                    f"({'relacionada' if related else 'mudança de assunto'})")
+        return related
+
+    @property
+    def token_count(self) -> int:
+        """Tokens estimados do histórico completo (resumo + mensagens recentes)"""
+        header = estimate_tokens(self.SUMMARY_HEADER) if self.summary else 0
+        return self._recent_tokens + self._summary_tokens + header
+
+    def get_formatted_history(self, max_tokens: Optional[int] = None) -> str:
         """
         Retorna o histórico formatado para inclusão no prompt
 
+        Args:
+            max_tokens: Limite aproximado de tokens. Acima dele, as linhas mais antigas do
+                resumo saem primeiro e depois as mensagens mais antigas (a última sempre fica)
+
         Returns:
             String formatada com o histórico da conversa
         """
-        if not self.history:
+        if not self.messages:
             return "Nenhuma conversa anterior."
 
-        formatted = []
-        for msg in self.history:
-            role = "👤 Usuário" if msg['role'] == 'user' else "🤖 Assistente"
-            formatted.append(f"{role}: {msg['content']}")
+        if max_tokens is None or self.token_count <= max_tokens:
+            if not self.summary:
+                return self._recent_text
+            return self._summary_text(self.summary) + self.SEPARATOR + self._recent_text
+
+        # Mensagens recentes primeiro (da mais nova para a mais antiga), depois o resumo
+        recent: List[str] = []
+        used = 0
+        for message in reversed(self.messages):
+            if recent and used + message.tokens > max_tokens:
+                break
+            recent.append(message.line)
+            used += message.tokens
+
+        summary: List[Message] = []
+        if len(recent) == len(self.messages):
+            for line in reversed(self.summary):
+                if used + line.tokens > max_tokens:
+                    break
+                summary.append(line)
+                used += line.tokens
+
+        text = self.SEPARATOR.join(reversed(recent))
+        if summary:
+            text = self._summary_text(reversed(summary)) + self.SEPARATOR + text
+        return text
+
+    def _summary_text(self, lines) -> str:
+        return "\n".join([self.SUMMARY_HEADER] + [line.line for line in lines])
+
+    def to_state(self) -> Dict:
+        """
+        Estado serializável em JSON, usado pelo armazenamento de sessões
+
+        Returns:
+            Dicionário com mensagens, resumo, vetores (float32 em base64) e `context` do Ollama
+        """
+        vectors = None
+        if self.turn_vectors:
+            vectors = base64.b64encode(np.stack(self.turn_vectors).astype(np.float32).tobytes()).decode('ascii')
+        return {
+            'messages': [[msg.role, msg.content] for msg in self.messages],
+            'summary': [line.line for line in self.summary],
+            'pending_question': self._pending_question,
+            'vectors': vectors,
+            'llm_context': self.llm_context,
+        }
+
+    def load_state(self, state: Dict) -> None:
+        """
+        Restaura um estado gerado por to_state()
+
+        Args:
+            state: Estado salvo; se max_turns mudou, as mensagens excedentes viram resumo
+        """
+        self.reset()
+        for line in state.get('summary', []):
+            self.summary.append(Message('summary', line, line, estimate_tokens(line)))
+            self._summary_tokens += self.summary[-1].tokens
+        self._pending_question = state.get('pending_question', "")
+        for role, content in state.get('messages', []):
+            self._append(role, content)
+
+        if state.get('vectors') and self.embeddings is not None:
+            vectors = np.frombuffer(base64.b64decode(state['vectors']), dtype=np.float32)
+            self.turn_vectors.extend(vectors.reshape(len(state['messages']), -1))
+        self.llm_context = state.get('llm_context')
 
-        return "\n\n".join(formatted)
+    def reset(self):
+        """Limpa o histórico e o contexto do Ollama sem mensagens no terminal"""
+        self.messages.clear()
+        self.turn_vectors.clear()
+        self.summary.clear()
+        self._recent_text = ""
+        self._recent_tokens = 0
+        self._summary_tokens = 0
+        self._pending_question = ""
+        self.llm_context = None
 
     def clear(self):
         """Limpa todo o histórico de conversas"""
-        self.history = []
+        self.reset()
         print("🧹 Memória conversacional limpa!")
 
     def get_turn_count(self) -> int:
         """Retorna o número de turnos (pares pergunta-resposta) no histórico"""
-        return len(self.history) // 2
\ No newline at end of file
+        return len(self.messages) // 2
@@ -1,16 +1,157 @@
+from bisect import bisect_right
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import RAGConfig
+
+
+class Chunk(NamedTuple):
+    """Trecho do texto original: text == texto_original[start:end]"""
+    text: str
+    start: int
+    end: int
+
+
+class TextChunker:
+    """
+    Divide textos em chunks para indexação
+
+    Reproduz as fronteiras do RecursiveCharacterTextSplitter do LangChain com
+    os mesmos separadores (quebra preferencialmente em parágrafos, depois
+    linhas, frases e palavras), mas trabalhando só com posições no texto
+    original: os chunks saem sob demanda, com os offsets `start`/`end`, sem
+    cópias intermediárias dos trechos.
+    """
+
+    SEPARATORS = ("\n\n", "\n", ". ", " ", "")  # Ordem de preferência para quebras
+    VERSION = "recursive-2"  # muda quando as fronteiras dos chunks mudam (reindexa as fontes)
+
+    def __init__(self, chunk_size: int = RAGConfig.CHUNK_SIZE, chunk_overlap: int = RAGConfig.CHUNK_OVERLAP,
+                 length_function: Optional[Callable[[str], int]] = None):
         """
         Inicializa o chunker
 
         Args:
             chunk_size: Tamanho máximo de cada chunk
             chunk_overlap: Overlap entre chunks consecutivos
+            length_function: Mede o tamanho de um trecho (ex: tokens do tokenizer do modelo
+                de embeddings); None = caracteres. chunk_size e chunk_overlap usam a mesma unidade
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap deve ser menor que chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+
+    def _length(self, text: str, start: int, end: int) -> int:
+        if self.length_function is None:
+            return end - start
+        return self.length_function(text[start:end])
+
+    def _split_points(self, text: str, start: int, end: int, separator: str) -> Iterator[Tuple[int, int]]:
+        """
+        Pedaços de text[start:end] separados por `separator` (ocorrências sem sobreposição)
+
+        O separador fica no início do pedaço seguinte, então os pedaços são
+        contíguos e qualquer sequência deles é um trecho do texto original.
+        Sem separador, cada caractere é um pedaço.
+        """
+        if not separator:
+            for position in range(start, end):
+                yield position, position + 1
+            return
+        piece_start = start
+        position = text.find(separator, start, end)
+        while position >= 0:
+            if position > piece_start:
+                yield piece_start, position
+            piece_start = position
+            position = text.find(separator, position + len(separator), end)
+        if end > piece_start:
+            yield piece_start, end
+
+    def _emit(self, text: str, start: int, end: int) -> Optional[Chunk]:
+        """Chunk sem os espaços das bordas (None se só houver espaços)"""
+        raw = text[start:end]
+        stripped = raw.strip()
+        if not stripped:
+            return None
+        start += len(raw) - len(raw.lstrip())
+        return Chunk(stripped, start, start + len(stripped))
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int, int]]) -> Iterator[Chunk]:
+        """
+        Junta pedaços consecutivos enquanto couberem em chunk_size
+
+        O chunk seguinte recomeça nos últimos pedaços que somam até chunk_overlap.
+        """
+        window: Deque[Tuple[int, int, int]] = deque()
+        total = 0
+        for piece in pieces:
+            length = piece[2]
+            if window and total + length > self.chunk_size:
+                chunk = self._emit(text, window[0][0], window[-1][1])
+                if chunk is not None:
+                    yield chunk
+                while window and (total > self.chunk_overlap or (total + length > self.chunk_size and total > 0)):
+                    total -= window.popleft()[2]
+            window.append(piece)
+            total += length
+        if window:
+            chunk = self._emit(text, window[0][0], window[-1][1])
+            if chunk is not None:
+                yield chunk
+
+    def _split(self, text: str, start: int, end: int, level: int) -> Iterator[Chunk]:
+        """
+        Divide text[start:end] a partir do separador SEPARATORS[level]
+
+        Usa o primeiro separador (desse nível em diante) presente no trecho.
+        Pedaços menores que chunk_size são juntados por _merge(); cada pedaço
+        maior é dividido sozinho com os separadores seguintes, sem se juntar
+        aos vizinhos.
+        """
+        for level in range(level, len(self.SEPARATORS)):
+            separator = self.SEPARATORS[level]
+            if not separator or text.find(separator, start, end) >= 0:
+                break
+
+        good: List[Tuple[int, int, int]] = []
+        for piece_start, piece_end in self._split_points(text, start, end, separator):
+            length = self._length(text, piece_start, piece_end)
+            if length < self.chunk_size:
+                good.append((piece_start, piece_end, length))
+                continue
+            if good:
+                yield from self._merge(text, good)
+                good = []
+            if not separator:
+                yield Chunk(text[piece_start:piece_end], piece_start, piece_end)
+            else:
+                yield from self._split(text, piece_start, piece_end, level + 1)
+        if good:
+            yield from self._merge(text, good)
+
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
         """
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]  # Ordem de preferência para quebras
-        )
+        Divide um texto em chunks, sob demanda
+
+        Os chunks têm as mesmas fronteiras do RecursiveCharacterTextSplitter
+        (keep_separator=True, strip_whitespace=True) com os mesmos separadores.
+
+        Args:
+            text: Texto a ser dividido
+
+        Yields:
+            Chunk com o texto e os offsets no texto original
+        """
+        return self._split(text, 0, len(text), 0)
+
+    def split_text(self, text: str) -> List[str]:
+        """Textos dos chunks (mesma interface do splitter do LangChain)"""
+        return [chunk.text for chunk in self.iter_chunks(text)]
 
     def chunk_text(self, text: str, metadata: Optional[Dict] = None) -> List[Document]:
         """
@@ -21,28 +162,90 @@
             metadata: Metadados opcionais (ex: nome do arquivo, URL)
 
         Returns:
-            Lista de Documents do LangChain
+            Lista de Documents do LangChain, com 'start'/'end' (offsets no texto) nos metadados
         """
         try:
             if not text or len(text.strip()) == 0:
                 raise ValueError("Texto vazio fornecido para chunking")
 
-            # Cria chunks
-            chunks = self.text_splitter.split_text(text)
+            # Metadados da fonte montados uma vez; cada chunk só acrescenta os seus campos
+            shared = tuple((metadata or {}).items())
+            documents = [
+                Document(page_content=chunk.text,
+                         metadata=dict(shared, chunk_id=i, start=chunk.start, end=chunk.end))
+                for i, chunk in enumerate(self.iter_chunks(text))
+            ]
+            for doc in documents:
+                doc.metadata['chunk_total'] = len(documents)
 
-            # Converte para Documents com metadata
-            documents = []
-            for i, chunk in enumerate(chunks):
-                doc_metadata = metadata.copy() if metadata else {}
-                doc_metadata['chunk_id'] = i
-                doc_metadata['chunk_total'] = len(chunks)
+            return documents
 
-                documents.append(Document(
-                    page_content=chunk,
-                    metadata=doc_metadata
-                ))
+        except Exception as e:
+            raise Exception(f"Erro ao fazer chunking do texto: {str(e)}")
 
-            return documents
+    def chunk_pages(self, pages: Iterable[Tuple[int, str]], metadata: Optional[Dict] = None) -> Iterator[Document]:
+        """
+        Divide um documento paginado em chunks de forma incremental
+
+        Consome as páginas uma a uma (ex: DocumentLoader.iter_pdf_pages), mantendo
+        em memória apenas a página atual e o último chunk ainda incompleto. Os
+        offsets 'start'/'end' se referem ao texto das páginas não vazias unidas por "\\n".
+
+        Args:
+            pages: Iterável de tuplas (número da página, texto)
+            metadata: Metadados opcionais (ex: nome do arquivo)
+
+        Yields:
+            Documents com 'page' (página inicial), 'page_end', 'start' e 'end' nos metadados
+        """
+        shared = tuple((metadata or {}).items())
+        buffer = ""  # Texto desde o início do último chunk, que pode continuar na próxima página
+        buffer_offset = 0  # Posição do buffer no documento
+        page_starts: List[int] = []  # Offsets (no buffer) onde cada página começa
+        page_numbers: List[int] = []
+        chunk_id = 0
+
+        def make_document(chunk: Chunk) -> Document:
+            first = page_numbers[max(bisect_right(page_starts, chunk.start) - 1, 0)]
+            last = page_numbers[max(bisect_right(page_starts, chunk.end - 1) - 1, 0)]
+            return Document(page_content=chunk.text, metadata=dict(
+                shared, chunk_id=chunk_id, page=first, page_end=last,
+                start=buffer_offset + chunk.start, end=buffer_offset + chunk.end,
+            ))
+
+        try:
+            for page_number, page_text in pages:
+                if not page_text or not page_text.strip():
+                    continue
+
+                if buffer:
+                    buffer += "\n"
+                page_starts.append(len(buffer))
+                page_numbers.append(page_number)
+                buffer += page_text
+
+                last: Optional[Chunk] = None
+                for chunk in self.iter_chunks(buffer):
+                    if last is not None:
+                        yield make_document(last)
+                        chunk_id += 1
+                    last = chunk
+
+                # Mantém o último chunk para juntar com a próxima página
+                cut = last.start if last is not None else len(buffer)
+                first_page = max(bisect_right(page_starts, cut) - 1, 0)
+                page_starts = [max(offset - cut, 0) for offset in page_starts[first_page:]]
+                page_numbers = page_numbers[first_page:]
+                buffer = buffer[cut:]
+                buffer_offset += cut
+
+            if buffer.strip():
+                for chunk in self.iter_chunks(buffer):
+                    yield make_document(chunk)
+                    chunk_id += 1
+
+            if chunk_id == 0:
+                raise ValueError("Texto vazio fornecido para chunking")
 
         except Exception as e:
-            raise Exception(f"Erro ao fazer chunking do texto: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Erro ao fazer chunking do texto: {str(e)}")
@@ -0,0 +1,305 @@
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+ENCODE_BLOCK = 16384  # vetores por bloco ao codificar/pontuar (limita a memória temporária)
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Índice do centróide mais próximo (L2) de cada linha, em blocos"""
+    half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ENCODE_BLOCK):
+        block = np.asarray(data[start:start + ENCODE_BLOCK], dtype=np.float32)
+        # ||x - c||² = ||x||² - 2·x·c + ||c||²: o menor é o de maior x·c - ||c||²/2
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assign
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = RAGConfig.QUANT_KMEANS_ITERATIONS,
+           seed: int = 0) -> np.ndarray:
+    """
+    K-means (Lloyd) em NumPy
+
+    Args:
+        data: Matriz (n, d) de treino
+        k: Número de centróides (limitado a n)
+        iterations: Iterações de atribuição + média
+        seed: Semente da inicialização (amostra de k pontos)
+
+    Returns:
+        Centróides (k, d) em float32
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind='stable')
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(data[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            # Centróide sem pontos recomeça num ponto aleatório
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+def _top_rows(scores: np.ndarray, rows: np.ndarray, count: int) -> np.ndarray:
+    """Linhas com as `count` maiores pontuações (sem ordem definida)"""
+    if len(scores) <= count:
+        return rows
+    return rows[np.argpartition(-scores, count - 1)[:count]]
+
+
+class ScalarQuantizer:
+    """
+    Quantização escalar int8 por dimensão (4x menor que float32)
+
+    Cada dimensão é mapeada de [mín, máx] para [-127, 127]; o produto escalar
+    com a pergunta é calculado direto sobre os códigos (q·x ≈ q·offset + (q·scale)·código).
+    """
+
+    kind = "int8"
+    SCAN_BLOCK = 4096  # linhas convertidas para float32 por vez na busca
+
+    def __init__(self):
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.codes = np.zeros((0, 0), dtype=np.int8)
+        self.trained_on = 0
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos códigos e parâmetros"""
+        return int(self.codes.nbytes + (self.offset.nbytes + self.scale.nbytes if self.offset is not None else 0))
+
+    def params(self) -> Dict:
+        return {}
+
+    def fit(self, sample: np.ndarray, total: Optional[int] = None) -> None:
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        self.offset = ((high + low) / 2).astype(np.float32)
+        self.scale = np.maximum((high - low) / 254, 1e-8).astype(np.float32)
+        self.codes = np.zeros((0, sample.shape[1]), dtype=np.int8)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Codifica e acrescenta vetores (linhas seguintes às já codificadas)"""
+        parts = [self.codes]
+        for start in range(0, len(vectors), ENCODE_BLOCK):
+            block = np.asarray(vectors[start:start + ENCODE_BLOCK], dtype=np.float32)
+            parts.append(np.clip(np.rint((block - self.offset) / self.scale), -127, 127).astype(np.int8))
+        self.codes = np.concatenate(parts)
+
+    def keep(self, rows: np.ndarray) -> None:
+        """Mantém só as linhas indicadas, na ordem dada (compactação do índice)"""
+        self.codes = self.codes[rows]
+
+    def search(self, queries: np.ndarray, count: int, alive: np.ndarray) -> List[np.ndarray]:
+        """
+        Candidatos aproximados: varredura completa sobre os códigos int8
+
+        Returns:
+            Para cada pergunta, as `count` linhas de maior produto escalar aproximado
+        """
+        n = len(self.codes)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        scaled = queries * self.scale
+        base = queries @ self.offset
+        # Buffer pequeno e reaproveitado: a conversão para float32 fica no cache da CPU
+        buffer = np.empty((self.SCAN_BLOCK, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n, self.SCAN_BLOCK):
+            block = self.codes[start:start + self.SCAN_BLOCK]
+            np.copyto(buffer[:len(block)], block, casting='unsafe')
+            np.matmul(scaled, buffer[:len(block)].T, out=scores[:, start:start + len(block)])
+        scores += base[:, None]
+        scores[:, ~alive] = -np.inf
+        rows = np.arange(n)
+        return [_top_rows(row_scores, rows, count) for row_scores in scores]
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {'offset': self.offset, 'scale': self.scale, 'codes': self.codes}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.offset, self.scale, self.codes = state['offset'], state['scale'], state['codes']
+
+
+class IVFPQIndex:
+    """
+    IVF + product quantization (códigos de `subvectors` bytes por vetor)
+
+    Um k-means grosso divide os vetores em `nlist` listas; o resíduo de cada
+    vetor em relação ao centróide da sua lista é dividido em `subvectors`
+    pedaços, cada um trocado pelo índice (1 byte) do codeword mais próximo. Na
+    busca, só as `nprobe` listas mais próximas da pergunta são visitadas e o
+    produto escalar sai de uma tabela (subvetor x 256) calculada uma vez por
+    pergunta: q·x ≈ q·centróide + Σ q_m·codeword_m[código_m].
+
+    Os códigos ficam agrupados por lista (contíguos na memória); `order` guarda
+    a linha original de cada posição.
+    """
+
+    kind = "ivfpq"
+    CODEWORDS = 256
+
+    def __init__(self, nlist: int = RAGConfig.IVF_NLIST, subvectors: int = RAGConfig.PQ_SUBVECTORS,
+                 nprobe: int = RAGConfig.IVF_NPROBE):
+        """
+        Args:
+            nlist: Listas do particionamento grosso (0 = automático pelo tamanho do índice)
+            subvectors: Subvetores do PQ (ajustado para dividir a dimensão)
+            nprobe: Listas visitadas por pergunta
+        """
+        self.nlist = nlist
+        self.subvectors = subvectors
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None  # (nlist, d)
+        self.codebooks: Optional[np.ndarray] = None  # (subvectors, 256, d / subvectors)
+        self.codes = np.zeros((0, 0), dtype=np.uint8)  # agrupados por lista
+        self.order = np.zeros(0, dtype=np.int32)  # linha original de cada código
+        self.offsets = np.zeros(1, dtype=np.int64)  # início de cada lista em codes/order
+        self.trained_on = 0
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos códigos, listas e codebooks"""
+        arrays = [self.codes, self.order, self.offsets]
+        if self.centroids is not None:
+            arrays += [self.centroids, self.codebooks]
+        return int(sum(array.nbytes for array in arrays))
+
+    def params(self) -> Dict:
+        return {'nlist': self.nlist, 'subvectors': self.subvectors}
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, d) -> (n, subvectors, d / subvectors)"""
+        return vectors.reshape(len(vectors), self.codebooks.shape[0], -1)
+
+    def fit(self, sample: np.ndarray, total: Optional[int] = None) -> None:
+        """
+        Treina as listas e os codebooks
+
+        Args:
+            sample: Vetores de treino
+            total: Tamanho do índice inteiro (define nlist automático; padrão: len(sample))
+        """
+        dim = sample.shape[1]
+        nlist = self.nlist or int(np.clip(2 * np.sqrt(total or len(sample)), 1, 1024))
+        subvectors = max(m for m in range(1, min(self.subvectors, dim) + 1) if dim % m == 0)
+        if subvectors != self.subvectors:
+            logger.warning(f"PQ_SUBVECTORS={self.subvectors} não divide a dimensão {dim}: usando {subvectors}")
+
+        self.centroids = kmeans(sample, nlist)
+        residuals = sample - self.centroids[_nearest(sample, self.centroids)]
+        # 256 codewords por subespaço convergem com bem menos pontos que o particionamento grosso
+        parts = residuals[:self.CODEWORDS * 32].reshape(-1, subvectors, dim // subvectors)
+        self.codebooks = np.stack([kmeans(parts[:, m], self.CODEWORDS, seed=m + 1) for m in range(subvectors)])
+        if self.codebooks.shape[1] < self.CODEWORDS:  # treino menor que 256 pontos: completa a tabela
+            pad = np.repeat(self.codebooks[:, :1], self.CODEWORDS - self.codebooks.shape[1], axis=1)
+            self.codebooks = np.concatenate([self.codebooks, pad], axis=1)
+        self.codes = np.zeros((0, subvectors), dtype=np.uint8)
+        self.order = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+
+    def _encode(self, vectors: np.ndarray):
+        lists = np.empty(len(vectors), dtype=np.int32)
+        codes = np.empty((len(vectors), self.codebooks.shape[0]), dtype=np.uint8)
+        half_norms = 0.5 * np.einsum('mkd,mkd->mk', self.codebooks, self.codebooks)
+        for start in range(0, len(vectors), ENCODE_BLOCK):
+            block = np.asarray(vectors[start:start + ENCODE_BLOCK], dtype=np.float32)
+            assign = _nearest(block, self.centroids)
+            parts = self._split(block - self.centroids[assign])
+            lists[start:start + len(block)] = assign
+            for m, codebook in enumerate(self.codebooks):
+                # Codeword mais próximo em cada subespaço
+                codes[start:start + len(block), m] = np.argmax(parts[:, m] @ codebook.T - half_norms[m], axis=1)
+        return lists, codes
+
+    def _row_layout(self):
+        """Listas e códigos na ordem das linhas (desfaz o agrupamento por lista)"""
+        lists = np.empty(len(self.order), dtype=np.int32)
+        lists[self.order] = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+        codes = np.empty_like(self.codes)
+        codes[self.order] = self.codes
+        return lists, codes
+
+    def _group(self, lists: np.ndarray, codes: np.ndarray) -> None:
+        """Agrupa os códigos por lista"""
+        order = np.argsort(lists, kind='stable')
+        self.order = order.astype(np.int32)
+        self.codes = codes[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(self.centroids)))])
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Codifica e acrescenta vetores (linhas seguintes às já codificadas)"""
+        new_lists, new_codes = self._encode(vectors)
+        lists, codes = self._row_layout()
+        self._group(np.concatenate([lists, new_lists]), np.concatenate([codes, new_codes]))
+
+    def keep(self, rows: np.ndarray) -> None:
+        """Mantém só as linhas indicadas, na ordem dada (compactação do índice)"""
+        lists, codes = self._row_layout()
+        self._group(lists[rows], codes[rows])
+
+    def search(self, queries: np.ndarray, count: int, alive: np.ndarray) -> List[np.ndarray]:
+        """
+        Candidatos aproximados: visita as `nprobe` listas mais próximas de cada pergunta
+
+        Returns:
+            Para cada pergunta, até `count` linhas de maior produto escalar aproximado
+        """
+        half_norms = 0.5 * np.einsum('ij,ij->i', self.centroids, self.centroids)
+        coarse = queries @ self.centroids.T
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(coarse - half_norms), nprobe - 1, axis=1)[:, :nprobe]
+        # Tabelas q_m·codeword_m: (perguntas, subvetores, 256)
+        tables = np.einsum('qmd,mkd->qmk', self._split(queries), self.codebooks)
+        subspaces = np.arange(self.codes.shape[1])
+
+        results = []
+        for query, probe in enumerate(probes):
+            starts, ends = self.offsets[probe], self.offsets[probe + 1]
+            sizes = ends - starts
+            if not sizes.sum():
+                results.append(np.zeros(0, dtype=np.int64))
+                continue
+            positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+            scores = np.repeat(coarse[query, probe], sizes)
+            scores += tables[query][subspaces, self.codes[positions]].sum(axis=1)
+            rows = self.order[positions].astype(np.int64)
+            valid = alive[rows]
+            results.append(_top_rows(scores[valid], rows[valid], count))
+        return results
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {'centroids': self.centroids, 'codebooks': self.codebooks, 'codes': self.codes,
+                'order': self.order, 'offsets': self.offsets}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.centroids, self.codebooks = state['centroids'], state['codebooks']
+        self.codes, self.order, self.offsets = state['codes'], state['order'], state['offsets']
+
+
+QUANTIZERS = {'int8': ScalarQuantizer, 'ivfpq': IVFPQIndex}
+
+
+def create_quantizer(kind: str):
+    """Instancia o quantizador de um backend ("int8" ou "ivfpq")"""
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Quantização não suportada: {kind}. Use 'int8' ou 'ivfpq'")
+    return QUANTIZERS[kind]()
@@ -1,72 +1,907 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from langchain_core.documents import Document
+
+from src.answer_cache import SemanticAnswerCache, answer_scope
+from src.batch import BatchCheckpoint, normalize_questions
+from src.config import RAGConfig
+from src.context import ContextBuilder, estimate_tokens
+from src.dedup import NearDuplicateIndex
+from src.llm import OllamaManager, OllamaOverloadedError
+from src.embedding_engine import EmbeddingEngine
+from src.embeddings import CachedEmbeddings, EmbeddingCache
+from src.html_extract import heading_sections, section_at
+from src.httpcache import HTTPCache
+from src.lexical import BM25Index, reciprocal_rank_fusion
+from src.loaders import DocumentLoader, LoadResult, ScrapeResult, WebScraper
+from src.manifest import IngestionManifest, PendingChunks, hash_file, hash_text
+from src.memory import ConversationMemory
+from src.proccessing import TextChunker
+from src.reranker import CrossEncoderReranker
+from src.sessions import create_session_store
+from src.tracing import tracer
+from src.vectorstores import NumpyVectorStore, QuantizedVectorStore
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+class RAGSystem:
+    """Sistema RAG completo: ingestão, busca vetorial e geração com memória"""
+
+    def __init__(self, model_name: str = RAGConfig.OLLAMA_MODEL, max_memory_turns: int = 3):
+        """
+        Inicializa o sistema RAG
+
+        Args:
+            model_name: Nome do modelo Ollama
+            max_memory_turns: Número de turnos mantidos na memória conversacional
+        """
+        print("🔧 Inicializando sistema RAG...")
+        init_started = time.perf_counter()
+        # Tempo de cada fase da inicialização (o modelo de embeddings e o
+        # aquecimento do LLM continuam em segundo plano: ver startup_report())
+        self.startup_phases: Dict[str, float] = {}
+
+        with self._startup_phase('ollama'):
+            # Uma única chamada ao servidor responde às duas verificações
+            if not OllamaManager.status(refresh=True)['running']:
+                raise ConnectionError("Ollama não está rodando. Execute 'ollama serve' em um terminal.")
+
+            if not OllamaManager.check_model_available(model_name):
+                OllamaManager.pull_model(model_name)
+
+        self.model_name = model_name
+        self.context_builder = ContextBuilder()
+
+        self.llm_warmup_seconds: Optional[float] = None
+        self._warmup_thread = None
+        if RAGConfig.OLLAMA_WARMUP:
+            self._warmup_thread = threading.Thread(target=self._warm_up_llm, name="llm-warmup", daemon=True)
+            self._warmup_thread.start()
+
+        print(f"📊 Carregando modelo de embeddings ({RAGConfig.EMBEDDING_MODEL}) em segundo plano...")
+        with self._startup_phase('embedding_engine'):
+            self.embedding_engine = EmbeddingEngine(RAGConfig.EMBEDDING_MODEL, background=True)
+
+        if RAGConfig.CHUNK_LENGTH_UNIT == "tokens":
+            # Chunks medidos no tokenizer do modelo: nenhum passa do limite de entrada dele
+            self.chunker = TextChunker(RAGConfig.CHUNK_SIZE_TOKENS, RAGConfig.CHUNK_OVERLAP_TOKENS,
+                                       length_function=self.embedding_engine.count_tokens)
+        else:
+            self.chunker = TextChunker(RAGConfig.CHUNK_SIZE, RAGConfig.CHUNK_OVERLAP)
+
+        # Chunks e perguntas repetidos reaproveitam vetores do cache em disco
+        self.embedding_cache = EmbeddingCache(self.embedding_engine.cache_namespace,
+                                              dtype=RAGConfig.EMBEDDING_CACHE_DTYPE or self.embedding_engine.precision)
+        self.embeddings = CachedEmbeddings(self.embedding_engine, self.embedding_cache)
+
+        self.reranker = None
+        self.last_rerank_stats: Dict = {}
+        if RAGConfig.RERANK_ENABLED:
+            print(f"📊 Carregando cross-encoder ({RAGConfig.RERANK_MODEL})...")
+            with self._startup_phase('reranker'):
+                self.reranker = CrossEncoderReranker()
+
+        self.vectorstore = None
+        self.max_memory_turns = max_memory_turns
+        self.memory = self.create_memory()
+        # Memórias por session_id (query(..., session_id=...) e servidor HTTP)
+        self.session_store = create_session_store(self.create_memory)
+        self.last_generation_stats: Dict = {}
+        self.last_prompt_stats: Dict = {}
+        # Instruções fixas no prompt do sistema: prefixo idêntico em todas as perguntas
+        self.system_prompt = RAGConfig.SYSTEM_PROMPT + "\n\n" + RAGConfig.PROMPT_INSTRUCTIONS
+        self.prompt_tokens_evaluated = 0
+        self.prompt_tokens_reused = 0
+        self.answer_cache = SemanticAnswerCache() if RAGConfig.ANSWER_CACHE_ENABLED else None
+
+        # Ingestão incremental: só fontes novas ou alteradas são reprocessadas
+        self.pending = PendingChunks()  # fontes alteradas, com os chunks em disco até o build_vectorstore()
+        self.registered_sources: Set[str] = set()
+        self.unchanged_sources: Set[str] = set()  # hash igual ao do manifesto desde o último build_vectorstore()
+        self.last_dedup_report: Dict = {}
+        with self._startup_phase('indexes'):
+            self.manifest = IngestionManifest(RAGConfig.PERSIST_DIRECTORY)
+            self.http_cache = HTTPCache(RAGConfig.HTTP_CACHE_DIR)
+            self.lexical_index = BM25Index(RAGConfig.LEXICAL_INDEX_DIR)
+            self.dedup = NearDuplicateIndex(RAGConfig.DEDUP_INDEX_DIR) if RAGConfig.DEDUP_ENABLED else None
+            # Aberto agora, enquanto o modelo carrega; build_vectorstore() o reaproveita
+            self._opened_vectorstore = self._open_vectorstore()
+
+        self.startup_phases['total'] = time.perf_counter() - init_started
+        logger.info(f"RAGSystem inicializado com modelo {model_name} em {self.startup_phases['total']:.2f}s "
+                    f"({', '.join(f'{k}={v:.2f}s' for k, v in self.startup_phases.items() if k != 'total')})")
+        print("✅ Sistema RAG inicializado!")
+
+    @contextmanager
+    def _startup_phase(self, name: str) -> Iterator[None]:
+        """Mede uma fase da inicialização (self.startup_phases e span startup_<fase>)"""
+        started = time.perf_counter()
+        with tracer.span(f'startup_{name}'):
+            yield
+        self.startup_phases[name] = time.perf_counter() - started
+
+    def _warm_up_llm(self) -> None:
+        """Carrega o LLM no Ollama (executado numa thread durante a inicialização)"""
+        try:
+            self.llm_warmup_seconds = OllamaManager.warm_up(self.model_name)
+            tracer.record('startup_llm_warmup', self.llm_warmup_seconds)
+        except Exception as e:
+            logger.warning(f"Não foi possível pré-carregar o modelo {self.model_name}: {e}")
+
+    def startup_report(self, wait: bool = False) -> Dict[str, Optional[float]]:
+        """
+        Tempos da inicialização por fase, incluindo as de segundo plano
+
+        Args:
+            wait: Se True, espera o modelo de embeddings e o aquecimento do LLM terminarem
+
+        Returns:
+            Segundos por fase; None para fases de segundo plano ainda em andamento
+        """
+        if wait:
+            self.embedding_engine.model
+            if self._warmup_thread is not None:
+                self._warmup_thread.join()
+        report: Dict[str, Optional[float]] = dict(self.startup_phases)
+        report['embedding_model'] = self.embedding_engine.load_seconds
+        if self._warmup_thread is not None:
+            report['llm_warmup'] = self.llm_warmup_seconds
+        return report
+
+    def show_startup(self) -> None:
+        """Mostra o tempo de cada fase da inicialização"""
+        report = self.startup_report()
+        phases = [f"{name} {'em andamento' if seconds is None else f'{seconds:.2f}s'}"
+                  for name, seconds in report.items() if name != 'total']
+        print(f"⏱️  Inicialização em {report['total']:.2f}s: {' | '.join(phases)}")
+
+    def _register_source(self, source: str, content_hash: str, documents: Iterable[Document], metadata: Dict) -> int:
+        """
+        Agenda os chunks de uma fonte alterada para (re)indexação
+
+        Os chunks vão para o disco à medida que são produzidos (`documents` pode
+        ser um gerador), sem ficar em memória até o build_vectorstore().
+
+        Returns:
+            Número de chunks da fonte
+        """
+        # IDs determinísticos permitem substituir os chunks antigos da mesma fonte
+        id_prefix = hash_text(f"{source}:{content_hash}")[:20]
+
+        def assign_id(doc: Document) -> None:
+            doc.metadata['chunk_uid'] = f"{id_prefix}-{doc.metadata['chunk_id']}"
+
+        count = self.pending.add(source, content_hash, documents, prepare=assign_id)
+        print(f"✅ {count} chunks preparados de {metadata['source']}")
+        return count
+
+    def add_document(self, file_path: str) -> None:
+        """Adiciona um arquivo (PDF, DOCX ou TXT) ao sistema"""
+        try:
+            path = Path(file_path)
+            if not path.exists():
+                raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
+
+            source = str(path.resolve())
+            self.registered_sources.add(source)
+
+            content_hash = hash_file(source)
+            if self.manifest.is_current(source, content_hash):
+                logger.info(f"Documento inalterado, ignorando: {source}")
+                print(f"⏭️  {path.name} já indexado e sem alterações")
+                self.unchanged_sources.add(source)
+                return
+            self.unchanged_sources.discard(source)
+
+            print(f"📄 Carregando: {path.name}")
+            metadata = {
+                'source': path.name,
+                'source_path': source,
+                'type': path.suffix.lower().lstrip('.'),
+            }
+            with tracer.span('ingest', type=metadata['type'], bytes=path.stat().st_size) as span:
+                if path.suffix.lower() == '.pdf':
+                    # PDFs vão página a página do leitor ao disco, com o número da página nos chunks
+                    # (o span 'chunk' inclui a leitura das páginas)
+                    with tracer.span('chunk') as chunk_span:
+                        pages = DocumentLoader.iter_pdf_pages(file_path)
+                        count = self._register_source(source, content_hash,
+                                                      self.chunker.chunk_pages(pages, metadata), metadata)
+                        chunk_span['chunks'] = count
+                else:
+                    with tracer.span('load', type=metadata['type']) as load_span:
+                        text = DocumentLoader.load_file(file_path)
+                        load_span['chars'] = len(text)
+                    with tracer.span('chunk', chars=len(text)) as chunk_span:
+                        documents = self.chunker.chunk_text(text, metadata)
+                        chunk_span['chunks'] = len(documents)
+                    count = self._register_source(source, content_hash, documents, metadata)
+                span['chunks'] = count
+
+        except Exception as e:
+            logger.error(f"Erro ao adicionar documento {file_path}: {e}")
+            print(f"❌ Erro ao adicionar documento: {str(e)}")
+            raise
+
+    def add_documents(self, sources: Union[str, Iterable[str]],
+                      max_workers: Optional[int] = RAGConfig.LOADER_MAX_WORKERS) -> List[LoadResult]:
+        """
+        Adiciona vários arquivos de uma vez, carregando-os em paralelo
+
+        Args:
+            sources: Diretório, padrão glob (ex: "data/**/*.pdf") ou lista de caminhos
+            max_workers: Número de processos de carregamento (None = número de CPUs)
+
+        Returns:
+            Lista dos arquivos que falharam (LoadResult com o erro)
+        """
+        files = DocumentLoader.resolve_sources(sources)
+        print(f"📂 {len(files)} arquivos encontrados")
+
+        hashes = {}
+        for source in files:
+            self.registered_sources.add(source)
+            content_hash = hash_file(source)
+            if self.manifest.is_current(source, content_hash):
+                logger.info(f"Documento inalterado, ignorando: {source}")
+                self.unchanged_sources.add(source)
+                continue
+            self.unchanged_sources.discard(source)
+            hashes[source] = content_hash
+
+        print(f"⏭️  {len(files) - len(hashes)} arquivos inalterados, {len(hashes)} para carregar")
+
+        failures = []
+        if not hashes:
+            return failures
+        for result in DocumentLoader.load_batch(list(hashes), max_workers=max_workers):
+            path = Path(result.source)
+            if result.error is not None:
+                print(f"❌ {path.name}: {result.error}")
+                failures.append(result)
+                continue
+
+            try:
+                metadata = {
+                    'source': path.name,
+                    'source_path': result.source,
+                    'type': path.suffix.lower().lstrip('.'),
+                }
+                with tracer.span('chunk') as span:
+                    if result.pages is not None:
+                        documents = self.chunker.chunk_pages(result.pages, metadata)
+                    else:
+                        documents = self.chunker.chunk_text(result.text, metadata)
+                    span['chunks'] = self._register_source(result.source, hashes[result.source], documents, metadata)
+            except Exception as e:
+                logger.error(f"Erro ao processar {result.source}: {e}")
+                print(f"❌ {path.name}: {e}")
+                failures.append(LoadResult(result.source, None, e))
+
+        if failures:
+            logger.warning(f"{len(failures)} arquivos falharam no carregamento em lote")
+        return failures
+
+    def _register_url(self, url: str, text: str) -> None:
+        """Agenda o texto de uma URL para indexação, se mudou desde a última execução"""
+        content_hash = hash_text(text)
+        if self.manifest.is_current(url, content_hash):
+            logger.info(f"URL inalterada, ignorando: {url}")
+            print(f"⏭️  {url} já indexada e sem alterações")
+            self.unchanged_sources.add(url)
+            return
+        self.unchanged_sources.discard(url)
+
+        metadata = {
+            'source': url,
+            'source_path': url,
+            'type': 'web',
+        }
+        with tracer.span('chunk', chars=len(text)) as span:
+            documents = self.chunker.chunk_text(text, metadata)
+            span['chunks'] = len(documents)
+
+        # Títulos da página (linhas "## Título" do extrator): cada chunk guarda a seção onde começa
+        offsets, paths = heading_sections(text)
+        if offsets:
+            for doc in documents:
+                section = section_at(offsets, paths, doc.metadata['start'])
+                if section:
+                    doc.metadata['section'] = section
+        self._register_source(url, content_hash, documents, metadata)
+
+    def add_url(self, url: str) -> None:
+        """Adiciona o conteúdo de uma URL ao sistema"""
+        try:
+            self.registered_sources.add(url)
+
+            # A página é revalidada pelo cache HTTP; chunking e embeddings só se o texto mudou
+            print(f"🌐 Acessando: {url}")
+            text = WebScraper.scrape_url(url, cache=self.http_cache)
+            self._register_url(url, text)
+
+        except Exception as e:
+            logger.error(f"Erro ao adicionar URL {url}: {e}")
+            print(f"❌ Erro ao adicionar URL: {str(e)}")
+            raise
+
+    def add_urls(self, urls: Iterable[str], max_workers: int = RAGConfig.HTTP_MAX_WORKERS,
+                 max_per_host: int = RAGConfig.HTTP_MAX_PER_HOST) -> List[ScrapeResult]:
+        """
+        Adiciona várias URLs de uma vez, baixando-as em paralelo
+
+        Args:
+            urls: URLs a adicionar
+            max_workers: Total de requisições simultâneas
+            max_per_host: Requisições simultâneas por host
+
+        Returns:
+            Lista das URLs que falharam (ScrapeResult com o erro)
+        """
+        urls = list(dict.fromkeys(urls))
+        self.registered_sources.update(urls)
+        print(f"🌐 Acessando {len(urls)} URLs...")
+
+        failures = []
+        cached = 0
+        for result in WebScraper.scrape_urls(urls, max_workers=max_workers, max_per_host=max_per_host,
+                                             cache_dir=str(self.http_cache.cache_dir)):
+            if result.error is not None:
+                print(f"❌ {result.url}: {result.error}")
+                failures.append(result)
+                continue
+
+            cached += result.from_cache
+            try:
+                self._register_url(result.url, result.text)
+            except Exception as e:
+                logger.error(f"Erro ao processar {result.url}: {e}")
+                print(f"❌ {result.url}: {e}")
+                failures.append(ScrapeResult(result.url, None, e))
+
+        print(f"✅ {len(urls) - len(failures)} URLs processadas ({cached} inalteradas no cache HTTP)")
+        if failures:
+            logger.warning(f"{len(failures)} URLs falharam no scraping em lote")
+        return failures
+
+    def _open_vectorstore(self):
+        """Abre o backend vetorial configurado em RAGConfig.VECTOR_BACKEND"""
+        if RAGConfig.VECTOR_BACKEND == "numpy":
+            return NumpyVectorStore(self.embeddings, RAGConfig.NUMPY_INDEX_DIR)
+        if RAGConfig.VECTOR_BACKEND in ("int8", "ivfpq"):
+            return QuantizedVectorStore(self.embeddings, RAGConfig.QUANT_INDEX_DIR, method=RAGConfig.VECTOR_BACKEND)
+        if RAGConfig.VECTOR_BACKEND == "chroma":
+            from langchain_community.vectorstores import Chroma
+
+            return Chroma(
+                persist_directory=RAGConfig.PERSIST_DIRECTORY,
+                embedding_function=self.embeddings
+            )
+        raise ValueError(f"Backend vetorial não suportado: {RAGConfig.VECTOR_BACKEND}. Use 'chroma', 'numpy', 'int8' ou 'ivfpq'")
+
+    def build_vectorstore(self, prune_missing: bool = True) -> None:
+        """
+        Abre o vector store persistido e aplica apenas as mudanças desde a última execução
+
+        Args:
+            prune_missing: Se True, remove do índice as fontes que não foram adicionadas
+                nesta execução (arquivos apagados ou retirados do main.py)
+        """
+        try:
+            print("\n🔨 Atualizando índice vetorial...")
+            started = time.perf_counter()
+            embedded_before = self.embedding_engine.throughput_report()  # o motor acumula buscas e builds anteriores
+            # O len() de um índice vazio é 0: compara com None, não pela veracidade
+            if self._opened_vectorstore is not None:
+                self.vectorstore, self._opened_vectorstore = self._opened_vectorstore, None
+            else:
+                self.vectorstore = self._open_vectorstore()
+
+            # Sem nenhuma fonte registrada, apenas reutiliza o índice existente
+            if prune_missing and self.registered_sources:
+                removed = [s for s in self.manifest.sources() if s not in self.registered_sources]
+            else:
+                removed = []
+
+            stale_ids: List[str] = []
+            for source in removed + list(self.pending):
+                stale_ids.extend(self.manifest.chunk_ids(source))
+            if stale_ids:
+                self.vectorstore.delete(ids=stale_ids)
+                self.lexical_index.delete(stale_ids)
+
+            # Chunks removidos que tinham duplicatas em outras fontes: a primeira duplicata assume o lugar
+            promoted: List[Document] = []
+            if self.dedup is not None:
+                self.dedup.remove_sources(set(removed) | set(self.pending))
+                promoted = self.dedup.remove(stale_ids)
+
+            for source in removed:
+                self.manifest.remove(source)
+                logger.info(f"Fonte removida do índice: {source}")
+
+            # Índice BM25 ausente com chunks já no Chroma: reconstrói antes de adicionar os novos
+            if not len(self.lexical_index) and self.manifest.sources():
+                self._rebuild_lexical_index()
+            if self.dedup is not None and not len(self.dedup) and self.manifest.sources():
+                self._rebuild_dedup_index()
+
+            if promoted:
+                ids = [doc.metadata['chunk_uid'] for doc in promoted]
+                self.vectorstore.add_documents(promoted, ids=ids)
+                self.lexical_index.add(ids, [doc.page_content for doc in promoted])
+                for doc in promoted:
+                    self.manifest.add_chunk_ids(doc.metadata['source_path'], [doc.metadata['chunk_uid']])
+                logger.info(f"{len(promoted)} duplicatas promovidas no lugar de chunks removidos")
+
+            added_chunks = 0
+            self.last_dedup_report = {'chunks': 0, 'duplicates': 0, 'duplicate_chars': 0}
+            for source, entry in self.pending.items():
+                # Em lotes de INGEST_BATCH_CHUNKS: a fonte inteira nunca fica em memória
+                source_ids: List[str] = []
+                for documents in self.pending.read(source):
+                    if self.dedup is not None:
+                        documents = self._deduplicate(documents)
+                    ids = [doc.metadata['chunk_uid'] for doc in documents]
+                    if documents:
+                        self.vectorstore.add_documents(documents, ids=ids)
+                        self.lexical_index.add(ids, [doc.page_content for doc in documents])
+                    source_ids.extend(ids)
+                self.manifest.update(source, entry['content_hash'], source_ids)
+                added_chunks += len(source_ids)
+
+            if isinstance(self.vectorstore, NumpyVectorStore):
+                self.vectorstore.save()
+            self.lexical_index.save()
+            if self.dedup is not None:
+                self.dedup.save()
+            self.manifest.save()
+            self.embedding_cache.flush()
+            # Fontes que falharam ao carregar não entram nem aqui nem no pending
+            unchanged = len(self.unchanged_sources)
+            tracer.record('index', time.perf_counter() - started,
+                          {'chunks': added_chunks, 'sources': len(self.pending), 'removed': len(removed)})
+
+            report = self.embedding_engine.throughput_report(since=embedded_before)
+            if report['chunks']:
+                print(f"⚡ Embeddings: {report['chunks']} chunks em {report['seconds']:.1f}s "
+                      f"({report['chunks_per_second']:.1f} chunks/s)")
+            self._report_dedup(report['chunks_per_second'])
+
+            logger.info(
+                f"Índice atualizado: {len(self.pending)} fontes (re)indexadas ({added_chunks} chunks), "
+                f"{unchanged} inalteradas, {len(removed)} removidas"
+            )
+            print(f"✅ Índice atualizado: {len(self.pending)} novas/alteradas, "
+                  f"{unchanged} inalteradas, {len(removed)} removidas")
+
+            self.pending.clear()
+            self.unchanged_sources.clear()
+
+        except Exception as e:
+            logger.error(f"Erro ao construir vector store: {e}")
+            print(f"❌ Erro ao construir vector store: {str(e)}")
+            raise
+
+    def _deduplicate(self, documents: List[Document]) -> List[Document]:
+        """Separa os chunks quase idênticos a chunks já indexados (ou anteriores no mesmo lote)"""
+        kept = []
+        with tracer.span('dedup', chunks=len(documents)) as span:
+            for doc in documents:
+                signature = self.dedup.signature(doc.page_content)
+                match = self.dedup.find(signature)
+                if match is None:
+                    self.dedup.add(doc.metadata['chunk_uid'], signature)
+                    kept.append(doc)
+                else:
+                    self.dedup.add_duplicate(match[0], doc)
+                    self.last_dedup_report['duplicates'] += 1
+                    self.last_dedup_report['duplicate_chars'] += len(doc.page_content)
+            span['duplicates'] = len(documents) - len(kept)
+        self.last_dedup_report['chunks'] += len(documents)
+        return kept
+
+    def _report_dedup(self, chunks_per_second: float) -> None:
+        """Mostra o espaço e o tempo de embeddings economizados pela deduplicação"""
+        report = self.last_dedup_report
+        if not report.get('duplicates'):
+            return
+        report['embedding_seconds_saved'] = (report['duplicates'] / chunks_per_second
+                                             if chunks_per_second > 0 else 0.0)
+        logger.info(f"Deduplicação: {report}")
+        print(f"🧬 Deduplicação: {report['duplicates']} de {report['chunks']} chunks quase duplicados "
+              f"não indexados ({report['duplicate_chars'] / 1024:.1f} KB de texto, "
+              f"~{report['embedding_seconds_saved']:.1f}s de embeddings evitados)")
+
+    def _rebuild_dedup_index(self) -> None:
+        """Calcula as assinaturas MinHash dos chunks já presentes no vector store"""
+        print("🧬 Reconstruindo índice de duplicatas...")
+        stored = self.vectorstore.get(include=['documents'])
+        for chunk_uid, text in zip(stored['ids'], stored['documents']):
+            self.dedup.add(chunk_uid, self.dedup.signature(text))
+        logger.info(f"Índice de duplicatas reconstruído com {len(stored['ids'])} chunks")
+
+    def _rebuild_lexical_index(self) -> None:
+        """Reconstrói o índice BM25 com todos os chunks já presentes no Chroma"""
+        print("🔤 Reconstruindo índice lexical (BM25)...")
+        stored = self.vectorstore.get(include=['documents'])
+        self.lexical_index.add(stored['ids'], stored['documents'])
+        logger.info(f"Índice BM25 reconstruído com {len(stored['ids'])} chunks")
+
+    def _vector_search(self, query: str, k: int, query_vector: Optional[List[float]] = None) -> List[Document]:
+        """Busca por similaridade, reaproveitando o embedding da pergunta quando já calculado"""
+        if query_vector is not None:
+            return self.vectorstore.similarity_search_by_vector(query_vector, k=k)
+        return self.vectorstore.similarity_search(query, k=k)
+
+    def _vector_search_batch(self, query_vectors: List[List[float]], k: int) -> List[List[Document]]:
+        """Busca por similaridade de várias perguntas (uma multiplicação de matrizes nos backends NumPy)"""
+        if isinstance(self.vectorstore, NumpyVectorStore):
+            return self.vectorstore.similarity_search_by_vectors(query_vectors, k=k)
+        return [self.vectorstore.similarity_search_by_vector(vector, k=k) for vector in query_vectors]
+
+    def _hybrid_search(self, query: str, top_k: int, query_vector: Optional[List[float]] = None,
+                       vector_docs: Optional[List[Document]] = None) -> List[Document]:
+        """Combina a busca vetorial (ou os `vector_docs` já buscados) e a BM25 com Reciprocal Rank Fusion"""
+        candidates = max(RAGConfig.HYBRID_CANDIDATES, top_k)
+        if vector_docs is None:
+            vector_docs = self._vector_search(query, candidates, query_vector)
+        lexical_hits = self.lexical_index.search(query, candidates)
+
+        by_id = {doc.metadata.get('chunk_uid'): doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion([
+            [doc.metadata.get('chunk_uid') for doc in vector_docs],
+            [chunk_uid for chunk_uid, _ in lexical_hits],
+        ])[:top_k]
+
+        # Chunks encontrados só pelo BM25 são buscados no Chroma pelo ID
+        missing = [chunk_uid for chunk_uid, _ in fused if chunk_uid not in by_id]
+        if missing:
+            stored = self.vectorstore.get(ids=missing, include=['documents', 'metadatas'])
+            for chunk_uid, text, metadata in zip(stored['ids'], stored['documents'], stored['metadatas']):
+                by_id[chunk_uid] = Document(page_content=text, metadata=metadata or {})
+
+        return [by_id[chunk_uid] for chunk_uid, _ in fused if chunk_uid in by_id]
+
+    def _search(self, query: str, k: int, mode: str, query_vector: Optional[List[float]]) -> List[Document]:
+        """Busca híbrida ou vetorial, sem rerank"""
+        if mode == "hybrid" and len(self.lexical_index):
+            return self._hybrid_search(query, k, query_vector)
+
+        # Busca por similaridade
+        return self._vector_search(query, k, query_vector)
+
+    def retrieve_context(self, query: str, top_k: int = RAGConfig.TOP_K_RESULTS,
+                         mode: str = RAGConfig.RETRIEVAL_MODE,
+                         query_vector: Optional[List[float]] = None) -> List[Document]:
+        """
+        Recupera os chunks mais relevantes para a pergunta
+
+        Com o rerank ativo (RERANK_ENABLED), busca RERANK_CANDIDATES candidatos e
+        retorna os min(top_k, RERANK_TOP_K) melhores segundo o cross-encoder.
+
+        Args:
+            query: Pergunta do usuário
+            top_k: Número de chunks a retornar
+            mode: "vector" (similaridade) ou "hybrid" (BM25 + similaridade com RRF)
+            query_vector: Embedding da pergunta, se já calculado (ex: em lote pelo servidor)
+
+        Returns:
+            Lista de Documents mais similares
+        """
+        try:
+            if self.vectorstore is None:
                 raise ValueError("Vector store não foi construído. Execute build_vectorstore() primeiro.")
 
-            # Busca por similaridade
-            results = self.vectorstore.similarity_search(query, k=top_k)
+            if self.reranker is not None:
+                with tracer.span('retrieve') as span:
+                    candidates = self._search(query, max(RAGConfig.RERANK_CANDIDATES, top_k), mode, query_vector)
+                    span['chunks'] = len(candidates)
+                with tracer.span('rerank', candidates=len(candidates)):
+                    results, self.last_rerank_stats = self.reranker.rerank(
+                        query, candidates, min(top_k, RAGConfig.RERANK_TOP_K)
+                    )
+                return self._with_provenance(results)
 
-            return results
+            with tracer.span('retrieve') as span:
+                results = self._search(query, top_k, mode, query_vector)
+                span['chunks'] = len(results)
+            return self._with_provenance(results)
 
         except Exception as e:
             print(f"❌ Erro na busca: {str(e)}")
             raise
 
-    def generate_answer(self, query: str, context_docs: List[Document]) -> str:
-        """Gera resposta usando Ollama baseado no contexto recuperado E histórico de conversa"""
-        try:
-            # Formata contexto dos documentos
-            context = "\n\n---\n\n".join([
-                f"[Fonte: {doc.metadata.get('source', 'Desconhecida')}]\n{doc.page_content}"
-                for doc in context_docs
-            ])
+    def retrieve_context_batch(self, queries: List[str], query_vectors: List[List[float]],
+                               top_k: int = RAGConfig.TOP_K_RESULTS,
+                               mode: str = RAGConfig.RETRIEVAL_MODE) -> List[List[Document]]:
+        """
+        Como retrieve_context(), para várias perguntas com os embeddings já calculados
 
-            # 🆕 Obtém histórico de conversa
-            conversation_history = self.memory.get_formatted_history()
+        A busca vetorial de todas as perguntas é feita numa única chamada ao
+        índice; a BM25 e o rerank continuam por pergunta.
 
-            # 🆕 NOVO: Prompt melhorado com detecção de mudança de contexto
-            user_prompt = f"""=== HISTÓRICO DA CONVERSA ===
-{conversation_history}
+        Returns:
+            Chunks de cada pergunta, na ordem de `queries`
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store não foi construído. Execute build_vectorstore() primeiro.")
 
-=== CONTEXTO DOS DOCUMENTOS ===
-{context}
+        search_k = max(RAGConfig.RERANK_CANDIDATES, top_k) if self.reranker is not None else top_k
+        hybrid = mode == "hybrid" and len(self.lexical_index)
+        with tracer.span('retrieve', questions=len(queries)) as span:
+            vector_k = max(RAGConfig.HYBRID_CANDIDATES, search_k) if hybrid else search_k
+            batches = self._vector_search_batch(query_vectors, vector_k)
+            if hybrid:
+                batches = [self._hybrid_search(query, search_k, vector_docs=docs)
+                           for query, docs in zip(queries, batches)]
+            span['chunks'] = sum(len(docs) for docs in batches)
 
-=== INSTRUÇÕES CRÍTICAS ===
-1. **DETECÇÃO DE MUDANÇA DE ASSUNTO:**
-   - Se a pergunta atual NÃO se relaciona com o histórico (ex: muda completamente de tema), IGNORE o histórico e responda APENAS com base nos documentos.
-   - Exemplo: Se o histórico fala sobre "UBS" e a pergunta é sobre "casa de cachorro", a pergunta NÃO tem relação, então ignore o histórico.
+        results = []
+        for query, candidates in zip(queries, batches):
+            if self.reranker is not None:
+                with tracer.span('rerank', candidates=len(candidates)):
+                    candidates, _ = self.reranker.rerank(query, candidates, min(top_k, RAGConfig.RERANK_TOP_K))
+            results.append(self._with_provenance(candidates))
+        return results
 
-2. **USO DO HISTÓRICO:**
-   - Use o histórico APENAS quando a pergunta se refere explicitamente a algo mencionado antes (palavras como "isso", "elas", "aquilo", "o que você disse").
-   - Exemplo: "Quais são os horários delas?" → "delas" se refere a algo do histórico.
+    @staticmethod
+    def _render_prompt(query: str, context: str, conversation_history: Optional[str]) -> str:
+        """
+        Prompt do usuário: histórico, contexto dos documentos e pergunta
 
-3. **PRIORIDADE:**
-   - SEMPRE responda com base nos DOCUMENTOS, não em inferências.
-   - Se a informação NÃO está nos documentos, diga claramente: "Não encontrei essa informação nos documentos."
-   - NUNCA invente informações ou repita respostas anteriores se não forem relevantes.
+        As instruções fixas vão no prompt do sistema (self.system_prompt), que
+        nunca muda; o histórico vem logo depois porque só cresce no fim entre um
+        turno e outro. Assim o Ollama reaproveita o KV cache do maior prefixo possível.
+        Sem histórico (None), o prompt continua uma conversa já presente no `context`.
+        """
+        history_section = ""
+        if conversation_history is not None:
+            history_section = f"""=== HISTÓRICO DA CONVERSA ===
+{conversation_history}
 
-4. **CLAREZA:**
-   - Seja direto e conciso.
-   - Não repita informações já ditas a menos que seja solicitado.
+"""
+        return f"""{history_section}=== CONTEXTO DOS DOCUMENTOS ===
+{context}
 
 === PERGUNTA ATUAL ===
 {query}
 
 Responda de forma objetiva baseando-se APENAS nas informações dos documentos."""
 
+    def build_prompt(self, query: str, context_docs: List[Document],
+                     memory: Optional[ConversationMemory] = None, reuse_context: bool = False) -> str:
+        """
+        Monta o prompt dentro de RAGConfig.PROMPT_TOKEN_BUDGET
+
+        O histórico é limitado a HISTORY_TOKEN_BUDGET e o contexto dos documentos
+        ocupa o restante: chunks vizinhos são unidos sem o trecho repetido e os
+        menos relevantes ficam de fora se não couberem.
+
+        Args:
+            query: Pergunta do usuário
+            context_docs: Chunks recuperados, do mais ao menos relevante
+            memory: Memória a usar (padrão: a memória do sistema)
+            reuse_context: Se True, o histórico e o prompt do sistema já estão no `context`
+                do Ollama e não são reenviados
+        """
+        memory = memory if memory is not None else self.memory
+        started = time.perf_counter()
+
+        # 🆕 Obtém histórico de conversa
+        conversation_history = None
+        if not reuse_context:
+            conversation_history = memory.get_formatted_history(max_tokens=RAGConfig.HISTORY_TOKEN_BUDGET)
+
+        # Tudo o que não é contexto tem tamanho fixo nesta pergunta
+        sections = {
+            'sistema': 0 if reuse_context else estimate_tokens(self.system_prompt),
+            'histórico': estimate_tokens(conversation_history or ""),
+            'pergunta': estimate_tokens(query),
+        }
+        sections['moldura'] = (estimate_tokens(self._render_prompt(query, "", conversation_history))
+                               - sections['histórico'] - sections['pergunta'])
+        context_budget = max(RAGConfig.PROMPT_TOKEN_BUDGET - sum(sections.values()), 0)
+
+        context, context_stats = self.context_builder.build(context_docs, context_budget, self.format_citation)
+        sections['contexto'] = context_stats['tokens']
+
+        reused = len(memory.llm_context) if reuse_context and memory.llm_context else 0
+        logger.info(
+            "Tokens do prompt: " + ", ".join(f"{name}={tokens}" for name, tokens in sections.items())
+            + f", total={sum(sections.values())}/{RAGConfig.PROMPT_TOKEN_BUDGET}, reaproveitados={reused} | "
+            f"{context_stats['chunks']} chunks -> {context_stats['blocks']} blocos "
+            f"({context_stats['duplicates']} duplicados, {context_stats['dropped']} descartados)"
+        )
+        self.last_prompt_stats = {**sections, **{f"context_{key}": value for key, value in context_stats.items()}}
+
+        prompt = self._render_prompt(query, context, conversation_history)
+        tracer.record('prompt', time.perf_counter() - started, {
+            'prompt_chars': len(prompt), 'prompt_tokens': sum(sections.values()),
+            'chunks': context_stats['chunks'],
+        })
+        return prompt
+
+    def _prepare_generation(self, query: str, context_docs: List[Document], memory: ConversationMemory):
+        """
+        Decide se o turno continua a sessão do Ollama e monta o pedido
+
+        Returns:
+            (prompt do sistema, prompt do usuário, `context` a reenviar ou None)
+        """
+        llm_context = memory.llm_context if RAGConfig.OLLAMA_CONTEXT_REUSE else None
+        if llm_context and len(llm_context) > RAGConfig.OLLAMA_CONTEXT_MAX_TOKENS:
+            logger.info(f"Contexto do Ollama com {len(llm_context)} tokens; recomeçando com o histórico em texto")
+            llm_context = None
+
+        if llm_context:
+            return "", self.build_prompt(query, context_docs, memory, reuse_context=True), llm_context
+        return self.system_prompt, self.build_prompt(query, context_docs, memory), None
+
+    def _finish_generation(self, query: str, answer: str, stats: Dict, memory: ConversationMemory) -> None:
+        """Guarda a interação (com o novo `context` do Ollama) e acumula os tokens reaproveitados"""
+        llm_context = stats.pop('context', None)
+        memory.add_interaction(query, answer, llm_context if RAGConfig.OLLAMA_CONTEXT_REUSE else None)
+        self.prompt_tokens_evaluated += stats.get('prompt_eval_count', 0)
+        self.prompt_tokens_reused += stats.get('context_tokens_reused', 0)
+
+    def _answer_cache_key(self, query: str, context_docs: List[Document], memory: ConversationMemory,
+                          query_vector: Optional[List[float]] = None):
+        """
+        Retorna (vetor da pergunta, escopo) para o cache de respostas, ou None se ele não se aplica
+
+        O cache é ignorado quando há histórico, pois a resposta depende da conversa.
+        """
+        if self.answer_cache is None or memory.get_turn_count() > 0:
+            return None
+        chunk_ids = [doc.metadata.get('chunk_uid') or hash_text(doc.page_content) for doc in context_docs]
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        return query_vector, answer_scope(self.model_name, chunk_ids)
+
+    def generate_answer(self, query: str, context_docs: List[Document],
+                        memory: Optional[ConversationMemory] = None) -> str:
+        """Gera resposta usando Ollama baseado no contexto recuperado E histórico de conversa"""
+        memory = memory if memory is not None else self.memory
+        try:
+            cache_key = self._answer_cache_key(query, context_docs, memory)
+            if cache_key is not None:
+                cached = self.answer_cache.lookup(*cache_key)
+                if cached is not None:
+                    print("⚡ Resposta encontrada no cache semântico")
+                    memory.add_interaction(query, cached)
+                    return cached
+
+            system_prompt, user_prompt, llm_context = self._prepare_generation(query, context_docs, memory)
+
             # Chama Ollama
-            answer = OllamaManager.generate_response(
-                model=self.model_name,
-                prompt=user_prompt,
-                system_prompt=RAGConfig.SYSTEM_PROMPT,
-                temperature=0.3  # Baixa temperatura para respostas mais precisas
-            )
+            stats = {}
+            with tracer.span('generate', prompt_chars=len(system_prompt) + len(user_prompt)) as span:
+                answer = OllamaManager.generate_response(
+                    model=self.model_name,
+                    prompt=user_prompt,
+                    system_prompt=system_prompt,
+                    temperature=0.3,  # Baixa temperatura para respostas mais precisas
+                    context=llm_context,
+                    stats=stats
+                )
+                span['prompt_tokens'] = stats.get('prompt_eval_count', 0)
+                span['eval_tokens'] = stats.get('eval_count', 0)
+                span['answer_chars'] = len(answer)
+
+            if cache_key is not None:
+                self.answer_cache.store(*cache_key, answer)
 
             # 🆕 Adiciona interação à memória
-            self.memory.add_interaction(query, answer)
+            self._finish_generation(query, answer, stats, memory)
+            self.last_generation_stats = stats
 
             return answer
 
+        except OllamaOverloadedError:
+            raise  # fila cheia: quem chamou decide (o servidor responde 503)
         except Exception as e:
             return f"Erro ao gerar resposta: {str(e)}"
 
+    def generate_answer_stream(self, query: str, context_docs: List[Document],
+                               memory: Optional[ConversationMemory] = None) -> Iterator[str]:
+        """
+        Gera a resposta em streaming, entregando os tokens à medida que chegam
+
+        A interação só é adicionada à memória quando a resposta termina.
+        As métricas da geração ficam em self.last_generation_stats.
+        """
+        memory = memory if memory is not None else self.memory
+        self.last_generation_stats = {}
+        parts = []
+        try:
+            cache_key = self._answer_cache_key(query, context_docs, memory)
+            if cache_key is not None:
+                cached = self.answer_cache.lookup(*cache_key)
+                if cached is not None:
+                    self.last_generation_stats = {'cached': True}
+                    memory.add_interaction(query, cached)
+                    yield cached
+                    return
+
+            system_prompt, user_prompt, llm_context = self._prepare_generation(query, context_docs, memory)
+            for token in OllamaManager.generate_stream(
+                model=self.model_name,
+                prompt=user_prompt,
+                system_prompt=system_prompt,
+                temperature=0.3,
+                stats=self.last_generation_stats,
+                context=llm_context
+            ):
+                parts.append(token)
+                yield token
+        except Exception as e:
+            yield f"Erro ao gerar resposta: {str(e)}"
+            return
+
+        answer = "".join(parts)
+        stats = self.last_generation_stats
+        # Streaming atravessa vários yields: a duração vem das métricas da própria geração
+        tracer.record('generate', stats.get('total_time', 0.0), {
+            'prompt_chars': len(system_prompt) + len(user_prompt),
+            'prompt_tokens': stats.get('prompt_eval_count', 0),
+            'eval_tokens': stats.get('eval_count', 0),
+            'answer_chars': len(answer),
+        })
+        if stats.get('time_to_first_token') is not None:
+            tracer.record('first_token', stats['time_to_first_token'])
+        if cache_key is not None:
+            self.answer_cache.store(*cache_key, answer)
+        self._finish_generation(query, answer, stats, memory)
+
+    def _with_provenance(self, docs: List[Document]) -> List[Document]:
+        """Anota em 'also_in' as outras fontes de chunks que tinham duplicatas na ingestão"""
+        if self.dedup is None:
+            return docs
+        annotated = []
+        for doc in docs:
+            duplicates = self.dedup.provenance(doc.metadata.get('chunk_uid'))
+            own = self._cite(doc.metadata)
+            also_in = list(dict.fromkeys(citation for citation in map(self._cite, duplicates) if citation != own))
+            if also_in:
+                doc = Document(page_content=doc.page_content, metadata={**doc.metadata, 'also_in': also_in})
+            annotated.append(doc)
+        return annotated
+
+    @staticmethod
+    def _cite(metadata: Dict) -> str:
+        source = metadata.get('source', 'Desconhecida')
+        if metadata.get('section'):
+            return f"{source} § {metadata['section']}"
+        page = metadata.get('page')
+        if page is None:
+            return source
+        page_end = metadata.get('page_end', page)
+        if page_end != page:
+            return f"{source}, p. {page}-{page_end}"
+        return f"{source}, p. {page}"
+
+    @staticmethod
+    def format_citation(doc: Document) -> str:
+        """Formata a fonte de um chunk, incluindo as páginas e as demais fontes com o mesmo texto"""
+        citation = RAGSystem._cite(doc.metadata)
+        also_in = doc.metadata.get('also_in')
+        if also_in:
+            citation += f" (também em: {'; '.join(also_in)})"
+        return citation
+
+    def create_memory(self) -> ConversationMemory:
+        """Nova memória conversacional, com embeddings para detectar mudança de assunto"""
+        return ConversationMemory(max_turns=self.max_memory_turns, embeddings=self.embeddings)
+
     def clear_memory(self) -> None:
         """Limpa o histórico de conversas"""
         self.memory.clear()
@@ -80,39 +915,55 @@ Responda de forma objetiva baseando-se APENAS nas informações dos documentos."
         print("\n" + self.memory.get_formatted_history())
         print("="*70 + "\n")
 
-    def is_query_related_to_history(self, query: str) -> bool:
+    def is_query_related_to_history(self, query: str, memory: Optional[ConversationMemory] = None,
+                                    query_vector: Optional[List[float]] = None) -> bool:
         """
         Verifica se a pergunta se relaciona com o histórico recente
 
         Args:
             query: Pergunta atual
+            memory: Memória a considerar (padrão: a memória do sistema)
+            query_vector: Embedding da pergunta, se já calculado
 
         Returns:
             True se relacionada, False caso contrário
         """
-        if not self.memory.history:
-            return False
+        memory = memory if memory is not None else self.memory
+        return memory.is_related(query, query_vector)
+
+    def _prepare_query(self, question: str, show_context: bool, auto_clear_memory: bool,
+                       memory: ConversationMemory) -> List[Document]:
+        """Etapas comuns a query() e query_stream(): memória e recuperação de contexto"""
+        print(f"\n❓ Pergunta: {question}\n")
+
+        # Embedding calculado uma vez: detecção de mudança de assunto e busca
+        query_vector = self.embeddings.embed_query(question)
 
-        # Palavras que indicam referência ao histórico
-        reference_words = [
-            'isso', 'aquilo', 'elas', 'eles', 'dela', 'dele', 'delas', 'deles',
-            'anterior', 'antes', 'você disse', 'mencionou', 'falou', 'citou'
-        ]
+        # 🆕 NOVO: Detecta se é uma mudança de assunto
+        if auto_clear_memory and not self.is_query_related_to_history(question, memory, query_vector):
+            if memory.get_turn_count() > 0:
+                print("🔄 Mudança de assunto detectada. Limpando memória anterior...\n")
+                memory.clear()
 
-        query_lower = query.lower()
+        # Recupera contexto
+        print("🔍 Buscando informações relevantes...")
+        context_docs = self.retrieve_context(question, query_vector=query_vector)
 
-        # Se a pergunta contém palavras de referência, é relacionada
-        if any(word in query_lower for word in reference_words):
-            return True
+        if show_context:
+            print("\n📚 Contexto recuperado:")
+            for i, doc in enumerate(context_docs, 1):
+                print(f"\n--- Chunk {i} ---")
+                print(f"Fonte: {self.format_citation(doc)}")
+                print(f"Conteúdo: {doc.page_content[:200]}...")
 
-        # Se a pergunta tem mais de 10 palavras e não tem referências, provavelmente é nova
-        if len(query.split()) > 10:
-            return False
+        return context_docs
 
-        # Para perguntas curtas, assume que pode ser relacionada
-        return True
+    def _session_memory(self, session_id: Optional[str]) -> ConversationMemory:
+        """Memória da sessão (carregada do armazenamento) ou a memória do sistema se session_id for None"""
+        return self.session_store.get(session_id) if session_id is not None else self.memory
 
-    def query(self, question: str, show_context: bool = False, auto_clear_memory: bool = False) -> str:
+    def query(self, question: str, show_context: bool = False, auto_clear_memory: bool = False,
+              session_id: Optional[str] = None, profile: Optional[bool] = None) -> str:
         """
         Método principal: faz pergunta e retorna resposta
 
@@ -120,30 +971,19 @@ Responda de forma objetiva baseando-se APENAS nas informações dos documentos."
             question: Pergunta do usuário
             show_context: Se True, mostra o contexto recuperado
             auto_clear_memory: Se True, limpa memória ao detectar mudança de assunto
+            session_id: Conversa a continuar (None usa a memória do sistema)
+            profile: Perfila a pergunta com cProfile/tracemalloc (padrão: RAGConfig.TRACE_PROFILE)
         """
         try:
-            print(f"\n❓ Pergunta: {question}\n")
-
-            # 🆕 NOVO: Detecta se é uma mudança de assunto
-            if auto_clear_memory and not self.is_query_related_to_history(question):
-                if self.memory.get_turn_count() > 0:
-                    print("🔄 Mudança de assunto detectada. Limpando memória anterior...\n")
-                    self.memory.clear()
-
-            # Recupera contexto
-            print("🔍 Buscando informações relevantes...")
-            context_docs = self.retrieve_context(question)
-
-            if show_context:
-                print("\n📚 Contexto recuperado:")
-                for i, doc in enumerate(context_docs, 1):
-                    print(f"\n--- Chunk {i} ---")
-                    print(f"Fonte: {doc.metadata.get('source', 'Desconhecida')}")
-                    print(f"Conteúdo: {doc.page_content[:200]}...")
-
-            # Gera resposta
-            print(f"\n💭 Gerando resposta com {self.model_name}...")
-            answer = self.generate_answer(question, context_docs)
+            with tracer.profile('query', profile), tracer.span('query', question_chars=len(question)):
+                memory = self._session_memory(session_id)
+                context_docs = self._prepare_query(question, show_context, auto_clear_memory, memory)
+
+                # Gera resposta
+                print(f"\n💭 Gerando resposta com {self.model_name}...")
+                answer = self.generate_answer(question, context_docs, memory)
+                if session_id is not None:
+                    self.session_store.save(session_id, memory)
 
             print("\n✅ Resposta gerada!\n")
             return answer
@@ -151,4 +991,162 @@ Responda de forma objetiva baseando-se APENAS nas informações dos documentos."
         except Exception as e:
             error_msg = f"Erro ao processar pergunta: {str(e)}"
             print(f"\n❌ {error_msg}\n")
-            return error_msg
\ No newline at end of file
+            return error_msg
+
+    def query_stream(self, question: str, show_context: bool = False, auto_clear_memory: bool = False,
+                     session_id: Optional[str] = None, profile: Optional[bool] = None) -> Iterator[str]:
+        """
+        Como query(), mas entrega a resposta token a token
+
+        Após o fim do stream, self.last_generation_stats contém o tempo até o
+        primeiro token e a taxa de tokens por segundo.
+
+        Args:
+            question: Pergunta do usuário
+            show_context: Se True, mostra o contexto recuperado
+            auto_clear_memory: Se True, limpa memória ao detectar mudança de assunto
+            session_id: Conversa a continuar (None usa a memória do sistema)
+            profile: Perfila a pergunta com cProfile/tracemalloc (padrão: RAGConfig.TRACE_PROFILE)
+
+        Yields:
+            Trechos da resposta à medida que são gerados
+        """
+        started = time.perf_counter()
+        with tracer.profile('query', profile):
+            try:
+                memory = self._session_memory(session_id)
+                context_docs = self._prepare_query(question, show_context, auto_clear_memory, memory)
+            except Exception as e:
+                error_msg = f"Erro ao processar pergunta: {str(e)}"
+                print(f"\n❌ {error_msg}\n")
+                yield error_msg
+                return
+
+            print(f"\n💭 Gerando resposta com {self.model_name}...")
+            yield from self.generate_answer_stream(question, context_docs, memory)
+            if session_id is not None:
+                self.session_store.save(session_id, memory)
+        tracer.record('query', time.perf_counter() - started, {'question_chars': len(question)})
+
+    def _answer_batch_item(self, item: Dict, query_vector: List[float], context_docs: List[Document],
+                           memory: ConversationMemory) -> Dict:
+        """Gera a resposta de uma pergunta do lote, sem histórico; erros ficam no resultado"""
+        started = time.perf_counter()
+        result = {
+            'id': item['id'],
+            'question': item['question'],
+            'answer': None,
+            'sources': [self.format_citation(doc) for doc in context_docs],
+            'error': None,
+            'cached': False,
+            'prompt_tokens': 0,
+            'eval_tokens': 0,
+        }
+        try:
+            cache_key = self._answer_cache_key(item['question'], context_docs, memory, query_vector)
+            answer = self.answer_cache.lookup(*cache_key) if cache_key is not None else None
+            if answer is not None:
+                result['cached'] = True
+            else:
+                prompt = self.build_prompt(item['question'], context_docs, memory)
+                stats = {}
+                with tracer.span('generate', prompt_chars=len(self.system_prompt) + len(prompt)) as span:
+                    answer = OllamaManager.generate_response(
+                        model=self.model_name,
+                        prompt=prompt,
+                        system_prompt=self.system_prompt,
+                        temperature=0.3,
+                        stats=stats
+                    )
+                    span['prompt_tokens'] = result['prompt_tokens'] = stats.get('prompt_eval_count', 0)
+                    span['eval_tokens'] = result['eval_tokens'] = stats.get('eval_count', 0)
+                    span['answer_chars'] = len(answer)
+                if cache_key is not None:
+                    self.answer_cache.store(*cache_key, answer)
+            result['answer'] = answer
+        except Exception as e:
+            logger.error(f"Erro na pergunta {item['id']} do lote: {e}")
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - started
+        return result
+
+    def query_batch(self, questions: Iterable[Union[str, Dict]], top_k: int = RAGConfig.TOP_K_RESULTS,
+                    mode: str = RAGConfig.RETRIEVAL_MODE, max_workers: int = RAGConfig.BATCH_MAX_WORKERS,
+                    checkpoint_path: Optional[str] = None, window: int = RAGConfig.BATCH_WINDOW) -> List[Dict]:
+        """
+        Responde muitas perguntas independentes (avaliação offline, respostas em massa)
+
+        Cada pergunta é respondida sem histórico, sem tocar na memória do sistema
+        nem nas sessões. A cada janela de `window` perguntas, os embeddings saem de
+        uma única chamada ao encoder e a busca vetorial de uma única chamada ao
+        índice; as gerações rodam em `max_workers` threads enquanto a próxima
+        janela é preparada. Com `checkpoint_path`, cada resultado é gravado em
+        JSONL ao terminar e uma nova execução pula as perguntas já respondidas.
+
+        Args:
+            questions: Perguntas em texto ou {'question': ..., 'id': ...}
+            top_k: Chunks por pergunta
+            mode: "vector" ou "hybrid"
+            max_workers: Gerações simultâneas no Ollama
+            checkpoint_path: Arquivo JSONL de resultados, retomado se já existir
+            window: Perguntas por chamada ao encoder e à busca
+
+        Returns:
+            Um resultado por pergunta, na ordem de entrada: {'id', 'question', 'answer',
+            'sources', 'error', 'cached', 'prompt_tokens', 'eval_tokens', 'seconds'}
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store não foi construído. Execute build_vectorstore() primeiro.")
+
+        items = normalize_questions(questions)
+        checkpoint = BatchCheckpoint(checkpoint_path)
+        pending = [item for item in items if not checkpoint.is_done(item['id'])]
+        print(f"📦 {len(items)} perguntas: {len(items) - len(pending)} já respondidas, {len(pending)} a responder "
+              f"({max_workers} gerações simultâneas)")
+
+        memory = self.create_memory()  # sempre vazia: nenhuma pergunta vê o histórico de outra
+        started = time.perf_counter()
+        results: Dict[str, Dict] = {}
+        completed = failures = 0
+        report_every = max(1, len(pending) // 20)
+
+        def collect(futures) -> None:
+            nonlocal completed, failures
+            for future in futures:
+                result = future.result()
+                results[result['id']] = result
+                checkpoint.write(result)
+                completed += 1
+                failures += result['error'] is not None
+                if completed % report_every == 0 or completed == len(pending):
+                    elapsed = time.perf_counter() - started
+                    print(f"   ✅ {completed}/{len(pending)} ({completed / elapsed:.2f} perguntas/s, "
+                          f"{failures} com erro)")
+
+        try:
+            with tracer.span('query_batch', questions=len(pending)), \
+                    ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as executor:
+                running = set()
+                for start in range(0, len(pending), window):
+                    chunk = pending[start:start + window]
+                    texts = [item['question'] for item in chunk]
+                    vectors = self.embeddings.embed_documents(texts)
+                    contexts = self.retrieve_context_batch(texts, vectors, top_k, mode)
+                    for item, vector, context_docs in zip(chunk, vectors, contexts):
+                        # Cópia do contexto: os spans da geração ficam no trace do lote
+                        running.add(executor.submit(contextvars.copy_context().run, self._answer_batch_item,
+                                                    item, vector, context_docs, memory))
+                    # Prepara a próxima janela enquanto esta gera, sem acumular mais de uma janela
+                    while len(running) > window:
+                        done, running = wait(running, return_when=FIRST_COMPLETED)
+                        collect(done)
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+        finally:
+            checkpoint.close()
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Lote concluído: {completed} perguntas em {elapsed:.1f}s, {failures} com erro")
+        return [results.get(item['id']) or checkpoint.done[item['id']] for item in items]
+
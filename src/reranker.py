@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Reordena os candidatos da busca com um cross-encoder local (CPU)
+
+    Os pares (pergunta, chunk) são pontuados em lotes, na ordem da busca. Se o
+    próximo lote estourar o orçamento de latência, a pontuação para: os
+    candidatos já pontuados são reordenados entre si (se forem pelo menos k) e,
+    caso contrário, a ordem original da busca é mantida.
+    """
+
+    def __init__(self, model_name: str = RAGConfig.RERANK_MODEL,
+                 batch_size: int = RAGConfig.RERANK_BATCH_SIZE,
+                 latency_budget_ms: float = RAGConfig.RERANK_LATENCY_BUDGET_MS,
+                 device: str = "cpu"):
+        """
+        Args:
+            model_name: Modelo cross-encoder do sentence-transformers
+            batch_size: Pares (pergunta, chunk) por lote
+            latency_budget_ms: Tempo máximo gasto pontuando candidatos
+            device: Dispositivo do modelo ('cpu', 'cuda', ...)
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.latency_budget = latency_budget_ms / 1000
+
+        logger.info(f"Carregando cross-encoder {model_name} ({device})")
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device=device, max_length=RAGConfig.RERANK_MAX_LENGTH)
+
+        self.calls = 0
+        self.partial = 0  # orçamento estourado, reordenou só parte dos candidatos
+        self.fallbacks = 0  # orçamento estourado antes de k candidatos: ordem da busca
+        self.total_seconds = 0.0
+
+    def rerank(self, query: str, candidates: List[Document], top_k: int) -> Tuple[List[Document], Dict]:
+        """
+        Retorna os top_k candidatos mais relevantes segundo o cross-encoder
+
+        Args:
+            query: Pergunta do usuário
+            candidates: Chunks na ordem da busca (mais relevante primeiro)
+            top_k: Número de chunks a retornar
+
+        Returns:
+            (chunks reordenados, estatísticas: candidatos, pontuados, ms, modo)
+        """
+        started = time.perf_counter()
+        scores: List[float] = []
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            scores.extend(self.model.predict([(query, doc.page_content) for doc in batch],
+                                             batch_size=self.batch_size, show_progress_bar=False))
+
+            elapsed = time.perf_counter() - started
+            per_batch = elapsed / (start // self.batch_size + 1)
+            if start + self.batch_size < len(candidates) and elapsed + per_batch > self.latency_budget:
+                break
+
+        elapsed = time.perf_counter() - started
+        self.calls += 1
+        self.total_seconds += elapsed
+
+        if len(scores) == len(candidates):
+            mode = "completo"
+        elif len(scores) >= top_k:
+            mode = "parcial"
+            self.partial += 1
+        else:
+            mode = "ordem da busca"
+            self.fallbacks += 1
+
+        if mode == "ordem da busca":
+            ranked = candidates[:top_k]
+        else:
+            order = np.argsort(-np.asarray(scores), kind='stable')[:top_k]
+            ranked = [candidates[i] for i in order]
+
+        stats = {'candidates': len(candidates), 'scored': len(scores), 'ms': elapsed * 1000, 'mode': mode}
+        logger.info(f"Rerank ({mode}): {len(scores)}/{len(candidates)} candidatos em {elapsed * 1000:.0f}ms")
+        return ranked, stats
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores acumulados do rerank"""
+        return {
+            'calls': self.calls,
+            'partial': self.partial,
+            'fallbacks': self.fallbacks,
+            'avg_ms': self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+        }
@@ -0,0 +1,333 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import uuid
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.config import RAGConfig
+from src.llm import OllamaManager, OllamaOverloadedError
+from src.sessions import SessionStore
+from src.tracing import tracer
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class EmbeddingBatcher:
+    """
+    Agrupa embeddings de perguntas simultâneas em uma única chamada ao encoder
+
+    Cada pergunta espera no máximo `max_wait_ms` por companhia antes de o lote
+    ser enviado; lotes nunca passam de `max_batch` perguntas.
+    """
+
+    def __init__(self, embeddings, executor: ThreadPoolExecutor,
+                 max_batch: int = RAGConfig.SERVER_EMBED_MAX_BATCH,
+                 max_wait_ms: float = RAGConfig.SERVER_EMBED_MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.items = 0
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def embed(self, text: str) -> List[float]:
+        """Retorna o embedding de uma pergunta (calculado em lote com as demais)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.embeddings.embed_documents, texts)
+                for (_, future), vector in zip(batch, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'batches': self.batches,
+            'queries': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+        }
+
+
+class LatencyRecorder:
+    """Guarda as latências mais recentes e calcula percentis e vazão"""
+
+    def __init__(self, window: int = 10_000):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.count = 0
+        self.errors = 0
+
+    def record(self, latency_ms: float, error: bool = False) -> None:
+        self.latencies.append(latency_ms)
+        self.count += 1
+        self.errors += error
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = time.perf_counter() - self.started
+        values = np.asarray(self.latencies, dtype=np.float64)
+        percentiles = np.percentile(values, [50, 95, 99]) if len(values) else [0.0, 0.0, 0.0]
+        return {
+            'requests': self.count,
+            'errors': self.errors,
+            'p50_ms': float(percentiles[0]),
+            'p95_ms': float(percentiles[1]),
+            'p99_ms': float(percentiles[2]),
+            'qps': self.count / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class RAGServer:
+    """
+    Serviço HTTP assíncrono em torno do RAGSystem
+
+    Endpoints:
+        POST /query   {"question": "...", "session_id": "...", "top_k": 6} -> resposta + fontes
+        POST /clear   {"session_id": "..."} -> limpa a memória da sessão
+        GET  /metrics -> latências p50/p95/p99, QPS, lotes de embeddings, tempos por etapa
+        GET  /metrics/prometheus -> histogramas por etapa no formato texto do Prometheus
+        GET  /health
+    """
+
+    def __init__(self, rag, host: str = RAGConfig.SERVER_HOST, port: int = RAGConfig.SERVER_PORT,
+                 max_generations: int = RAGConfig.SERVER_MAX_GENERATIONS,
+                 workers: int = RAGConfig.SERVER_WORKERS, auto_clear_memory: bool = True):
+        """
+        Args:
+            rag: RAGSystem já com o índice construído
+            host: Endereço de escuta
+            port: Porta de escuta
+            max_generations: Gerações simultâneas enviadas ao Ollama
+            workers: Threads para busca e geração (chamadas bloqueantes)
+            auto_clear_memory: Limpa a memória da sessão ao detectar mudança de assunto
+        """
+        self.rag = rag
+        self.host = host
+        self.port = port
+        self.max_generations = max_generations
+        self.auto_clear_memory = auto_clear_memory
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag")
+        self.batcher = EmbeddingBatcher(rag.embeddings, self.executor)
+        self.latency = LatencyRecorder()
+        self.sessions: SessionStore = rag.session_store
+        # Um lock por sessão em uso; some sozinho quando nenhuma pergunta da sessão está em andamento
+        self.session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.generation_limit: Optional[asyncio.Semaphore] = None
+        self.active_generations = 0
+
+    async def _run_blocking(self, func, *args):
+        # Copia o contexto: os spans da thread ficam ligados ao span 'query' da requisição
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self.session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.session_locks[session_id] = lock
+        return lock
+
+    async def handle_query(self, payload: Dict) -> Dict:
+        """Processa uma pergunta: embedding em lote, busca concorrente e geração limitada"""
+        question = (payload.get('question') or '').strip()
+        if not question:
+            raise ValueError("Campo 'question' é obrigatório")
+        session_id = payload.get('session_id') or uuid.uuid4().hex
+        top_k = int(payload.get('top_k') or RAGConfig.TOP_K_RESULTS)
+
+        lock = self._session_lock(session_id)
+        # Perguntas da mesma sessão são respondidas em ordem; sessões diferentes, em paralelo
+        with tracer.span('query', question_chars=len(question)):
+            async with lock:
+                # A memória pode vir do banco (sessões persistidas): carregada fora do event loop
+                memory, query_vector = await asyncio.gather(
+                    self._run_blocking(self.sessions.get, session_id), self.batcher.embed(question)
+                )
+                if self.auto_clear_memory and not self.rag.is_query_related_to_history(question, memory, query_vector):
+                    memory.reset()
+
+                context_docs = await self._run_blocking(
+                    self.rag.retrieve_context, question, top_k, RAGConfig.RETRIEVAL_MODE, query_vector
+                )
+
+                async with self.generation_limit:
+                    self.active_generations += 1
+                    try:
+                        answer = await self._run_blocking(self.rag.generate_answer, question, context_docs, memory)
+                    finally:
+                        self.active_generations -= 1
+                await self._run_blocking(self.sessions.save, session_id, memory)
+
+        return {
+            'session_id': session_id,
+            'answer': answer,
+            'sources': [self.rag.format_citation(doc) for doc in context_docs],
+        }
+
+    def metrics(self) -> Dict:
+        metrics = {
+            'latency': self.latency.snapshot(),
+            'embedding_batches': self.batcher.stats(),
+            'active_generations': self.active_generations,
+            'max_generations': self.max_generations,
+            'sessions': self.sessions.stats(),
+            'stages': tracer.snapshot(),
+            'startup': self.rag.startup_report(),
+        }
+        if self.rag.answer_cache is not None:
+            metrics['answer_cache'] = self.rag.answer_cache.stats()
+        if self.rag.reranker is not None:
+            metrics['rerank'] = self.rag.reranker.stats()
+        llm = OllamaManager.stats()
+        if llm is not None:
+            metrics['llm'] = llm
+        return metrics
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Union[Dict, str]]:
+        path = path.split('?', 1)[0]
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.metrics()
+        if path == '/metrics/prometheus':
+            return 200, tracer.to_prometheus()
+        if path not in ('/query', '/clear'):
+            return 404, {'error': f"Rota não encontrada: {path}"}
+        if method != 'POST':
+            return 405, {'error': "Use POST"}
+
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': "JSON inválido"}
+
+        if path == '/clear':
+            session_id = payload.get('session_id')
+            if session_id:
+                await self._run_blocking(self.sessions.delete, session_id)
+            return 200, {'session_id': session_id, 'cleared': True}
+
+        started = time.perf_counter()
+        try:
+            result = await self.handle_query(payload)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except OllamaOverloadedError as e:
+            self.latency.record((time.perf_counter() - started) * 1000, error=True)
+            return 503, {'error': str(e)}
+        except Exception as e:
+            logger.exception("Erro ao processar pergunta no servidor")
+            self.latency.record((time.perf_counter() - started) * 1000, error=True)
+            return 500, {'error': str(e)}
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.latency.record(latency_ms)
+        result['latency_ms'] = latency_ms
+        return 200, result
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 mínimo com keep-alive, suficiente para clientes JSON e testes de carga"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get('content-length') or 0))
+                status, payload = await self._route(method.upper(), path, body)
+
+                if isinstance(payload, str):
+                    data = payload.encode('utf-8')
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                    content_type = "application/json; charset=utf-8"
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        """Inicia o servidor e atende até ser cancelado"""
+        self.generation_limit = asyncio.Semaphore(self.max_generations)
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Servidor RAG escutando em http://{self.host}:{self.port}")
+        print(f"🌐 Servidor RAG em http://{self.host}:{self.port} "
+              f"(até {self.max_generations} gerações simultâneas)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            self.executor.shutdown(wait=False)
+            self.sessions.close()
+            tracer.close()
+
+    def run(self) -> None:
+        """Executa o servidor de forma bloqueante (Ctrl+C encerra)"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("👋 Servidor encerrado")
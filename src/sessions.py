@@ -0,0 +1,356 @@
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.config import RAGConfig
+from src.memory import ConversationMemory
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Base dos armazenamentos de sessões de conversa (session_id -> ConversationMemory)
+
+    get() devolve a memória da sessão (criando uma nova se não existir ou tiver
+    expirado) e save() registra que ela mudou. Sessões sem acesso há mais de
+    `ttl_seconds` são descartadas.
+    """
+
+    def __init__(self, memory_factory: Callable[[], ConversationMemory],
+                 ttl_seconds: float = RAGConfig.SESSION_TTL):
+        """
+        Args:
+            memory_factory: Cria uma memória vazia (ex: RAGSystem.create_memory)
+            ttl_seconds: Tempo sem acesso após o qual a sessão expira
+        """
+        self.memory_factory = memory_factory
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self.created = 0
+        self.expired = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> ConversationMemory:
+        """Memória da sessão (nova se não existir ou tiver expirado)"""
+
+    @abstractmethod
+    def save(self, session_id: str, memory: ConversationMemory) -> None:
+        """Registra que a memória da sessão mudou"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a sessão"""
+
+    def flush(self) -> None:
+        """Grava as alterações pendentes (nada a fazer em memória)"""
+
+    def close(self) -> None:
+        """Grava o que estiver pendente e libera recursos"""
+        self.flush()
+
+    def _new_memory(self) -> ConversationMemory:
+        self.created += 1
+        return self.memory_factory()
+
+    def stats(self) -> Dict[str, float]:
+        return {'created': self.created, 'expired': self.expired}
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessões apenas na memória do processo (perdidas ao reiniciar)"""
+
+    def __init__(self, memory_factory: Callable[[], ConversationMemory],
+                 ttl_seconds: float = RAGConfig.SESSION_TTL,
+                 sweep_interval: float = RAGConfig.SESSION_SWEEP_INTERVAL):
+        """
+        Args:
+            memory_factory: Cria uma memória vazia (ex: RAGSystem.create_memory)
+            ttl_seconds: Tempo sem acesso após o qual a sessão expira
+            sweep_interval: Segundos mínimos entre duas varreduras de sessões expiradas
+        """
+        super().__init__(memory_factory, ttl_seconds)
+        self.sweep_interval = sweep_interval
+        self.sessions: "OrderedDict[str, Tuple[ConversationMemory, float]]" = OrderedDict()  # por último acesso
+        self._last_sweep = time.time()
+
+    def _sweep(self, now: float) -> None:
+        """Remove as sessões expiradas (as mais antigas ficam no início do OrderedDict)"""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        while self.sessions:
+            session_id, (_, accessed) = next(iter(self.sessions.items()))
+            if now - accessed <= self.ttl_seconds:
+                break
+            del self.sessions[session_id]
+            self.expired += 1
+
+    def get(self, session_id: str) -> ConversationMemory:
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self.sessions.pop(session_id, None)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                self.expired += 1
+                entry = None
+            memory = entry[0] if entry is not None else self._new_memory()
+            self.sessions[session_id] = (memory, now)
+            return memory
+
+    def save(self, session_id: str, memory: ConversationMemory) -> None:
+        with self._lock:
+            self.sessions.pop(session_id, None)
+            self.sessions[session_id] = (memory, time.time())
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        return {'backend': 'memory', 'sessions': len(self.sessions), **super().stats()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessões persistidas em SQLite, compartilháveis entre processos
+
+    Só as `cache_size` sessões usadas mais recentemente ficam em RAM; as demais
+    são carregadas do banco sob demanda. save() apenas marca a sessão como
+    alterada: as gravações são feitas em lote, em uma única transação, quando
+    há `flush_batch` sessões pendentes ou, sem novos acessos, por uma thread
+    que grava o lote incompleto a cada `flush_interval` segundos. O que ainda
+    estiver pendente é gravado em close(), chamado também ao encerrar o processo.
+
+    Entre processos, uma sessão alterada em outro worker é recarregada no
+    próximo get() assim que a gravação dele chegar ao banco.
+    """
+
+    def __init__(self, memory_factory: Callable[[], ConversationMemory],
+                 db_path: str = RAGConfig.SESSION_DB_PATH,
+                 ttl_seconds: float = RAGConfig.SESSION_TTL,
+                 cache_size: int = RAGConfig.SESSION_CACHE_MAX,
+                 flush_batch: int = RAGConfig.SESSION_FLUSH_BATCH,
+                 flush_interval: float = RAGConfig.SESSION_FLUSH_INTERVAL):
+        """
+        Args:
+            memory_factory: Cria uma memória vazia (ex: RAGSystem.create_memory)
+            db_path: Arquivo do banco SQLite
+            ttl_seconds: Tempo sem atualização após o qual a sessão expira
+            cache_size: Sessões mantidas em RAM
+            flush_batch: Sessões pendentes que disparam uma gravação
+            flush_interval: Tempo máximo (s) entre uma alteração e sua gravação
+        """
+        super().__init__(memory_factory, ttl_seconds)
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated)")
+        self.conn.commit()
+
+        # session_id -> (memória, `updated` da versão carregada/gravada), do menos ao mais recente
+        self.cache: "OrderedDict[str, Tuple[ConversationMemory, float]]" = OrderedDict()
+        self.dirty: Dict[str, float] = {}  # sessões em cache com alterações não gravadas
+        self.pending: Dict[str, Optional[str]] = {}  # saíram do cache antes de gravar (None = apagar)
+        self._last_flush = time.time()
+
+        self.loads = 0
+        self.writes = 0
+        self.flushes = 0
+
+        self._closed = False
+        self._stop = threading.Event()
+        if flush_interval > 0:
+            threading.Thread(target=self._flush_periodically, name="session-flush", daemon=True).start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self) -> None:
+        """Grava lotes incompletos mesmo sem novos get()/save() (ex: modo interativo parado)"""
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._closed:
+                    return
+                if self.dirty or self.pending:
+                    self.flush()
+
+    def _is_expired(self, updated: float, now: float) -> bool:
+        return now - updated > self.ttl_seconds
+
+    def _load(self, session_id: str, now: float) -> Tuple[Optional[ConversationMemory], float]:
+        if session_id in self.pending:
+            state = self.pending[session_id]
+            if state is None:
+                return None, now
+            updated = json.loads(state)['updated']
+        else:
+            row = self.conn.execute("SELECT state, updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None, now
+            state, updated = row
+            if self._is_expired(updated, now):
+                self.expired += 1
+                self.pending[session_id] = None
+                return None, now
+
+        memory = self.memory_factory()
+        memory.load_state(json.loads(state)['memory'])
+        self.loads += 1
+        return memory, updated
+
+    def _cache_put(self, session_id: str, memory: ConversationMemory, updated: float) -> None:
+        self.cache.pop(session_id, None)
+        self.cache[session_id] = (memory, updated)
+        while len(self.cache) > self.cache_size:
+            evicted_id, (evicted, evicted_updated) = self.cache.popitem(last=False)
+            if evicted_id in self.dirty:
+                # Serializa agora: a memória sai da RAM, mas a gravação continua no próximo lote
+                self.pending[evicted_id] = self._serialize(evicted, self.dirty.pop(evicted_id))
+
+    @staticmethod
+    def _serialize(memory: ConversationMemory, updated: float) -> str:
+        return json.dumps({'updated': updated, 'memory': memory.to_state()}, ensure_ascii=False)
+
+    def get(self, session_id: str) -> ConversationMemory:
+        now = time.time()
+        with self._lock:
+            cached = self.cache.get(session_id)
+            if cached is not None and session_id not in self.dirty:
+                # Outro processo pode ter gravado uma versão mais nova
+                row = self.conn.execute("SELECT updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+                if row is not None and row[0] > cached[1]:
+                    cached = None
+            if cached is not None:
+                memory, updated = cached
+                if self._is_expired(updated, now) and session_id not in self.dirty:
+                    self.expired += 1
+                    self.pending[session_id] = None
+                    memory = None
+            else:
+                memory, updated = self._load(session_id, now)
+
+            if memory is None:
+                memory, updated = self._new_memory(), now
+            self._cache_put(session_id, memory, updated)
+            self._maybe_flush(now)
+            return memory
+
+    def save(self, session_id: str, memory: ConversationMemory) -> None:
+        now = time.time()
+        with self._lock:
+            self.pending.pop(session_id, None)
+            self.dirty[session_id] = now
+            self._cache_put(session_id, memory, now)
+            self._maybe_flush(now)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self.cache.pop(session_id, None)
+            self.dirty.pop(session_id, None)
+            self.pending[session_id] = None
+            self._maybe_flush(time.time())
+
+    def _maybe_flush(self, now: float) -> None:
+        pending = len(self.dirty) + len(self.pending)
+        if pending >= self.flush_batch or (pending and now - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Grava em uma única transação as sessões alteradas e remove as apagadas/expiradas"""
+        with self._lock:
+            now = time.time()
+            upserts: List[Tuple[str, str, float]] = []
+            deletes: List[Tuple[str]] = []
+            for session_id, state in self.pending.items():
+                if state is None:
+                    deletes.append((session_id,))
+                else:
+                    upserts.append((session_id, state, json.loads(state)['updated']))
+            for session_id, updated in self.dirty.items():
+                upserts.append((session_id, self._serialize(self.cache[session_id][0], updated), updated))
+
+            try:
+                with self.conn:
+                    if upserts:
+                        self.conn.executemany(
+                            "INSERT INTO sessions (id, state, updated) VALUES (?, ?, ?) "
+                            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                            upserts
+                        )
+                    if deletes:
+                        self.conn.executemany("DELETE FROM sessions WHERE id = ?", deletes)
+                    expired = self.conn.execute("DELETE FROM sessions WHERE updated < ?",
+                                                (now - self.ttl_seconds,)).rowcount
+            except sqlite3.Error as e:
+                # Mantém as alterações pendentes para a próxima tentativa
+                logger.warning(f"Erro ao gravar sessões ({e}), nova tentativa no próximo lote")
+                self._last_flush = now
+                return
+
+            self.expired += max(expired, 0)
+            self.writes += len(upserts)
+            self.flushes += 1
+            self.pending.clear()
+            self.dirty.clear()
+            self._last_flush = now
+            if upserts or deletes:
+                logger.info(f"Sessões gravadas: {len(upserts)} atualizadas, {len(deletes)} removidas")
+
+    def close(self) -> None:
+        """Grava o que estiver pendente e fecha o banco (pode ser chamado mais de uma vez)"""
+        self._stop.set()
+        with self._lock:
+            if self._closed:
+                return
+            self.flush()
+            self._closed = True
+            self.conn.close()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stored = self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return {
+                'backend': 'sqlite',
+                'sessions': stored,
+                'cached': len(self.cache),
+                'pending_writes': len(self.dirty) + len(self.pending),
+                'loads': self.loads,
+                'writes': self.writes,
+                'flushes': self.flushes,
+                **super().stats(),
+            }
+
+
+def create_session_store(memory_factory: Callable[[], ConversationMemory],
+                         backend: str = RAGConfig.SESSION_BACKEND) -> SessionStore:
+    """
+    Cria o armazenamento de sessões configurado
+
+    Args:
+        memory_factory: Cria uma memória vazia (ex: RAGSystem.create_memory)
+        backend: "memory" ou "sqlite"
+
+    Returns:
+        Instância de SessionStore
+    """
+    if backend == "sqlite":
+        return SQLiteSessionStore(memory_factory)
+    if backend == "memory":
+        return InMemorySessionStore(memory_factory)
+    raise ValueError(f"Backend de sessões desconhecido: {backend}")
@@ -0,0 +1,257 @@
+import bisect
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.config import RAGConfig
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+# Span ativo na thread/tarefa atual: (trace_id, nome da etapa)
+_current_span: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar(
+    'current_span', default=None
+)
+
+
+class _Stage:
+    """Agregados de uma etapa: contagem, soma, histograma de latências e contadores"""
+
+    __slots__ = ('count', 'total', 'maximum', 'buckets', 'counters')
+
+    def __init__(self, bounds: int):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * (bounds + 1)  # o último é o +Inf
+        self.counters: Dict[str, float] = {}
+
+
+class Tracer:
+    """
+    Spans por etapa do pipeline (carregamento, chunking, embeddings, busca, prompt, geração)
+
+    Cada span mede a duração de um bloco e carrega contadores (chunks, bytes,
+    caracteres, tokens). As durações são agregadas em histogramas por etapa,
+    exportados em formato Prometheus; com TRACE_JSONL_PATH, cada span também é
+    gravado como uma linha JSON com trace_id e etapa pai, para reconstruir a
+    árvore de uma pergunta ou de uma ingestão.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = RAGConfig.TRACE_BUCKETS,
+                 jsonl_path: Optional[str] = RAGConfig.TRACE_JSONL_PATH,
+                 enabled: bool = RAGConfig.TRACE_ENABLED):
+        """
+        Args:
+            buckets: Limites superiores (segundos) do histograma de latências
+            jsonl_path: Arquivo onde cada span é gravado como JSON (None desativa)
+            enabled: Se False, span() não mede nem grava nada
+        """
+        self.bounds = tuple(sorted(buckets))
+        self.jsonl_path = jsonl_path
+        self.enabled = enabled
+        self.stages: Dict[str, _Stage] = {}
+        self.last_profile: Dict = {}
+        self._lock = threading.Lock()
+        self._jsonl = None
+
+    @contextmanager
+    def span(self, name: str, **counters) -> Iterator[Dict[str, float]]:
+        """
+        Mede o bloco como uma ocorrência da etapa `name`
+
+        O dicionário entregue pode receber contadores durante o bloco:
+
+            with tracer.span('chunk', bytes=len(text)) as span:
+                docs = chunker.chunk_text(text, metadata)
+                span['chunks'] = len(docs)
+        """
+        if not self.enabled:
+            yield counters
+            return
+
+        parent = _current_span.get()
+        trace_id = parent[0] if parent else uuid.uuid4().hex[:16]
+        token = _current_span.set((trace_id, name))
+        started = time.perf_counter()
+        error = None
+        try:
+            yield counters
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_span.reset(token)
+            self.record(name, elapsed, counters, trace_id=trace_id,
+                        parent=parent[1] if parent else None, error=error)
+
+    def record(self, name: str, seconds: float, counters: Optional[Dict[str, float]] = None,
+               trace_id: Optional[str] = None, parent: Optional[str] = None,
+               error: Optional[str] = None) -> None:
+        """
+        Registra uma ocorrência já medida (ex: gerações em streaming, que atravessam vários yields)
+
+        Args:
+            name: Etapa
+            seconds: Duração
+            counters: Contadores numéricos somados no agregado da etapa
+            trace_id: Pergunta/ingestão a que o span pertence (padrão: a do span ativo)
+            parent: Etapa pai (padrão: o span ativo)
+            error: Nome da exceção, se o bloco falhou
+        """
+        if not self.enabled:
+            return
+        counters = counters or {}
+        if trace_id is None:
+            current = _current_span.get()
+            trace_id, parent = (current[0], current[1]) if current else (uuid.uuid4().hex[:16], None)
+
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = _Stage(len(self.bounds))
+            stage.count += 1
+            stage.total += seconds
+            stage.maximum = max(stage.maximum, seconds)
+            stage.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+            for key, value in counters.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stage.counters[key] = stage.counters.get(key, 0) + value
+
+            if self.jsonl_path:
+                self._write_jsonl({
+                    'ts': time.time(), 'trace_id': trace_id, 'span': name, 'parent': parent,
+                    'duration_ms': round(seconds * 1000, 3), 'error': error, **counters,
+                })
+
+    def _write_jsonl(self, record: Dict) -> None:
+        try:
+            if self._jsonl is None:
+                Path(self.jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+                self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1)
+            self._jsonl.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o trace em {self.jsonl_path}: {e}")
+            self.jsonl_path = None
+
+    def _quantile(self, stage: _Stage, q: float) -> float:
+        """Quantil estimado pelo histograma (limite superior do bucket)"""
+        target = q * stage.count
+        seen = 0
+        for bound, count in zip(self.bounds, stage.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return stage.maximum
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Agregados por etapa: contagem, tempo total/médio/máximo, p50/p95 e contadores"""
+        with self._lock:
+            return {
+                name: {
+                    'count': stage.count,
+                    'total_seconds': stage.total,
+                    'mean_seconds': stage.total / stage.count if stage.count else 0.0,
+                    'max_seconds': stage.maximum,
+                    'p50_seconds': self._quantile(stage, 0.5),
+                    'p95_seconds': self._quantile(stage, 0.95),
+                    'counters': dict(stage.counters),
+                }
+                for name, stage in self.stages.items()
+            }
+
+    def to_prometheus(self, prefix: str = "rag") -> str:
+        """Agregados no formato texto do Prometheus (histograma por etapa + contadores)"""
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Duração de cada etapa do pipeline",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        counter_lines: List[str] = []
+        with self._lock:
+            for name, stage in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(self.bounds, stage.buckets):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stage.count}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {stage.total}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {stage.count}')
+                for key, value in sorted(stage.counters.items()):
+                    counter_lines.append(f'{prefix}_stage_items_total{{stage="{name}",counter="{key}"}} {value}')
+        if counter_lines:
+            lines.append(f"# HELP {prefix}_stage_items_total Contadores acumulados por etapa (chunks, bytes, tokens)")
+            lines.append(f"# TYPE {prefix}_stage_items_total counter")
+            lines.extend(counter_lines)
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Zera os agregados"""
+        with self._lock:
+            self.stages = {}
+
+    def close(self) -> None:
+        """Fecha o arquivo JSONL"""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+    @contextmanager
+    def profile(self, label: str, enabled: Optional[bool] = None) -> Iterator[None]:
+        """
+        Perfila o bloco com cProfile e tracemalloc (opt-in: TRACE_PROFILE ou enabled=True)
+
+        O .prof é gravado em TRACE_PROFILE_DIR e o resumo (funções mais caras e
+        pico de memória alocada) fica em self.last_profile e no log.
+        """
+        if not (RAGConfig.TRACE_PROFILE if enabled is None else enabled):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # outro perfil em andamento (ex: perguntas simultâneas no servidor)
+            logger.warning(f"Perfil de {label} ignorado: já existe um profiler ativo")
+            yield
+            return
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+
+            directory = Path(RAGConfig.TRACE_PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.prof"
+            profiler.dump_stats(str(path))
+
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(RAGConfig.TRACE_PROFILE_TOP)
+            self.last_profile = {'label': label, 'seconds': elapsed, 'peak_kb': peak / 1024, 'path': str(path)}
+            logger.info(f"Perfil de {label}: {elapsed:.2f}s, pico de {peak / 1024:.0f} KB alocados, "
+                        f"salvo em {path}\n{output.getvalue()}")
+            print(f"🔬 Perfil salvo em {path} ({elapsed:.2f}s, pico de {peak / 1024 / 1024:.1f} MB)")
+
+
+# Instância única usada por todo o pipeline
+tracer = Tracer()
@@ -0,0 +1,533 @@
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.config import RAGConfig
+from src.quantization import create_quantizer
+
+# Configurar logger
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store exato (força bruta) sobre um arquivo .npy mapeado em memória
+
+    Os embeddings normalizados ficam em `vectors.npy` e os textos/metadados em
+    uma tabela paralela (`records.jsonl`, uma linha por vetor). A busca é um
+    produto matriz-vetor seguido de argpartition, sem servidor nem SQLite, o
+    que deixa a abertura e as buscas mais rápidas em coleções pequenas e médias.
+    """
+
+    QUERY_BLOCK = 32  # perguntas por multiplicação de matrizes na busca em lote
+
+    def __init__(self, embedding_function: Embeddings, directory: str = RAGConfig.NUMPY_INDEX_DIR):
+        """
+        Abre (ou cria) o índice
+
+        Args:
+            embedding_function: Modelo usado para gerar os embeddings
+            directory: Diretório do índice
+        """
+        self.embedding_function = embedding_function
+        self.directory = Path(directory)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self._pending_vectors: List[np.ndarray] = []
+        self._dirty = False
+        self.load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def __len__(self) -> int:
+        return len(self.id_to_row)
+
+    def load(self) -> None:
+        """Carrega o índice do disco (vetores mapeados em memória)"""
+        vectors_path = self.directory / "vectors.npy"
+        records_path = self.directory / "records.jsonl"
+        if not (vectors_path.exists() and records_path.exists()):
+            return
+        self.vectors = np.load(vectors_path, mmap_mode='r')
+        with open(records_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record['id'])
+                self.texts.append(record['text'])
+                self.metadatas.append(record['metadata'])
+        if len(self.ids) != len(self.vectors):
+            raise ValueError(f"Índice NumPy inconsistente em {self.directory}: "
+                             f"{len(self.vectors)} vetores para {len(self.ids)} registros")
+        self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        logger.info(f"Índice NumPy carregado: {len(self.ids)} vetores")
+
+    def _materialize(self) -> None:
+        """Incorpora os vetores pendentes à matriz principal"""
+        if self._pending_vectors:
+            parts = [np.asarray(self.vectors)] if len(self.vectors) else []
+            self.vectors = np.concatenate(parts + self._pending_vectors)
+            self._pending_vectors = []
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Adiciona textos ao índice (persistidos em save())"""
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+
+        self.delete([chunk_id for chunk_id in ids if chunk_id in self.id_to_row])
+
+        vectors = _normalize_rows(np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32))
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self.id_to_row[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+            self.texts.append(text)
+            self.metadatas.append(dict(metadata))
+        self._pending_vectors.append(vectors)
+        self.alive = np.concatenate([self.alive, np.ones(len(texts), dtype=bool)])
+        self._dirty = True
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Marca IDs como removidos (compactados em save())"""
+        for chunk_id in ids or []:
+            row = self.id_to_row.pop(chunk_id, None)
+            if row is not None:
+                self.alive[row] = False
+                self._dirty = True
+        return True
+
+    def save(self) -> None:
+        """Compacta e grava vetores e registros no disco"""
+        if not self._dirty:
+            return
+        keep = np.flatnonzero(self.alive)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = self.directory / "vectors.tmp.npy"
+        self._write_vectors(keep, tmp_vectors)
+        self.ids = [self.ids[i] for i in keep]
+
+        tmp_records = self.directory / "records.tmp.jsonl"
+        self._write_records(keep, tmp_records)
+        tmp_vectors.replace(self.directory / "vectors.npy")
+        tmp_records.replace(self.directory / "records.jsonl")
+
+        self.vectors = np.load(self.directory / "vectors.npy", mmap_mode='r')
+        self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._dirty = False
+        logger.info(f"Índice NumPy gravado: {len(self.ids)} vetores")
+
+    def _write_vectors(self, keep: np.ndarray, path: Path) -> None:
+        """Grava os vetores das linhas `keep` em `path` e solta o mapeamento do arquivo antigo"""
+        self._materialize()
+        vectors = np.ascontiguousarray(self.vectors[keep]) if len(keep) else np.zeros((0, 0), dtype=np.float32)
+        self.vectors = vectors  # libera o mapeamento antigo antes de substituir o arquivo
+        np.save(path, vectors)
+
+    def _write_records(self, keep: np.ndarray, path: Path) -> None:
+        """Grava os registros das linhas `keep` (self.ids já compactado) e compacta as listas em RAM"""
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk_id, text, metadata in zip(self.ids, self.texts, self.metadatas):
+                f.write(json.dumps({'id': chunk_id, 'text': text, 'metadata': metadata}, ensure_ascii=False) + "\n")
+
+    def _record(self, row: int) -> Tuple[str, Dict]:
+        """Texto e metadados de uma linha"""
+        return self.texts[row], self.metadatas[row]
+
+    def _document(self, row: int) -> Document:
+        text, metadata = self._record(row)
+        return Document(page_content=text, metadata=metadata, id=self.ids[row])
+
+    def search_by_vectors(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Busca exata em lote: uma multiplicação de matrizes para várias perguntas
+
+        Args:
+            queries: Matriz (m, dimensão) de embeddings de perguntas
+            k: Resultados por pergunta
+
+        Returns:
+            Para cada pergunta, lista de (linha, similaridade cosseno) em ordem decrescente
+        """
+        self._materialize()
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        n = len(self.vectors)
+        if not n or not len(self):
+            return [[] for _ in range(len(queries))]
+
+        vectors = np.asarray(self.vectors)
+        k = min(k, len(self))
+        results = []
+
+        # Blocos de perguntas limitam a matriz de scores (bloco x n) em memória
+        for start in range(0, len(queries), self.QUERY_BLOCK):
+            scores = queries[start:start + self.QUERY_BLOCK] @ vectors.T
+            if not self.alive.all():
+                scores[:, ~self.alive] = -np.inf
+
+            if k < n:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(n), scores.shape)
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            results.extend([(int(row), float(score)) for row, score in zip(rows, row_scores)]
+                           for rows, row_scores in zip(top, top_scores))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = RAGConfig.TOP_K_RESULTS,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Busca os k chunks mais similares à pergunta, com a similaridade cosseno"""
+        query_vector = np.asarray(self.embedding_function.embed_query(query), dtype=np.float32)
+        return [(self._document(row), score) for row, score in self.search_by_vectors(query_vector, k)[0]]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = RAGConfig.TOP_K_RESULTS,
+                                    **kwargs: Any) -> List[Document]:
+        """Busca os k chunks mais similares a um embedding já calculado"""
+        return [self._document(row) for row, _ in self.search_by_vectors(np.asarray(embedding), k)[0]]
+
+    def similarity_search(self, query: str, k: int = RAGConfig.TOP_K_RESULTS, **kwargs: Any) -> List[Document]:
+        """Busca os k chunks mais similares à pergunta"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vectors(self, embeddings: np.ndarray,
+                                     k: int = RAGConfig.TOP_K_RESULTS) -> List[List[Document]]:
+        """Busca várias perguntas de embeddings já calculados numa única multiplicação de matrizes"""
+        return [[self._document(row) for row, _ in hits] for hits in self.search_by_vectors(embeddings, k)]
+
+    def similarity_search_batch(self, queries: List[str], k: int = RAGConfig.TOP_K_RESULTS) -> List[List[Document]]:
+        """Busca várias perguntas com uma única chamada ao encoder e uma única multiplicação de matrizes"""
+        query_vectors = np.asarray(self.embedding_function.embed_documents(queries), dtype=np.float32)
+        return [[self._document(row) for row, _ in hits] for hits in self.search_by_vectors(query_vectors, k)]
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, List]:
+        """Retorna registros no mesmo formato do Chroma.get() ({'ids', 'documents', 'metadatas'})"""
+        if ids is None:
+            rows = sorted(self.id_to_row.values())
+        else:
+            rows = [self.id_to_row[chunk_id] for chunk_id in ids if chunk_id in self.id_to_row]
+        records = [self._record(row) for row in rows]
+        return {
+            'ids': [self.ids[row] for row in rows],
+            'documents': [text for text, _ in records],
+            'metadatas': [metadata for _, metadata in records],
+        }
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        return [self._document(self.id_to_row[chunk_id]) for chunk_id in ids if chunk_id in self.id_to_row]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[Dict]] = None, *,
+                   ids: Optional[List[str]] = None, directory: str = RAGConfig.NUMPY_INDEX_DIR,
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, directory)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.save()
+        return store
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """
+    Vector store comprimido: códigos int8 ou IVF-PQ em RAM, vetores exatos e textos só no disco
+
+    A busca aproximada sobre os códigos escolhe k x QUANT_RERANK_FACTOR
+    candidatos e só as linhas deles são lidas do vectors.npy para a
+    similaridade exata que define o top-k. Vetores adicionados depois do
+    último save() ficam nos blocos pendentes e são comparados direto, sem
+    montar a matriz float32 inteira em RAM. Textos e metadados
+    ficam no records.jsonl: em RAM há só os IDs e o deslocamento de cada linha
+    no arquivo, e cada resultado final é lido do disco. O quantizador é
+    treinado no save() quando o índice chega a QUANT_MIN_VECTORS e retreinado
+    quando cresce QUANT_RETRAIN_GROWTH vezes desde o último treino.
+    """
+
+    COPY_BLOCK = 4096  # linhas copiadas por vez na compactação do vectors.npy
+
+    def __init__(self, embedding_function: Embeddings, directory: str = RAGConfig.QUANT_INDEX_DIR,
+                 method: str = "ivfpq", rerank_factor: int = RAGConfig.QUANT_RERANK_FACTOR):
+        """
+        Abre (ou cria) o índice
+
+        Args:
+            embedding_function: Modelo usado para gerar os embeddings
+            directory: Diretório do índice
+            method: "int8" (quantização escalar) ou "ivfpq" (IVF + product quantization)
+            rerank_factor: Candidatos aproximados por resultado, reordenados com o vetor exato
+        """
+        create_quantizer(method)  # valida o método antes de abrir o índice
+        self.method = method
+        self.rerank_factor = rerank_factor
+        self.quantizer = None
+        # Linhas [0, persisted) estão no records.jsonl; self.texts/metadatas guardam só as adicionadas depois
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.persisted = 0
+        self._records_file = None
+        self._vectors_file = None
+        self._records_lock = threading.Lock()
+        super().__init__(embedding_function, directory)
+
+    def load(self) -> None:
+        """Carrega vetores (mapeados), IDs e deslocamentos dos registros e os códigos"""
+        vectors_path = self.directory / "vectors.npy"
+        records_path = self.directory / "records.jsonl"
+        if vectors_path.exists() and records_path.exists():
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+            offsets = []
+            position = 0
+            with open(records_path, 'rb') as f:
+                for line in f:
+                    offsets.append(position)
+                    position += len(line)
+                    self.ids.append(json.loads(line)['id'])
+            if len(self.ids) != len(self.vectors):
+                raise ValueError(f"Índice quantizado inconsistente em {self.directory}: "
+                                 f"{len(self.vectors)} vetores para {len(self.ids)} registros")
+            self.offsets = np.asarray(offsets, dtype=np.int64)
+            self.persisted = len(self.ids)
+            self.id_to_row = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            self.alive = np.ones(len(self.ids), dtype=bool)
+            logger.info(f"Índice quantizado carregado: {len(self.ids)} vetores")
+
+        path = self.directory / "quantizer.npz"
+        if path.exists() and self.ids:
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                quantizer = create_quantizer(self.method)
+                if (meta['kind'], meta['params'], meta['count']) == (quantizer.kind, quantizer.params(), len(self.ids)):
+                    quantizer.load_state({key: data[key] for key in data.files if key != 'meta'})
+                    quantizer.trained_on = meta['trained_on']
+                    self.quantizer = quantizer
+        if self.quantizer is None and len(self.ids) >= RAGConfig.QUANT_MIN_VECTORS:
+            logger.info(f"Códigos {self.method} ausentes ou desatualizados em {self.directory}: recodificando")
+            self._train()
+            self._write_quantizer()
+
+    def _read_line(self, row: int) -> bytes:
+        """Linha JSON de um registro gravado, lida do records.jsonl pelo deslocamento"""
+        with self._records_lock:
+            if self._records_file is None:
+                self._records_file = open(self.directory / "records.jsonl", 'rb')
+            self._records_file.seek(int(self.offsets[row]))
+            return self._records_file.readline()
+
+    def _exact_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Vetores exatos das linhas pedidas
+
+        Com o índice gravado, cada linha é lida do vectors.npy com uma leitura
+        pontual em vez de pelo mapeamento: o sistema mapearia blocos inteiros
+        do cache de páginas no processo a cada acesso.
+        """
+        if not isinstance(self.vectors, np.memmap):
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        vectors = np.empty((len(rows), self.vectors.shape[1]), dtype=np.float32)
+        if not len(rows):
+            return vectors
+        row_bytes = vectors.shape[1] * vectors.itemsize
+        with self._records_lock:
+            if self._vectors_file is None:
+                self._vectors_file = open(self.directory / "vectors.npy", 'rb')
+            if int(rows[-1]) - int(rows[0]) + 1 == len(rows):  # linhas contíguas: uma leitura só
+                self._vectors_file.seek(self.vectors.offset + int(rows[0]) * row_bytes)
+                self._vectors_file.readinto(vectors)
+                return vectors
+            for position, row in enumerate(rows):
+                self._vectors_file.seek(self.vectors.offset + int(row) * row_bytes)
+                self._vectors_file.readinto(vectors[position])
+        return vectors
+
+    def _write_vectors(self, keep: np.ndarray, path: Path) -> None:
+        """Copia as linhas `keep` bloco a bloco para o novo .npy, sem montar a matriz inteira em RAM"""
+        stored = len(self.vectors)
+        blocks = self._pending_vectors
+        dimension = self.vectors.shape[1] if stored else (blocks[0].shape[1] if blocks else 0)
+        if not len(keep):
+            np.save(path, np.zeros((0, 0), dtype=np.float32))
+        else:
+            output = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(keep), dimension))
+            position = 0
+            stored_keep = keep[keep < stored]
+            for start in range(0, len(stored_keep), self.COPY_BLOCK):
+                rows = stored_keep[start:start + self.COPY_BLOCK]
+                output[position:position + len(rows)] = self._exact_rows(rows)
+                position += len(rows)
+            offset = stored
+            for block in blocks:
+                rows = keep[(keep >= offset) & (keep < offset + len(block))] - offset
+                output[position:position + len(rows)] = block[rows]
+                position += len(rows)
+                offset += len(block)
+            output.flush()
+            del output
+        # O vectors.npy antigo vai ser substituído: solta o mapeamento (o arquivo é fechado em _write_records)
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._pending_vectors = []
+
+    def _pending_scores(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Linhas vivas dos blocos pendentes (ainda não gravados) e seus scores exatos para cada pergunta"""
+        rows = []
+        scores = []
+        offset = len(self.vectors)
+        for block in self._pending_vectors:
+            alive = self.alive[offset:offset + len(block)]
+            rows.append(np.flatnonzero(alive) + offset)
+            scores.append(queries @ block[alive].T)
+            offset += len(block)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        return np.concatenate(rows), np.hstack(scores)
+
+    def _close_records(self) -> None:
+        with self._records_lock:
+            for handle in (self._records_file, self._vectors_file):
+                if handle is not None:
+                    handle.close()
+            self._records_file = None
+            self._vectors_file = None
+
+    def _record(self, row: int) -> Tuple[str, Dict]:
+        if row >= self.persisted:
+            return self.texts[row - self.persisted], self.metadatas[row - self.persisted]
+        record = json.loads(self._read_line(row))
+        return record['text'], record['metadata']
+
+    def _write_records(self, keep: np.ndarray, path: Path) -> None:
+        """Copia as linhas gravadas que sobrevivem (sem decodificar o JSON) e acrescenta as novas"""
+        offsets = np.empty(len(keep), dtype=np.int64)
+        with open(path, 'wb') as f:
+            for position, row in enumerate(keep):
+                offsets[position] = f.tell()
+                if row < self.persisted:
+                    f.write(self._read_line(row))
+                else:
+                    record = {'id': self.ids[position], 'text': self.texts[row - self.persisted],
+                              'metadata': self.metadatas[row - self.persisted]}
+                    f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+        self._close_records()  # os arquivos antigos vão ser substituídos (no Windows, precisam estar fechados)
+        self.offsets = offsets
+        self.persisted = len(keep)
+        self.texts = []
+        self.metadatas = []
+
+    def _train(self) -> None:
+        """Treina o quantizador numa amostra e codifica todos os vetores"""
+        started = time.perf_counter()
+        n = len(self.vectors)
+        rows = np.sort(np.random.default_rng(0).choice(n, min(n, RAGConfig.QUANT_TRAIN_SAMPLE), replace=False))
+        quantizer = create_quantizer(self.method)
+        quantizer.fit(np.asarray(self.vectors[rows], dtype=np.float32), total=n)
+        quantizer.add(self.vectors)
+        quantizer.trained_on = n
+        self.quantizer = quantizer
+        logger.info(f"Quantizador {self.method} treinado com {len(rows)} vetores e {n} codificados em "
+                    f"{time.perf_counter() - started:.1f}s ({quantizer.nbytes / 1_000_000:.1f} MB em RAM)")
+
+    def _write_quantizer(self) -> None:
+        path = self.directory / "quantizer.npz"
+        if self.quantizer is None:
+            path.unlink(missing_ok=True)
+            return
+        meta = {'kind': self.quantizer.kind, 'params': self.quantizer.params(),
+                'count': len(self.quantizer), 'trained_on': self.quantizer.trained_on}
+        tmp_path = self.directory / "quantizer.tmp.npz"
+        np.savez(tmp_path, meta=np.array(json.dumps(meta)), **self.quantizer.state())
+        tmp_path.replace(path)
+
+    def save(self) -> None:
+        """Compacta e grava o índice; codifica os vetores novos (ou retreina, se cresceu demais)"""
+        if not self._dirty:
+            return
+        encoded = len(self.quantizer) if self.quantizer is not None else 0
+        kept = np.flatnonzero(self.alive[:encoded])  # linhas codificadas que sobrevivem à compactação
+        super().save()
+
+        if self.quantizer is not None and len(self.ids) <= self.quantizer.trained_on * RAGConfig.QUANT_RETRAIN_GROWTH:
+            self.quantizer.keep(kept)
+            self.quantizer.add(self.vectors[len(kept):])
+        elif len(self.ids) >= RAGConfig.QUANT_MIN_VECTORS:
+            self._train()
+        else:
+            self.quantizer = None
+        self._write_quantizer()
+
+    def memory_stats(self) -> Dict[str, float]:
+        """
+        Memória dos códigos em RAM comparada aos vetores float32 exatos
+
+        `records_mb` estima o que fica em RAM para os registros (IDs, dicionário
+        ID → linha e deslocamentos); os textos em si ficam no disco.
+        """
+        exact = len(self.vectors) * (self.vectors.shape[1] if self.vectors.ndim == 2 else 0) * 4
+        codes = self.quantizer.nbytes if self.quantizer is not None else exact
+        records = (self.offsets.nbytes + sys.getsizeof(self.ids) + sys.getsizeof(self.id_to_row)
+                   + sum(sys.getsizeof(chunk_id) for chunk_id in self.ids))
+        return {
+            'vectors': len(self.vectors),
+            'exact_mb': exact / 1_000_000,
+            'codes_mb': codes / 1_000_000,
+            'records_mb': records / 1_000_000,
+            'compression': exact / codes if codes else 0.0,
+        }
+
+    def search_by_vectors(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Busca aproximada pelos códigos, reordenada com os vetores exatos
+
+        Args:
+            queries: Matriz (m, dimensão) de embeddings de perguntas
+            k: Resultados por pergunta
+
+        Returns:
+            Para cada pergunta, lista de (linha, similaridade cosseno exata) em ordem decrescente
+        """
+        if self.quantizer is None or not len(self.quantizer) or not len(self):
+            return super().search_by_vectors(queries, k)
+
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        k = min(k, len(self))
+        encoded = len(self.quantizer)
+        stored = len(self.vectors)
+        # Linhas sem código entram todas: as gravadas são lidas do .npy, as pendentes vêm da RAM
+        tail = np.arange(encoded, stored)[self.alive[encoded:stored]]
+        pending_rows, pending_scores = self._pending_scores(queries)
+        candidates = self.quantizer.search(queries, k * self.rerank_factor, self.alive[:encoded])
+
+        results = []
+        for query, rows, extra_scores in zip(queries, candidates, pending_scores):
+            rows = np.sort(np.concatenate([rows, tail]))  # leitura do .npy em ordem crescente
+            scores = np.concatenate([self._exact_rows(rows) @ query, extra_scores])
+            rows = np.concatenate([rows, pending_rows])
+            top = np.argsort(-scores, kind='stable')[:k]
+            results.append([(int(rows[i]), float(scores[i])) for i in top])
+        return results
+